@@ -75,7 +75,7 @@ def get_users():
             SELECT 
                 user_id, name, auth_level, assigned_channel, created_at, is_active,
                 has_fingerprint, app_token,
-                CASE WHEN face_encoding IS NOT NULL THEN 1 ELSE 0 END as has_face
+                EXISTS (SELECT 1 FROM Face_Embeddings e WHERE e.user_id = Users.user_id) as has_face
             FROM Users
         """)
         rows = cursor.fetchall()
@@ -160,7 +160,7 @@ def login_by_token(req: AuthRequest):
             SELECT 
                 user_id, name, auth_level, assigned_channel, created_at, is_active,
                 has_fingerprint, app_token,
-                CASE WHEN face_encoding IS NOT NULL THEN 1 ELSE 0 END as has_face
+                EXISTS (SELECT 1 FROM Face_Embeddings e WHERE e.user_id = Users.user_id) as has_face
             FROM Users WHERE app_token = ?
         """, (req.token,))
         row = cursor.fetchone()
@@ -224,7 +224,7 @@ def update_user(user_id: int, update_data: UserUpdate):
         cursor.execute("""
             SELECT user_id, name, auth_level, assigned_channel, created_at, is_active,
                    has_fingerprint, app_token,
-                   CASE WHEN face_encoding IS NOT NULL THEN 1 ELSE 0 END as has_face
+                   EXISTS (SELECT 1 FROM Face_Embeddings e WHERE e.user_id = Users.user_id) as has_face
             FROM Users WHERE user_id = ?
         """, (user_id,))
         updated_user = cursor.fetchone()
@@ -251,6 +251,7 @@ def delete_user(user_id: int):
             raise HTTPException(status_code=403, detail="Cannot delete Administrator")
 
         # 1. Immediately delete from DB so App sees update instantly
+        #    (trigger trg_user_delete drops the face embeddings in the same transaction)
         cursor.execute("DELETE FROM Users WHERE user_id = ?", (user_id,))
         
         # 2. Queue command for hardware cleanup (fingerprint/face)
@@ -0,0 +1,274 @@
+import os
+import json
+import threading
+import time
+import cv2
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 摄像头物理安装方向：需要逆时针旋转 90 度
+CAMERA_FLIP = "counterclockwise"
+SENSOR_SIZE = (640, 480) # 传感器输出 (宽, 高)
+
+# tools/diagnose_camera.py --tune 选出的管道参数保存在这里，启动时优先使用
+PIPELINE_CACHE = os.path.join(PROJECT_ROOT, "camera_pipeline.json")
+TUNE_FORMATS = ("NV12", "YUY2", None)      # None = 由 libcamerasrc 自行协商
+TUNE_MODES = ((640, 480), (1280, 960))     # 传感器输出分辨率，输出帧统一缩放到 SENSOR_SIZE
+TUNE_FRAMERATES = (30, 60, None)
+TUNE_FPS_TOLERANCE = 0.9                   # 帧率不低于最佳值的 90% 时，按 CPU 开销和延迟选择
+
+
+def build_gst_pipeline(width=SENSOR_SIZE[0], height=SENSOR_SIZE[1], framerate=30, src_format="NV12",
+                       out_size=None, flip=CAMERA_FLIP, color="RGB"):
+    """
+    构建 libcamerasrc GStreamer 管道字符串。
+    旋转 (videoflip)、缩放 (videoscale) 和颜色转换 (videoconvert) 都在管道内完成，
+    appsink 输出的帧已经是正确方向、尺寸和颜色空间，Python 侧无需再 rotate/resize/cvtColor。
+    out_size 指旋转之后的 (宽, 高)；flip=None 表示不旋转；color 可为 RGB / BGR / GRAY8。
+    """
+    caps = "video/x-raw"
+    if src_format:
+        caps += f",format={src_format}"
+    caps += f",width={width},height={height}"
+    if framerate:
+        caps += f",framerate={framerate}/1"
+    parts = ["libcamerasrc", caps]
+
+    rotated = flip in ("clockwise", "counterclockwise")
+    if out_size:
+        # 先缩放再旋转：旋转时处理的像素更少
+        w, h = (out_size[1], out_size[0]) if rotated else out_size
+        parts += ["videoscale", f"video/x-raw,width={w},height={h}"]
+    if flip:
+        parts.append(f"videoflip method={flip}")
+    parts += ["videoconvert", f"video/x-raw,format={color}", "appsink drop=1 max-buffers=1"]
+    return " ! ".join(parts)
+
+
+def camera_pipeline_candidates(out_size=None, color="RGB"):
+    """
+    按优先级返回 [(pipeline, 名称, 颜色, 是否已旋转)]。
+    优先使用在管道内完成旋转/缩放/转色的版本；若缺少 videoflip/videoscale 等元素导致打开失败，
+    则退回到旧的 BGR 管道，由 Python 侧完成处理。
+    """
+    return [
+        (build_gst_pipeline(out_size=out_size, color=color), f"GStreamer (NV12 -> {color}, flip)", color, True),
+        (build_gst_pipeline(src_format=None, framerate=None, out_size=out_size, color=color),
+         f"GStreamer (Auto -> {color}, flip)", color, True),
+        (build_gst_pipeline(flip=None, color="BGR"), "GStreamer (NV12)", "BGR", False),
+        (build_gst_pipeline(src_format=None, framerate=None, flip=None, color="BGR"), "GStreamer (Auto)", "BGR", False),
+    ]
+
+
+def tuning_candidates(formats=TUNE_FORMATS, modes=TUNE_MODES, framerates=TUNE_FRAMERATES, flip=True):
+    """
+    自动调优的候选管道参数 [{src_format, width, height, framerate, flip}]。
+    flip=True 为管道内旋转+转 RGB 的版本；缺少 videoflip 等元素时用 flip=False 的 BGR 版本再调一次。
+    """
+    return [{"src_format": fmt, "width": w, "height": h, "framerate": fps, "flip": flip}
+            for fmt in formats for w, h in modes for fps in framerates]
+
+
+def pipeline_from_params(params, out_size=None, color="RGB"):
+    """
+    由调优参数构建 (pipeline, 名称, 颜色, 是否已旋转)，含义与 camera_pipeline_candidates() 相同。
+    传感器分辨率不是 SENSOR_SIZE 时，默认在管道内缩放回 SENSOR_SIZE，下游看到的帧尺寸不变。
+    """
+    width, height = params["width"], params["height"]
+    if params["flip"]:
+        if out_size is None and (width, height) != SENSOR_SIZE:
+            out_size = (SENSOR_SIZE[1], SENSOR_SIZE[0])
+        flip, rotated = CAMERA_FLIP, True
+    else:
+        # 旧式管道：输出未旋转的 BGR，由 Python 侧处理
+        out_size = None if (width, height) == SENSOR_SIZE else SENSOR_SIZE
+        flip, rotated, color = None, False, "BGR"
+    pipeline = build_gst_pipeline(width=width, height=height, framerate=params["framerate"],
+                                  src_format=params["src_format"], out_size=out_size, flip=flip, color=color)
+    name = (f"GStreamer ({params['src_format'] or 'Auto'} {width}x{height}"
+            f"@{params['framerate'] or 'auto'} -> {color}{', flip' if rotated else ''})")
+    return pipeline, name, color, rotated
+
+
+def benchmark_pipeline(pipeline, duration=3.0, warmup=5):
+    """
+    打开管道并连续读帧 duration 秒，返回测量结果:
+      open_ms   打开管道到拿到第一帧的时间 (启动延迟)
+      fps       实测帧率
+      latency_ms  帧间隔的 p90 (读取一帧最多要等多久)
+      cpu_ms    每帧消耗的进程 CPU 时间 (包括 GStreamer 的转换/缩放/旋转线程)
+    失败时返回 {"error": 原因}
+    """
+    t0 = time.perf_counter()
+    cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+    try:
+        if not cap.isOpened():
+            return {"error": "open"}
+        ret, frame = cap.read()
+        if not ret or frame is None or frame.size == 0:
+            return {"error": "read"}
+        open_ms = (time.perf_counter() - t0) * 1000
+        for _ in range(warmup):
+            cap.read()
+        stamps, failures = [], 0
+        cpu0, start = time.process_time(), time.perf_counter()
+        while time.perf_counter() - start < duration:
+            ret, frame = cap.read()
+            if ret and frame is not None:
+                stamps.append(time.perf_counter())
+            else:
+                failures += 1
+                if failures > 10:
+                    break
+        cpu = time.process_time() - cpu0
+        elapsed = time.perf_counter() - start
+        if len(stamps) < 2:
+            return {"error": "stream"}
+        intervals = sorted(b - a for a, b in zip(stamps, stamps[1:]))
+        return {
+            "open_ms": open_ms,
+            "fps": len(stamps) / elapsed,
+            "latency_ms": intervals[int(0.9 * (len(intervals) - 1))] * 1000,
+            "cpu_ms": cpu * 1000 / len(stamps),
+            "shape": list(frame.shape),
+            "read_errors": failures,
+        }
+    finally:
+        cap.release()
+
+
+def select_pipeline(results):
+    """
+    从 [(params, 测量结果)] 中选出最佳项：帧率接近最高值 (TUNE_FPS_TOLERANCE) 的候选中，
+    取每帧 CPU 开销最低、其次延迟最低的一项；全部失败时返回 None
+    """
+    ok = [(params, r) for params, r in results if "error" not in r]
+    if not ok:
+        return None
+    best_fps = max(r["fps"] for _, r in ok)
+    fast = [(params, r) for params, r in ok if r["fps"] >= best_fps * TUNE_FPS_TOLERANCE]
+    return min(fast, key=lambda item: (item[1]["cpu_ms"], item[1]["latency_ms"]))
+
+
+def load_pipeline_cache(path=PIPELINE_CACHE):
+    """读取调优结果，不存在或损坏时返回 None"""
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+        if all(k in entry for k in ("src_format", "width", "height", "framerate", "flip")):
+            return entry
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[Camera] 管道缓存无效 / Cache pipeline invalide: {e}")
+    return None
+
+
+def save_pipeline_cache(params, result, path=PIPELINE_CACHE):
+    """保存调优结果 (先写临时文件再改名，读取方不会看到写了一半的文件)"""
+    entry = dict(params)
+    entry.update({k: result[k] for k in ("fps", "latency_ms", "cpu_ms", "open_ms", "shape") if k in result})
+    entry["tuned_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    entry["opencv"] = cv2.__version__
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp, path)
+    return entry
+
+
+def clear_pipeline_cache(path=PIPELINE_CACHE):
+    """缓存的管道打不开时 (摄像头或驱动变化) 删除缓存，下次启动直接探测"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def cached_pipeline(out_size=None, color="RGB", path=PIPELINE_CACHE):
+    """缓存中的管道 (pipeline, 名称, 颜色, 是否已旋转)，没有缓存时返回 None"""
+    entry = load_pipeline_cache(path)
+    if entry is None:
+        return None
+    return pipeline_from_params(entry, out_size=out_size, color=color)
+
+
+class FrameGrabber:
+    """
+    后台取帧线程 (Thread de capture)
+    持续读取 VideoCapture，只保留最新的一帧 (单槽缓冲区)，并记录时间戳和帧序号。
+    这样 appsink 中不会堆积过期帧，识别/录入/诊断代码读取时也不会被 cap.read() 阻塞。
+    注意：返回的帧由所有消费者共享，请勿原地修改。
+    """
+    def __init__(self, cap, name="FrameGrabber"):
+        self.cap = cap
+        self.name = name
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = 0.0
+        self._seq = 0          # 帧计数器 (每成功读取一帧 +1)
+        self.read_errors = 0
+        self._sinks = []       # 每来一帧都会调用的回调 (例如写入共享内存)
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def add_sink(self, callback):
+        """注册回调 callback(seq, timestamp, frame)，在取帧线程中调用，需尽量快"""
+        self._sinks.append(callback)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            if not ret or frame is None:
+                self.read_errors += 1
+                time.sleep(0.05)
+                continue
+            with self._cond:
+                self._frame = frame
+                self._timestamp = time.time()
+                self._seq += 1
+                seq, stamp = self._seq, self._timestamp
+                self._cond.notify_all()
+            for sink in self._sinks:
+                try:
+                    sink(seq, stamp, frame)
+                except Exception as e:
+                    print(f"[Camera] 帧回调出错 / Erreur callback: {e}")
+
+    @property
+    def frame_count(self):
+        return self._seq
+
+    def latest(self):
+        """非阻塞：返回 (seq, timestamp, frame)，尚无帧时 frame 为 None"""
+        with self._cond:
+            return self._seq, self._timestamp, self._frame
+
+    def wait_frame(self, after_seq=0, timeout=1.0):
+        """阻塞直到出现序号大于 after_seq 的新帧；超时返回 (seq, timestamp, None)"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._seq <= after_seq and self._running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return self._seq, self._timestamp, None
+                self._cond.wait(remaining)
+            if self._seq <= after_seq:
+                return self._seq, self._timestamp, None
+            return self._seq, self._timestamp, self._frame
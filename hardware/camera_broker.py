@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import socket
+import selectors
+import threading
+from hardware.shared_frame import SharedFrame
+
+# 守护进程在该 Unix 套接字上发布摄像头；工具脚本连接后即可读取同一路画面
+BROKER_SOCKET = "/tmp/distcapsule_camera.sock"
+POLL_INTERVAL = 0.005  # 客户端等待新帧时的轮询间隔 (秒)
+
+
+class CameraBroker:
+    """
+    摄像头代理 (Partage de la caméra)
+    守护进程独占 libcamerasrc，代理把 FrameGrabber 的每一帧写入一块共享内存 (SharedFrame)，
+    并在 Unix 套接字上告诉客户端共享内存的名字、帧格式和方向。
+    客户端连接即接入、断开即离开，不会重启采集或重新协商管道；
+    没有客户端时不写共享内存，不增加守护进程的开销。
+    """
+    def __init__(self, grabber, color, rotated, socket_path=BROKER_SOCKET):
+        self.grabber = grabber
+        self.color = color
+        self.rotated = rotated
+        self.socket_path = socket_path
+        self.frames = None
+        self._server = None
+        self._clients = {}
+        self._running = False
+        self._thread = None
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    def start(self):
+        _, _, frame = self.grabber.wait_frame(timeout=3.0)
+        if frame is None:
+            raise RuntimeError("摄像头无画面 / Pas d'image caméra")
+        self.frames = SharedFrame.create(frame.shape)
+        self._server = self._listen()
+        self._running = True
+        self.grabber.add_sink(self._publish)
+        self._thread = threading.Thread(target=self._serve, name="CameraBroker", daemon=True)
+        self._thread.start()
+        print(f"[Camera] 摄像头代理已启动 / Caméra partagée: {self.socket_path}")
+        return self
+
+    def _listen(self):
+        if os.path.exists(self.socket_path):
+            # 套接字文件可能是上次异常退出留下的；能连上说明另一个代理仍在运行
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                probe.close()
+                raise RuntimeError(f"摄像头代理已在运行 / Déjà actif: {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                probe.close()
+                os.unlink(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(8)
+        server.setblocking(False)
+        return server
+
+    def info(self):
+        return {"shm": self.frames.name, "shape": list(self.frames.shape),
+                "color": self.color, "rotated": self.rotated, "pid": os.getpid()}
+
+    def _publish(self, seq, timestamp, frame):
+        if self._clients and self._running:
+            self.frames.write(frame)
+
+    def _serve(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._server, selectors.EVENT_READ)
+        hello = (json.dumps(self.info()) + "\n").encode()
+        while self._running:
+            for key, _ in selector.select(timeout=0.5):
+                if key.fileobj is self._server:
+                    try:
+                        conn, _ = self._server.accept()
+                        conn.sendall(hello)
+                    except OSError:
+                        continue
+                    selector.register(conn, selectors.EVENT_READ)
+                    self._clients[conn.fileno()] = conn
+                    print(f"[Camera] 客户端接入 / Client connecté ({self.clients})")
+                    continue
+                conn = key.fileobj
+                try:
+                    data = conn.recv(64)
+                except OSError:
+                    data = b""
+                if not data:
+                    # 客户端断开 (正常关闭或进程退出)
+                    selector.unregister(conn)
+                    self._clients.pop(conn.fileno(), None)
+                    conn.close()
+                    print(f"[Camera] 客户端断开 / Client déconnecté ({self.clients})")
+        selector.close()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for conn in list(self._clients.values()):
+            conn.close()
+        self._clients.clear()
+        if self._server:
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        if self.frames:
+            self.frames.close()
+            self.frames = None
+
+
+class BrokerClient:
+    """
+    摄像头代理的客户端，提供与 FrameGrabber 相同的 latest()/wait_frame()/stop()，
+    可直接作为 FaceRecognizer.grabber 或在工具脚本中代替 VideoCapture。
+    color / rotated 描述帧的颜色空间和是否已旋转，与 camera_pipeline_candidates() 的含义一致。
+    """
+    def __init__(self, sock, info):
+        self._sock = sock
+        self.info = info
+        self.color = info["color"]
+        self.rotated = info["rotated"]
+        self.frames = SharedFrame.attach(info["shm"], track=False)
+        # 共享内存中可能还留着上一个客户端离开前的旧帧
+        self._first_seq = self.frames.seq
+
+    @classmethod
+    def connect(cls, socket_path=BROKER_SOCKET, timeout=1.0):
+        """连接正在运行的摄像头代理；没有代理时返回 None"""
+        if not os.path.exists(socket_path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+            with sock.makefile("r") as stream:
+                info = json.loads(stream.readline())
+            return cls(sock, info)
+        except (OSError, ValueError, KeyError):
+            sock.close()
+            return None
+
+    @property
+    def alive(self):
+        """代理关闭连接 (守护进程退出) 后返回 False"""
+        if self._sock is None:
+            return False
+        try:
+            self._sock.setblocking(False)
+            return self._sock.recv(1, socket.MSG_PEEK) != b""
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            if self._sock is not None:
+                self._sock.settimeout(None)
+
+    @property
+    def frame_count(self):
+        return self.frames.seq if self.frames else 0
+
+    def latest(self):
+        if self.frames is None:
+            return 0, 0.0, None
+        return self.frames.latest()
+
+    def wait_frame(self, after_seq=0, timeout=1.0):
+        """阻塞直到出现序号大于 after_seq 的新帧；超时或代理已退出时返回 (seq, timestamp, None)"""
+        deadline = time.time() + timeout
+        after_seq = max(after_seq, self._first_seq)
+        while self.frames is not None:
+            if self.frames.seq > after_seq:
+                seq, stamp, frame = self.frames.latest()
+                if frame is not None and seq > after_seq:
+                    return seq, stamp, frame
+            if time.time() >= deadline or not self.alive:
+                break
+            time.sleep(POLL_INTERVAL)
+        return self.frame_count, 0.0, None
+
+    def stop(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.frames is not None:
+            self.frames.close()
+            self.frames = None
@@ -0,0 +1,144 @@
+import os
+import time
+import cv2
+import numpy as np
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTS = (".mp4", ".avi", ".mkv", ".mov", ".h264", ".mjpeg")
+
+
+class ImageDirSource:
+    """
+    把图像目录当作摄像头 (Source: dossier d'images)
+    实现 cv2.VideoCapture 的 read()/isOpened()/release() 接口，可直接交给 FrameGrabber。
+    每张图连续输出 repeat 帧，模拟一个人在机器前停留几帧；current 为当前图像的文件名。
+    """
+    def __init__(self, path, repeat=1, loop=False, files=None):
+        self.path = path
+        self.repeat = max(1, repeat)
+        self.loop = loop
+        if files is None:
+            files = sorted(f for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTS))
+        self.files = list(files)
+        self.current = None
+        self._index = 0
+        self._image = None
+        self._emitted = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        while self._image is None or self._emitted >= self.repeat:
+            if self._index >= len(self.files):
+                if not self.loop or not self.files:
+                    return False, None
+                self._index = 0
+            self.current = self.files[self._index]
+            self._index += 1
+            self._image = cv2.imread(os.path.join(self.path, self.current))
+            self._emitted = 0
+            if self._image is None:
+                print(f"[Source] 无法读取 / Illisible: {self.current}")
+        self._emitted += 1
+        return True, self._image
+
+    def release(self):
+        self.files = []
+        self._image = None
+
+
+class SyntheticSource:
+    """
+    合成画面 (Source synthétique)：渐变背景 + 移动的椭圆 + 传感器噪声，不含真实人脸。
+    用于在没有摄像头和数据集的机器上测量采集/预处理/检测的开销。
+    fps 不为 None 时 read() 按该帧率节流，模拟真实摄像头。
+    """
+    def __init__(self, size=(640, 480), count=None, fps=None, noise=6.0, seed=0):
+        self.width, self.height = size
+        self.count = count
+        self.fps = fps
+        self.noise = noise
+        self._rng = np.random.default_rng(seed)
+        self._index = 0
+        self._next_time = 0.0
+        ramp = np.linspace(40, 200, self.width, dtype=np.float32)
+        self._background = np.repeat(ramp[None, :, None], self.height, axis=0).repeat(3, axis=2)
+        self._noise = np.empty((self.height, self.width, 3), dtype=np.float32)
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.count is not None and self._index >= self.count:
+            return False, None
+        if self.fps:
+            delay = self._next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time, time.time()) + 1.0 / self.fps
+        phase = self._index / 30.0
+        self._index += 1
+        self._noise[:] = self._rng.standard_normal(self._noise.shape, dtype=np.float32)
+        self._noise *= self.noise
+        self._noise += self._background
+        np.clip(self._noise, 0, 255, out=self._noise)
+        # 与 VideoCapture 一样每帧返回新数组：FrameGrabber 的消费者可能仍持有上一帧
+        frame = self._noise.astype(np.uint8)
+        center = (int(self.width * (0.5 + 0.25 * np.sin(phase))), int(self.height * 0.45))
+        axes = (self.width // 8, self.height // 5)
+        cv2.ellipse(frame, center, axes, 0, 0, 360, (150, 170, 210), -1)
+        return True, frame
+
+    def release(self):
+        self.count = 0
+
+
+class ReplayFeed:
+    """
+    拉取式回放 (Relecture)：每次调用 latest() 都从源读取下一帧，
+    接口与 FrameGrabber.latest / SharedFrame.latest 相同，可直接传给 FaceRecognizer.scan_from()。
+    离线测试中每一帧都会被处理，不会因为处理慢而丢帧；read_ms 为最近一次读帧耗时。
+    """
+    def __init__(self, cap):
+        self.cap = cap
+        self.seq = 0
+        self.read_ms = 0.0
+        self.exhausted = False
+
+    def latest(self):
+        t0 = time.perf_counter()
+        ret, frame = self.cap.read()
+        self.read_ms = (time.perf_counter() - t0) * 1000
+        if not ret or frame is None:
+            self.exhausted = True
+            return self.seq, time.time(), None
+        self.seq += 1
+        return self.seq, time.time(), frame
+
+    def release(self):
+        self.cap.release()
+
+
+def open_source(spec, repeat=1, loop=False):
+    """
+    按描述打开帧源，返回 (cap, color, rotated)：
+      synthetic[:帧数]  合成画面
+      目录              图像目录 (每张图输出 repeat 帧)
+      视频文件          cv2.VideoCapture (FFmpeg)
+    文件和合成画面都是正向 BGR，无需再旋转 (rotated=True)。
+    """
+    if spec.startswith("synthetic"):
+        _, _, count = spec.partition(":")
+        return SyntheticSource(count=int(count) if count else None), "BGR", True
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, repeat=repeat, loop=loop), "BGR", True
+    if os.path.isfile(spec):
+        if spec.lower().endswith(IMAGE_EXTS):
+            directory, filename = os.path.split(spec)
+            return ImageDirSource(directory or ".", repeat=repeat, loop=loop, files=[filename]), "BGR", True
+        cap = cv2.VideoCapture(spec)
+        if not cap.isOpened():
+            raise IOError(f"无法打开视频 / Vidéo illisible: {spec}")
+        return cap, "BGR", True
+    raise FileNotFoundError(f"帧源不存在 / Source introuvable: {spec}")
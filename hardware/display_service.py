@@ -0,0 +1,132 @@
+import time
+import threading
+
+DISPLAY_FPS = 20  # 屏幕刷新的最高帧率 (开锁动画为每秒 20 步)
+
+
+class DisplayService:
+    """
+    屏幕刷新线程 (Service d'affichage)
+    调用方 (主循环、开锁动画、录入、看门狗) 只把请求放进队列后立即返回，
+    SPI 传输在后台线程进行，不再拖慢指纹轮询和舵机计时。
+    线程每次取出队列中积压的所有请求，只绘制最新的一帧 (latest-wins)，被覆盖的帧计入 coalesced；
+    两帧之间至少间隔 1/fps 秒，间隔期间到达的请求同样会被合并。
+    背光请求按顺序合并，最终状态与依次执行所有请求相同。
+    提供与 ST7789_Driver 相同的 width / height / show() / display() / set_backlight()，可以直接传给录入模块。
+    """
+    def __init__(self, disp, screen, fps=DISPLAY_FPS):
+        self.disp = disp
+        self.screen = screen
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.width = disp.width
+        self.height = disp.height
+        self.stats = {"posted": 0, "drawn": 0, "coalesced": 0, "dropped": 0}
+        self._cond = threading.Condition()
+        self._pending = []   # [(类型, 内容)]，按提交顺序
+        self._busy = False
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="DisplayService", daemon=True)
+        self._thread.start()
+        return self
+
+    def _post(self, kind, payload):
+        with self._cond:
+            if not self._running:
+                if kind != "backlight":
+                    self.stats["dropped"] += 1
+                return
+            self._pending.append((kind, payload))
+            if kind != "backlight":
+                self.stats["posted"] += 1
+            self._cond.notify()
+
+    def show(self, screen, **values):
+        """绘制 hardware.ui 的画面：刷新线程中调用 screen.render(**values)，只发送变化的控件区域"""
+        self._post("screen", (screen, values))
+
+    def show_status(self, status_type, message, bg_color=(0, 0, 0), progress=None, countdown=None):
+        """状态画面 (main.update_screen 的布局)，时钟在绘制时取当前时间"""
+        self.show(self.screen, status_type=status_type, message=message, bg_color=bg_color,
+                  progress=progress, countdown=countdown)
+
+    def display(self, image):
+        """显示 PIL 图片 (提交后调用方不能再修改 image)"""
+        self._post("image", image)
+
+    def set_backlight(self, val):
+        self._post("backlight", bool(val))
+
+    def _run(self):
+        next_due = 0.0
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._pending:
+                    break
+                batch, self._pending = self._pending, []
+                self._busy = True
+            try:
+                self._apply(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+            # 限制帧率：等待期间到达的请求在下一轮合并
+            next_due = max(next_due + self.interval, time.monotonic())
+            delay = next_due - time.monotonic()
+            if delay > 0 and self._running:
+                time.sleep(delay)
+
+    def _apply(self, batch):
+        frames = [(kind, payload) for kind, payload in batch if kind != "backlight"]
+        self.stats["coalesced"] += max(0, len(frames) - 1)
+        try:
+            # 最后一帧之前的背光请求在绘制前执行 (点亮时驱动会整屏刷新)，之后的在绘制后执行
+            last = max((i for i, (kind, _) in enumerate(batch) if kind != "backlight"), default=len(batch))
+            before = [payload for kind, payload in batch[:last] if kind == "backlight"]
+            if before:
+                self.disp.set_backlight(before[-1])
+            if frames:
+                kind, payload = frames[-1]
+                if kind == "screen":
+                    screen, values = payload
+                    self.disp.show(screen, **values)
+                else:
+                    self.disp.display(payload)
+                self.stats["drawn"] += 1
+            after = [payload for kind, payload in batch[last + 1:] if kind == "backlight"]
+            if after:
+                self.disp.set_backlight(after[-1])
+        except Exception as e:
+            if frames:
+                self.stats["dropped"] += 1
+            print(f"[Display] 屏幕刷新失败 / Erreur affichage: {e}")
+
+    def flush(self, timeout=1.0):
+        """等待已提交的请求全部绘制完成；超时返回 False"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._thread or not self._thread.is_alive():
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout=2.0):
+        """处理完队列中剩余的请求后停止线程"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        s = self.stats
+        print(f"[Display] 刷新线程已停止 / Affichage arrêté: 提交 {s['posted']}, 绘制 {s['drawn']}, "
+              f"合并 {s['coalesced']}, 丢弃 {s['dropped']}")
@@ -1,11 +1,15 @@
 import time
 import sqlite3
-import json
+import datetime
+import numpy as np
 import adafruit_fingerprint
-import cv2
-import face_recognition
 from hardware.st7789_driver import ST7789_Driver
-from PIL import Image, ImageDraw, ImageFont
+from hardware.face_gallery import encoding_to_blob
+from hardware.face_quality import EnrollmentBurst, select_diverse
+from hardware.settings import get_float, get_int
+from hardware.ui import EnrollScreen
+
+_enroll_screens = {} # (宽, 高) -> EnrollScreen，字体和页面底图只加载/绘制一次
 
 def update_enroll_screen(disp, title, msg, color="BLUE", cmd_id=None, db_path=None):
     # 1. Update Physical Screen
@@ -14,21 +18,11 @@ def update_enroll_screen(disp, title, msg, color="BLUE", cmd_id=None, db_path=No
         bg_color = (0, 0, 150) 
         if color == "GREEN": bg_color = (0, 150, 0)
         if color == "RED": bg_color = (150, 0, 0)
-        image = Image.new("RGB", (disp.width, disp.height), bg_color)
-        draw = ImageDraw.Draw(image)
-        try:
-            font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 28)
-            font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 20)
-        except:
-            font_large = ImageFont.load_default()
-            font_small = ImageFont.load_default()
-        draw.rectangle((5, 5, disp.width-5, disp.height-5), outline="WHITE", width=2)
-        draw.text((10, 20), title, font=font_large, fill="WHITE")
-        y = 70
-        for line in msg.split('\n'):
-            draw.text((10, y), line, font=font_small, fill="WHITE")
-            y += 30
-        disp.display(image)
+        size = (disp.width, disp.height)
+        if size not in _enroll_screens:
+            _enroll_screens[size] = EnrollScreen(size)
+        # disp 可以是驱动或 DisplayService，两者都提供 show()
+        disp.show(_enroll_screens[size], title=title, message=msg, bg_color=bg_color)
 
     # 2. Update Database for App Sync
     if cmd_id and db_path:
@@ -40,13 +34,20 @@ def update_enroll_screen(disp, title, msg, color="BLUE", cmd_id=None, db_path=No
         except Exception as e:
             print(f"DB Sync Error: {e}")
 
-def save_face_to_db(user_id, encoding, db_path):
-    # ... (unchanged)
-    encoding_json = json.dumps(encoding.tolist())
+def save_face_to_db(user_id, encodings, db_path, model="dlib"):
+    """
+    以 float32 BLOB 形式写入 Face_Embeddings (替换该用户原有特征)。
+    encodings 可以是一个特征向量，也可以是多个 (每个一行，识别时取最近的一行)
+    """
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if np.ndim(encodings) == 1:
+        encodings = [encodings]
     try:
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
-        cursor.execute("UPDATE Users SET face_encoding = ? WHERE user_id = ?", (encoding_json, user_id))
+        cursor.execute("DELETE FROM Face_Embeddings WHERE user_id = ?", (user_id,))
+        cursor.executemany("INSERT INTO Face_Embeddings (user_id, model, dim, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+                           [(user_id, model, len(e), encoding_to_blob(e), now) for e in encodings])
         conn.commit()
         conn.close()
         return True
@@ -55,28 +56,54 @@ def save_face_to_db(user_id, encoding, db_path):
         return False
 
 def run_face_enrollment(disp, face_rec, user_id, db_path, cmd_id=None):
+    """
+    多帧录入: 连续采集 FACE_ENROLL_BURST 帧单人脸画面并在线程池中评分 (清晰度/角度/大小)，
+    对质量最好的几帧提取特征，保存其中差异最大的 FACE_ENROLL_SAMPLES 个特征。
+    """
     print(f"开始为人脸录入 ID: {user_id} / Enrollment Face")
     update_enroll_screen(disp, "ENROLL FACE", "Regardez camera\nLook at camera", cmd_id=cmd_id, db_path=db_path)
-    start_time = time.time()
-    while time.time() - start_time < 20:
-        ret, frame = face_rec.cap.read()
-        if not ret:
-            time.sleep(0.1); continue
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-        rgb_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        locs = face_recognition.face_locations(rgb_frame)
-        if len(locs) == 1:
-            update_enroll_screen(disp, "CAPTURE", "Visage detecte\nNe bougez pas!", cmd_id=cmd_id, db_path=db_path)
-            encodings = face_recognition.face_encodings(rgb_frame, locs)
-            if encodings:
-                if save_face_to_db(user_id, encodings[0], db_path):
-                    update_enroll_screen(disp, "SUCCES", "Visage Enregistre", "GREEN", cmd_id=cmd_id, db_path=db_path)
-                    time.sleep(2); return True
-        elif len(locs) > 1:
-            update_enroll_screen(disp, "ERREUR", "Trop de visages\nOnly one person", "RED", cmd_id=cmd_id, db_path=db_path)
-        time.sleep(0.1)
-    update_enroll_screen(disp, "ECHEC", "Timeout (20s)", "RED", cmd_id=cmd_id, db_path=db_path)
+    cfg = face_rec.settings
+    burst_size = max(1, get_int(cfg, "FACE_ENROLL_BURST", 12))
+    samples = max(1, get_int(cfg, "FACE_ENROLL_SAMPLES", 3))
+    min_quality = get_float(cfg, "FACE_ENROLL_MIN_QUALITY", 0.05)
+    burst = EnrollmentBurst(workers=get_int(cfg, "FACE_ENROLL_WORKERS", 2))
+    try:
+        start_time = time.time()
+        last_seq = 0
+        while time.time() - start_time < 20 and len(burst) < burst_size:
+            # 从后台取帧线程获取比上次更新的帧
+            last_seq, _, frame = face_rec.grabber.wait_frame(after_seq=last_seq, timeout=0.5)
+            if frame is None:
+                time.sleep(0.1); continue
+            # 低分辨率检测，全分辨率提取特征
+            rgb_frame = face_rec.to_upright_rgb(frame)
+            locs = face_rec.detect_faces(rgb_frame)
+            if len(locs) == 1:
+                burst.add(rgb_frame, locs[0])
+                if len(burst) == 1:
+                    update_enroll_screen(disp, "CAPTURE", "Visage detecte\nNe bougez pas!", cmd_id=cmd_id, db_path=db_path)
+            elif len(locs) > 1:
+                update_enroll_screen(disp, "ERREUR", "Trop de visages\nOnly one person", "RED", cmd_id=cmd_id, db_path=db_path)
+
+        # 质量最好的帧提取特征 (候选数为保存数的两倍，留出挑选差异的余地)
+        best = burst.best(samples * 2, min_score=min_quality)
+        encodings = []
+        for quality, rgb_frame, location in best:
+            encodings += face_rec.encode_faces(rgb_frame, [location])
+        chosen = select_diverse(encodings, samples)
+        captured = len(burst)
+        print(f"[Face] 录入: 采集 {captured} 帧, 合格 {len(best)} 帧, 保存 {len(chosen)} 个特征 / "
+              f"{len(chosen)} échantillons")
+    finally:
+        burst.close()
+
+    if chosen and save_face_to_db(user_id, [encodings[i] for i in chosen], db_path, face_rec.embedder.name):
+        update_enroll_screen(disp, "SUCCES", "Visage Enregistre", "GREEN", cmd_id=cmd_id, db_path=db_path)
+        time.sleep(2); return True
+    if captured == 0:
+        update_enroll_screen(disp, "ECHEC", "Timeout (20s)", "RED", cmd_id=cmd_id, db_path=db_path)
+    else:
+        update_enroll_screen(disp, "ECHEC", "Image floue\nReessayez", "RED", cmd_id=cmd_id, db_path=db_path)
     time.sleep(2); return False
 
 def run_finger_enrollment(disp, finger, user_id, db_path, cmd_id=None):
@@ -0,0 +1,162 @@
+import os
+import time
+import cv2
+import numpy as np
+from hardware.settings import get_float, get_int, get_path
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+MODEL_DIR = os.path.join(PROJECT_ROOT, "models")
+DEFAULT_YUNET_MODEL = os.path.join(MODEL_DIR, "face_detection_yunet_2023mar.onnx")
+HAAR_CASCADE = "haarcascade_frontalface_default.xml"
+# apt 安装的 python3-opencv 没有 cv2.data，级联文件在系统目录中
+HAAR_DIRS = ["/usr/share/opencv4/haarcascades", "/usr/share/opencv/haarcascades"]
+
+
+class FaceDetector:
+    """
+    人脸检测后端接口 (Détecteur de visages)
+    detect() 接收 RGB 图像，返回 face_recognition 格式的 [(top, right, bottom, left), ...]
+    """
+    name = "base"
+
+    def detect(self, rgb_frame):
+        raise NotImplementedError
+
+
+class HogDetector(FaceDetector):
+    """dlib HOG (face_recognition 默认)：精度稳定，但在 Pi CPU 上最慢"""
+    name = "hog"
+
+    def __init__(self, upsample=1):
+        import face_recognition
+        self._locate = face_recognition.face_locations
+        self.upsample = upsample
+
+    def detect(self, rgb_frame):
+        return self._locate(rgb_frame, number_of_times_to_upsample=self.upsample, model="hog")
+
+
+class YuNetDetector(FaceDetector):
+    """OpenCV DNN (YuNet ONNX 模型，从本地文件加载)：速度快，对侧脸/小脸更好"""
+    name = "yunet"
+
+    def __init__(self, model_path=DEFAULT_YUNET_MODEL, score_threshold=0.8):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet 模型不存在 / Modèle introuvable: {model_path}")
+        self.model = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+        self._input_size = None
+
+    def detect(self, rgb_frame):
+        height, width = rgb_frame.shape[:2]
+        if self._input_size != (width, height):
+            self.model.setInputSize((width, height))
+            self._input_size = (width, height)
+        _, faces = self.model.detect(cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR))
+        return boxes_to_locations([] if faces is None else faces[:, :4], width, height)
+
+
+class HaarDetector(FaceDetector):
+    """Haar 级联：最便宜，但误检和漏检较多，适合作为最后的后备"""
+    name = "haar"
+
+    def __init__(self, min_neighbors=5, min_size=40):
+        path = find_haar_cascade()
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise RuntimeError(f"无法加载 Haar 级联 / Cascade invalide: {path}")
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, rgb_frame):
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        height, width = gray.shape
+        # min_size 针对 480 宽的原图，按当前图像宽度缩放
+        side = max(12, int(self.min_size * width / 480))
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=self.min_neighbors,
+                                              minSize=(side, side))
+        return boxes_to_locations(faces, width, height)
+
+
+DETECTORS = {
+    HogDetector.name: HogDetector,
+    YuNetDetector.name: YuNetDetector,
+    HaarDetector.name: HaarDetector,
+}
+
+
+def boxes_to_locations(boxes, width, height):
+    """OpenCV 的 (x, y, w, h) -> face_recognition 的 (top, right, bottom, left)"""
+    locations = []
+    for x, y, w, h in np.asarray(boxes, dtype=np.float32).reshape(-1, 4):
+        locations.append((
+            max(0, int(y)), min(width, int(x + w)),
+            min(height, int(y + h)), max(0, int(x)),
+        ))
+    return locations
+
+
+def find_haar_cascade():
+    dirs = list(HAAR_DIRS)
+    if hasattr(cv2, "data"):
+        dirs.insert(0, cv2.data.haarcascades)
+    for directory in dirs:
+        path = os.path.join(directory, HAAR_CASCADE)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"找不到 {HAAR_CASCADE} / Cascade introuvable")
+
+
+def create_detector(name, settings=None):
+    """按名称创建检测后端，参数取自 System_Settings；失败时退回 HOG"""
+    settings = settings or {}
+    try:
+        if name == YuNetDetector.name:
+            return YuNetDetector(get_path(settings, "FACE_YUNET_MODEL", DEFAULT_YUNET_MODEL),
+                                 get_float(settings, "FACE_YUNET_SCORE", 0.8))
+        if name == HaarDetector.name:
+            return HaarDetector()
+        if name != HogDetector.name:
+            print(f"[Face] 未知检测后端 '{name}'，使用 HOG / Détecteur inconnu")
+    except Exception as e:
+        print(f"[Face] 检测后端 {name} 不可用，使用 HOG / Détecteur indisponible: {e}")
+    return HogDetector(upsample=get_int(settings, "FACE_DETECT_UPSAMPLE", 1))
+
+
+def benchmark_detectors(detectors, samples, scale=1.0, repeat=1):
+    """
+    在本地图像集上比较各检测后端。
+    samples: [(rgb_image, 期望人脸数)]；scale 与运行时 FACE_DETECT_SCALE 一致。
+    返回 {name: {"mean_ms", "p90_ms", "recall", "false_positives", "images"}}
+    """
+    results = {}
+    for detector in detectors:
+        times = []
+        found = expected_total = false_positives = 0
+        for rgb, expected in samples:
+            if scale < 1.0:
+                rgb = cv2.resize(rgb, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                locations = detector.detect(rgb)
+                times.append((time.perf_counter() - t0) * 1000)
+            found += min(len(locations), expected)
+            expected_total += expected
+            false_positives += max(0, len(locations) - expected)
+        results[detector.name] = {
+            "mean_ms": float(np.mean(times)) if times else 0.0,
+            "p90_ms": float(np.percentile(times, 90)) if times else 0.0,
+            "recall": found / expected_total if expected_total else 0.0,
+            "false_positives": false_positives,
+            "images": len(samples),
+        }
+    return results
+
+
+def select_detector(results, recall_tolerance=0.02):
+    """召回率与最佳值相差不超过 recall_tolerance 的后端中，选择平均延迟最低的"""
+    if not results:
+        return None
+    best_recall = max(r["recall"] for r in results.values())
+    candidates = [name for name, r in results.items() if r["recall"] >= best_recall - recall_tolerance]
+    return min(candidates, key=lambda name: results[name]["mean_ms"])
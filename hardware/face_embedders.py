@@ -0,0 +1,88 @@
+import os
+import cv2
+import numpy as np
+from hardware.settings import get_int, get_path
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+DEFAULT_ONNX_MODEL = os.path.join(PROJECT_ROOT, "models", "face_recognition_sface_2021dec.onnx")
+
+
+class FaceEmbedder:
+    """
+    人脸特征提取后端接口 (Extraction de caractéristiques)
+    embed() 接收 RGB 全分辨率图像和 (top, right, bottom, left) 检测框，返回 float32 特征列表。
+    不同后端的特征空间不兼容：Face_Embeddings.model 记录每条特征由哪个后端生成。
+    """
+    name = "base"
+    dim = 0
+
+    def embed(self, rgb_frame, locations):
+        raise NotImplementedError
+
+
+class DlibEmbedder(FaceEmbedder):
+    """dlib ResNet 128 维特征 (face_recognition 默认)"""
+    name = "dlib"
+    dim = 128
+
+    def __init__(self):
+        import face_recognition
+        self._encode = face_recognition.face_encodings
+
+    def embed(self, rgb_frame, locations):
+        return [np.asarray(e, dtype=np.float32) for e in self._encode(rgb_frame, locations)]
+
+
+class OnnxEmbedder(FaceEmbedder):
+    """
+    本地 ONNX 模型 (经 OpenCV DNN 推理)，例如 SFace。
+    输入为裁剪并缩放到 input_size 的人脸，输出做 L2 归一化，因此欧氏距离范围为 [0, 2]，
+    匹配阈值需要按模型重新标定 (FACE_MATCH_THRESHOLD 等)。
+    """
+    name = "onnx"
+
+    def __init__(self, model_path=DEFAULT_ONNX_MODEL, input_size=112, margin=0.1):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX 模型不存在 / Modèle introuvable: {model_path}")
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.input_size = input_size
+        self.margin = margin
+        # 用一次空推理确定特征维度
+        probe = np.zeros((input_size, input_size, 3), dtype=np.uint8)
+        self.dim = int(self._forward([probe]).shape[1])
+
+    def _crop(self, rgb_frame, location):
+        top, right, bottom, left = location
+        height, width = rgb_frame.shape[:2]
+        pad_y, pad_x = int((bottom - top) * self.margin), int((right - left) * self.margin)
+        crop = rgb_frame[max(0, top - pad_y):min(height, bottom + pad_y),
+                         max(0, left - pad_x):min(width, right + pad_x)]
+        return cv2.resize(crop, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+
+    def _forward(self, crops):
+        blob = cv2.dnn.blobFromImages(crops, scalefactor=1.0, size=(self.input_size, self.input_size),
+                                      swapRB=False)
+        self.net.setInput(blob)
+        return self.net.forward().reshape(len(crops), -1).astype(np.float32)
+
+    def embed(self, rgb_frame, locations):
+        if not locations:
+            return []
+        features = self._forward([self._crop(rgb_frame, loc) for loc in locations])
+        features /= np.maximum(np.linalg.norm(features, axis=1, keepdims=True), 1e-12)
+        return list(features)
+
+
+def create_embedder(name, settings=None):
+    """按名称创建特征后端，参数取自 System_Settings；失败时退回 dlib"""
+    settings = settings or {}
+    if name == OnnxEmbedder.name:
+        try:
+            return OnnxEmbedder(get_path(settings, "FACE_ONNX_MODEL", DEFAULT_ONNX_MODEL),
+                                get_int(settings, "FACE_ONNX_INPUT", 112))
+        except Exception as e:
+            print(f"[Face] 特征后端 onnx 不可用，使用 dlib / Modèle indisponible: {e}")
+    elif name != DlibEmbedder.name:
+        print(f"[Face] 未知特征后端 '{name}'，使用 dlib / Modèle inconnu")
+    return DlibEmbedder()
@@ -0,0 +1,318 @@
+import threading
+import numpy as np
+from hardware.face_index import IvfIndex
+
+# dlib ResNet 人脸特征维度
+EMBEDDING_DIM = 128
+# Face_Embeddings.embedding 的存储格式: 小端 float32 原始字节
+BLOB_DTYPE = np.dtype("<f4")
+
+
+def encoding_to_blob(encoding):
+    """特征向量 -> BLOB 字节"""
+    return np.asarray(encoding, dtype=BLOB_DTYPE).tobytes()
+
+
+def blobs_to_matrix(blobs, dim=EMBEDDING_DIM):
+    """多个 BLOB 一次性拼接解码为 (N, dim) float32 矩阵，无需逐个解析"""
+    if not blobs:
+        return np.empty((0, dim), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype=BLOB_DTYPE).reshape(len(blobs), dim).astype(np.float32)
+
+
+# 特征库存储精度
+GALLERY_DTYPES = ("float32", "float16", "int8")
+BLOCK_ROWS = 4096 # 量化库分块反量化的行数，临时缓冲保持在 CPU 缓存量级
+INDEX_RETRAIN_GROWTH = 2.0 # 库大小相对训练时增长/缩小到该倍数时重新训练 IVF
+
+
+class FaceGallery:
+    """
+    人脸特征库索引 (Galerie de visages)
+    所有特征向量存放在一个连续矩阵中，并预先计算好每一行的平方范数。
+    一帧中的所有人脸只需一次矩阵乘法 (BLAS) 即可与整个库比对:
+        ||q - g||^2 = ||q||^2 + ||g||^2 - 2 * q.g
+    dtype 可选 float32 / float16 / int8 (每个向量一个缩放系数)：
+    量化后内存减为 1/2 或 1/4，比对时按块反量化，内存带宽随之减少。
+    平方范数按量化后的向量计算，距离与存储的向量严格一致。
+
+    index_min > 0 时，库大小达到 index_min 后启用 IVF 近似索引 (见 hardware/face_index.py)：
+    只对最近 nprobe 个聚类中的候选计算精确距离，这是近似检索：
+      - 候选中最近距离不低于 exact_above (识别阈值) 时退回全库精确比对，陌生人不会因漏扫而被误接受；
+      - 最近距离落在阈值下方 exact_margin 以内 (接近阈值的弱匹配) 时同样用全库比对复核；
+      - 更低的距离直接接受。另一个用户的更近特征仍可能落在未扫描的聚类中，
+        此时返回的身份与线性扫描不同。nprobe 越大越接近精确结果、查询越慢，
+        取舍见 tools/benchmark_gallery.py 的身份一致率 (identity agreement)。
+
+    同一用户可以有多行特征 (多角度录入，见 hardware/face_quality.py)：match() 按用户返回结果，
+    每个用户的距离取其所有特征中的最小值，整库一次 np.minimum.reduceat 完成，无需逐用户循环。
+    """
+    def __init__(self, dim=EMBEDDING_DIM, dtype="float32", index_min=0, nprobe=8, exact_above=None,
+                 exact_margin=0.0):
+        if dtype not in GALLERY_DTYPES:
+            raise ValueError(f"不支持的精度 / Précision inconnue: {dtype}")
+        self.dim = dim
+        self.dtype = dtype
+        self.index_min = index_min
+        self.nprobe = nprobe
+        self.exact_above = exact_above
+        self.exact_margin = exact_margin
+        self.index_stats = {"queries": 0, "fallbacks": 0, "candidates": 0, "trainings": 0}
+        self._lock = threading.Lock()
+        # 快照 (ids, matrix, sq_norms, scales, lists, ivf, offsets, users) 整体替换，读取方无需加锁
+        # scales 仅 int8 使用；启用索引时各行按聚类号 lists 排序，
+        # 第 l 个聚类是连续的 [offsets[l], offsets[l+1]) 行；未启用索引时 lists/ivf/offsets 为 None
+        # users 为按用户分组的 (user_ids, order, starts)，每个用户只有一行特征时为 None
+        self._data = self._pack(np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32))
+
+    def __len__(self):
+        """特征行数 (一个用户可能有多行)"""
+        return len(self._data[0])
+
+    @property
+    def user_count(self):
+        users = self._data[7]
+        return len(self._data[0]) if users is None else len(users[0])
+
+    @property
+    def ids(self):
+        return self._data[0]
+
+    @property
+    def nbytes(self):
+        """特征矩阵及辅助数组占用的字节数"""
+        ivf, users = self._data[5], self._data[7]
+        return (sum(a.nbytes for a in self._data if isinstance(a, np.ndarray))
+                + (ivf.centroids.nbytes if ivf is not None else 0)
+                + (sum(a.nbytes for a in users) if users is not None else 0))
+
+    @property
+    def index(self):
+        """当前的 IvfIndex (未启用或库太小时为 None)"""
+        return self._data[5]
+
+    def export(self):
+        """
+        当前快照的 (ids, float32 矩阵)，用于发布共享快照文件 (hardware/gallery_file.py)；
+        量化存储 (float16/int8) 已丢失精度，返回 None，由调用方从数据库读取原始特征
+        """
+        ids, matrix = self._data[:2]
+        if matrix.dtype != np.float32:
+            return None
+        return ids, matrix
+
+    def build(self, ids, encodings):
+        """用新的 (ids, encodings) 整体替换特征库"""
+        ids, matrix = self._prepare(ids, encodings)
+        ivf = self._train_index(matrix) if self._wants_index(len(ids), None) else None
+        data = self._pack(ids, matrix, ivf)
+        with self._lock:
+            self._data = data
+
+    def apply(self, changed_ids, ids, encodings):
+        """
+        增量更新：先删除 changed_ids 中所有用户的特征，再追加新的 (ids, encodings)。
+        采用写时复制 (copy-on-write)，正在进行的 match() 仍使用旧快照，无需暂停识别线程。
+        """
+        ids, matrix = self._prepare(ids, encodings)
+        with self._lock:
+            old = self._data
+            ivf = old[5]
+            added = self._pack(ids, matrix, ivf)
+            keep = ~np.isin(old[0], np.asarray(changed_ids, dtype=np.int64))
+            rows = tuple(
+                None if a is None else np.concatenate((a[keep], b))
+                for a, b in zip(old[:5], added[:5])
+            )
+            if self._wants_index(len(rows[0]), ivf):
+                # 库规模变化较大：在全部 (反量化后的) 特征上重新训练并重新分配聚类
+                stored = self._dequantize(rows[1], rows[3], 0, len(rows[1]))
+                ivf = self._train_index(stored)
+                rows = rows[:4] + (ivf.assign(stored),)
+            elif ivf is not None and len(rows[0]) < self.index_min:
+                ivf = None
+            self._data = self._grouped(rows, ivf)
+
+    def remove(self, user_ids):
+        """立即移除指定用户的特征"""
+        self.apply(user_ids, [], np.empty((0, self.dim), dtype=np.float32))
+
+    def _prepare(self, ids, encodings):
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        matrix = np.ascontiguousarray(encodings, dtype=np.float32).reshape(len(ids), self.dim)
+        return ids, matrix
+
+    def _wants_index(self, size, ivf):
+        """是否需要 (重新) 训练 IVF 索引"""
+        if not self.index_min or size < self.index_min:
+            return False
+        if ivf is None:
+            return True
+        growth = size / max(1, ivf.trained_size)
+        return growth >= INDEX_RETRAIN_GROWTH or growth <= 1.0 / INDEX_RETRAIN_GROWTH
+
+    def _train_index(self, matrix):
+        self.index_stats["trainings"] += 1
+        return IvfIndex.train(matrix)
+
+    def _pack(self, ids, matrix, ivf=None):
+        """float32 矩阵 -> 按 self.dtype 存储的快照"""
+        lists = ivf.assign(matrix) if ivf is not None else None
+        scales = None
+        if self.dtype == "float16":
+            matrix = matrix.astype(np.float16)
+        elif self.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.empty(0, dtype=np.float32)
+            scales = np.maximum(scales, 1e-12).astype(np.float32)
+            matrix = np.rint(matrix / scales[:, None]).astype(np.int8)
+        stored = self._dequantize(matrix, scales, 0, len(matrix))
+        sq_norms = np.einsum("ij,ij->i", stored, stored)
+        return self._grouped((ids, matrix, sq_norms, scales, lists), ivf)
+
+    @staticmethod
+    def _grouped(rows, ivf):
+        """按聚类号重排各行，使每个聚类在矩阵中连续 (查询时直接切片，无需复制)"""
+        if ivf is None:
+            return rows[:4] + (None, None, None, FaceGallery._users(rows[0]))
+        lists = rows[4]
+        order = np.argsort(lists, kind="stable")
+        offsets = np.zeros(ivf.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=ivf.nlist), out=offsets[1:])
+        rows = tuple(None if a is None else a[order] for a in rows)
+        return rows + (ivf, offsets, FaceGallery._users(rows[0]))
+
+    @staticmethod
+    def _users(ids):
+        """
+        按用户分组: user_ids[j] 的特征是 order[starts[j]:starts[j+1]] 这些行。
+        每个用户只有一行时返回 None (按行比对即按用户比对)
+        """
+        if len(ids) < 2:
+            return None
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1])))
+        if len(starts) == len(ids):
+            return None
+        return sorted_ids[starts], order, starts
+
+    @staticmethod
+    def _per_user(snapshot, dist):
+        """(N_faces, N_rows) 行距离 -> (用户 ids, (N_faces, N_users) 用户距离)，取每个用户最近的一行"""
+        users = snapshot[7]
+        if users is None:
+            return snapshot[0], dist
+        user_ids, order, starts = users
+        return user_ids, np.minimum.reduceat(dist[:, order], starts, axis=1)
+
+    @staticmethod
+    def _best_per_user(user_of_row, dist):
+        """候选行 -> 每个用户距离最小的一行 (IVF 候选只有少量行，按 (用户, 距离) 排序后取每组第一行)"""
+        order = np.lexsort((dist, user_of_row))
+        sorted_users = user_of_row[order]
+        first = np.concatenate(([True], sorted_users[1:] != sorted_users[:-1]))
+        keep = order[first]
+        return user_of_row[keep], dist[keep]
+
+    @staticmethod
+    def _dequantize(matrix, scales, start, stop, out=None):
+        block = matrix[start:stop]
+        if block.dtype == np.float32:
+            return block
+        if out is None:
+            out = np.empty(block.shape, dtype=np.float32)
+        else:
+            out = out[:len(block)]
+        np.copyto(out, block, casting="unsafe")
+        if scales is not None:
+            out *= scales[start:stop, None]
+        return out
+
+    def _distances(self, snapshot, encodings):
+        _, matrix, sq_norms, scales = snapshot[:4]
+        queries = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        if matrix.dtype == np.float32:
+            d2 = queries @ matrix.T
+        else:
+            d2 = np.empty((len(queries), len(matrix)), dtype=np.float32)
+            buf = np.empty((min(BLOCK_ROWS, len(matrix)), self.dim), dtype=np.float32)
+            for start in range(0, len(matrix), BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, len(matrix))
+                block = self._dequantize(matrix, scales, start, stop, out=buf)
+                np.matmul(queries, block.T, out=d2[:, start:stop])
+        d2 *= -2.0
+        d2 += q_norms[:, None]
+        d2 += sq_norms[None, :]
+        np.maximum(d2, 0.0, out=d2) # 浮点误差可能产生极小的负数
+        return np.sqrt(d2, out=d2)
+
+    def distances(self, encodings):
+        """返回 (N_faces, N_gallery) 的欧氏距离矩阵"""
+        return self._distances(self._data, encodings)
+
+    def match(self, encodings, k=1):
+        """
+        批量比对：返回 (top_ids, top_distances)，形状均为 (N_faces, k)，按距离升序排列。
+        每个用户最多出现一次，距离为该用户所有特征中的最小值。
+        特征库为空时返回两个空数组。启用索引时第 2~k 个候选只来自扫描过的聚类。
+        """
+        snapshot = self._data
+        ids = snapshot[0]
+        n_faces = len(encodings)
+        if n_faces == 0 or len(ids) == 0:
+            return np.empty((n_faces, 0), dtype=np.int64), np.empty((n_faces, 0), dtype=np.float32)
+
+        users = snapshot[7]
+        k = min(k, len(ids) if users is None else len(users[0]))
+        if snapshot[5] is not None:
+            return self._match_indexed(snapshot, encodings, k)
+        user_ids, dist = self._per_user(snapshot, self._distances(snapshot, encodings))
+        top, top_dist = self._top_k(dist, k)
+        return user_ids[top], top_dist
+
+    @staticmethod
+    def _top_k(dist, k):
+        """每行距离最小的 k 列 (按升序)，返回 (列号, 距离)"""
+        if k < dist.shape[1]:
+            top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(dist.shape[1]), dist.shape)
+        top_dist = np.take_along_axis(dist, top, axis=1)
+        order = np.argsort(top_dist, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_dist, order, axis=1)
+
+    def _match_indexed(self, snapshot, encodings, k):
+        """IVF 候选 + 精确距离重排 (近似)；候选不足、未达阈值或接近阈值时退回全库比对"""
+        ids, ivf, offsets = snapshot[0], snapshot[5], snapshot[6]
+        queries = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        probes = ivf.probe(queries, self.nprobe)
+        top_ids = np.empty((len(queries), k), dtype=np.int64)
+        top_dist = np.empty((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            rows, dists = [], []
+            for l in probes[i]:
+                start, stop = offsets[l], offsets[l + 1]
+                if start == stop:
+                    continue
+                # 候选行上的距离与全库扫描的计算完全相同 (精确重排)
+                block = tuple(None if a is None else a[start:stop] for a in snapshot[:4])
+                dists.append(self._distances(block, query))
+                rows.append(np.arange(start, stop))
+            n_candidates = sum(len(r) for r in rows)
+            self.index_stats["queries"] += 1
+            self.index_stats["candidates"] += n_candidates
+            if n_candidates >= k:
+                rows = np.concatenate(rows)
+                # 同一用户的多行特征可能落在不同聚类，候选中只保留每个用户最近的一行
+                cand_ids, cand_dist = self._best_per_user(ids[rows], np.concatenate(dists, axis=1)[0])
+                if len(cand_ids) >= k:
+                    top, dist = self._top_k(cand_dist[None, :], k)
+                    if self.exact_above is None or dist[0, 0] < self.exact_above - self.exact_margin:
+                        top_ids[i], top_dist[i] = cand_ids[top[0]], dist[0]
+                        continue
+            self.index_stats["fallbacks"] += 1
+            user_ids, dist = self._per_user(snapshot, self._distances(snapshot, query))
+            top, dist = self._top_k(dist, k)
+            top_ids[i], top_dist[i] = user_ids[top[0]], dist[0]
+        return top_ids, top_dist
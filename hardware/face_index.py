@@ -0,0 +1,66 @@
+import numpy as np
+
+TRAIN_ITERATIONS = 10  # k-means 迭代次数
+TRAIN_SAMPLE = 64      # 每个聚类最多使用的训练样本数
+
+
+def _sq_distances(vectors, centroids, c_norms):
+    """(N, dim) x (nlist, dim) 的平方距离 (省略 ||v||^2，只用于比较大小)"""
+    d2 = vectors @ centroids.T
+    d2 *= -2.0
+    d2 += c_norms[None, :]
+    return d2
+
+
+class IvfIndex:
+    """
+    倒排文件 (IVF) 粗量化器 (Index inversé)
+    用 k-means 把特征库划分为 nlist 个聚类；查询时只扫描离查询最近的 nprobe 个聚类。
+    本对象只保存聚类中心，训练后不再修改；每行特征所属的聚类号由 FaceGallery 与特征一起保存，
+    新增特征直接分配到最近的聚类，因此增量同步无需重新训练。
+    """
+    def __init__(self, centroids, trained_size):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.c_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.trained_size = trained_size
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, matrix, nlist=None, seed=0):
+        """在 float32 特征矩阵上训练聚类中心，nlist 默认取 sqrt(N)"""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        n = len(matrix)
+        nlist = max(1, min(n, nlist or int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = matrix
+        if n > nlist * TRAIN_SAMPLE:
+            sample = matrix[rng.choice(n, nlist * TRAIN_SAMPLE, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(TRAIN_ITERATIONS):
+            c_norms = np.einsum("ij,ij->i", centroids, centroids)
+            labels = _sq_distances(sample, centroids, c_norms).argmin(axis=1)
+            counts = np.bincount(labels, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            filled = counts > 0
+            # 空聚类保留原中心
+            centroids[filled] = sums[filled] / counts[filled, None]
+        return cls(centroids, n)
+
+    def assign(self, vectors):
+        """返回每个向量所属的聚类号 (int32)"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return np.empty(0, dtype=np.int32)
+        return _sq_distances(vectors, self.centroids, self.c_norms).argmin(axis=1).astype(np.int32)
+
+    def probe(self, queries, nprobe):
+        """返回每个查询最近的 nprobe 个聚类号，形状 (N_queries, nprobe)"""
+        d2 = _sq_distances(queries, self.centroids, self.c_norms)
+        nprobe = min(nprobe, self.nlist)
+        if nprobe == self.nlist:
+            return np.broadcast_to(np.arange(self.nlist), d2.shape)
+        return np.argpartition(d2, nprobe - 1, axis=1)[:, :nprobe]
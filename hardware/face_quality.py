@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+QUALITY_SIZE = 64          # 评分前把人脸区域缩放到的边长 (像素)
+SHARPNESS_REF = 150.0      # 拉普拉斯方差达到该值即视为完全清晰
+FACE_SIZE_REF = 0.35       # 人脸高度达到画面高度的该比例即视为足够大
+ENROLL_OUTLIER = 0.45      # 与中心特征的距离超过该值的样本视为异常 (检测错位/换人)
+
+
+def face_quality(rgb_frame, location):
+    """
+    单张人脸的录入质量评分，返回 {sharpness, size, pose, score} (均在 0~1)：
+      sharpness  人脸区域的拉普拉斯方差 (运动模糊/失焦)
+      size       人脸高度相对画面高度
+      pose       左右半脸镜像后的相关系数，正脸接近 1，侧脸明显降低
+    score 为三项的乘积，任一项差都会拉低总分。
+    """
+    top, right, bottom, left = location
+    crop = rgb_frame[max(0, top):bottom, max(0, left):right]
+    if crop.size == 0:
+        return {"sharpness": 0.0, "size": 0.0, "pose": 0.0, "score": 0.0}
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    face = cv2.resize(gray, (QUALITY_SIZE, QUALITY_SIZE), interpolation=cv2.INTER_AREA)
+
+    sharpness = min(1.0, cv2.Laplacian(face, cv2.CV_32F).var() / SHARPNESS_REF)
+    size = min(1.0, (bottom - top) / (rgb_frame.shape[0] * FACE_SIZE_REF))
+    half = QUALITY_SIZE // 2
+    mirrored = cv2.flip(face[:, half:], 1)
+    pose = max(0.0, float(cv2.matchTemplate(face[:, :half], mirrored, cv2.TM_CCOEFF_NORMED)[0, 0]))
+    return {"sharpness": float(sharpness), "size": float(size), "pose": pose,
+            "score": float(sharpness * size * pose)}
+
+
+class EnrollmentBurst:
+    """
+    多帧录入 (Inscription multi-images)
+    录入时连续采集一组只有一张人脸的帧，每一帧交给线程池评分 (OpenCV 运算释放 GIL)，
+    采集和检测不必等待评分完成；best() 等待全部评分后按质量返回最好的几帧。
+    """
+    def __init__(self, workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="FaceQuality")
+        self._samples = []  # [(future, rgb_frame, location)]
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, rgb_frame, location):
+        """登记一帧 (帧在评分和提取特征前不能被修改)"""
+        self._samples.append((self._pool.submit(face_quality, rgb_frame, location), rgb_frame, location))
+
+    def best(self, count, min_score=0.0):
+        """返回质量最高的 count 帧 [(评分, rgb_frame, location)]，低于 min_score 的帧被丢弃"""
+        scored = [(future.result(), frame, location) for future, frame, location in self._samples]
+        scored = [s for s in scored if s[0]["score"] >= min_score]
+        scored.sort(key=lambda s: s[0]["score"], reverse=True)
+        return scored[:count]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self._samples = []
+
+
+def select_diverse(encodings, count, outlier=ENROLL_OUTLIER):
+    """
+    从候选特征中挑选 count 个互相差异最大的特征 (行号列表)：
+      1. 以中心特征 (到其他特征距离之和最小) 为起点，剔除离它超过 outlier 的异常样本；
+      2. 依次加入与已选特征最小距离最大的样本 (最远点采样)，覆盖表情/角度的变化。
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    if len(encodings) == 0:
+        return []
+    dist = np.linalg.norm(encodings[:, None, :] - encodings[None, :, :], axis=2)
+    center = int(np.argmin(dist.sum(axis=1)))
+    candidates = np.flatnonzero(dist[center] <= outlier)
+    chosen = [center]
+    nearest = dist[center, candidates].copy()
+    while len(chosen) < min(count, len(candidates)):
+        pick = int(np.argmax(nearest))
+        if nearest[pick] <= 0.0:
+            break # 剩下的都是重复帧
+        chosen.append(int(candidates[pick]))
+        np.minimum(nearest, dist[candidates[pick], candidates], out=nearest)
+    return chosen
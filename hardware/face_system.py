@@ -1,11 +1,21 @@
 import cv2
-import face_recognition
 import sqlite3
 import json
-import numpy as np
 import time
 import warnings
 import os
+from hardware.camera import FrameGrabber, camera_pipeline_candidates, cached_pipeline, clear_pipeline_cache
+from hardware.camera_broker import CameraBroker, BrokerClient
+from hardware.frame_gate import FrameGate, REJECT_BLUR
+from hardware.face_tracker import FaceTracker
+from hardware.face_vote import IdentityVoter
+from hardware.settings import load_settings, get_bool, get_float, get_int, get_path, get_str
+from hardware.face_detectors import create_detector
+from hardware.face_embedders import create_embedder
+from hardware.preprocess import FramePreprocessor
+from hardware.scan_scheduler import ScanScheduler, SCAN_FACE, SCAN_MOTION, SCAN_IDLE, SCAN_STALE
+from hardware.face_gallery import FaceGallery, blobs_to_matrix, encoding_to_blob
+from hardware.gallery_file import GalleryFile, publish_gallery, write_gallery_file
 
 # 屏蔽无关紧要的警告
 warnings.filterwarnings("ignore", category=UserWarning, module="face_recognition_models")
@@ -16,140 +26,509 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 DATABASE_NAME = os.path.join(PROJECT_ROOT, "capsule_dispenser.db")
 
+MATCH_THRESHOLD = 0.35 # 单帧强匹配的特征距离阈值
+MATCH_TOP_K = 3        # 每张人脸返回的候选数 (用于日志)
+SYNC_INTERVAL = 2.0    # 增量同步人脸库的间隔 (秒)
+CHANGE_LOG_KEEP = 1000 # Face_Changes 中保留的最近变更条数
+STATS_INTERVAL = 60    # 打印预筛统计的间隔 (秒)
+TRACK_MAX_GAP = 1.5    # 两次扫描间隔超过该值 (秒) 时丢弃所有轨迹
+
+def scale_locations(locations, factor, shape):
+    """把低分辨率图上的 (top, right, bottom, left) 检测框映射回原图坐标"""
+    height, width = shape[:2]
+    mapped = []
+    for top, right, bottom, left in locations:
+        mapped.append((
+            max(0, int(top / factor)),
+            min(width, int(round(right / factor))),
+            min(height, int(round(bottom / factor))),
+            max(0, int(left / factor)),
+        ))
+    return mapped
+
 class FaceRecognizer:
-    def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_ids = []
+    """
+    open_camera=False 用于独立的识别进程：帧由共享内存提供，见 hardware/face_worker.py
+    load_gallery=False 用于只负责摄像头和录入的主进程
+    """
+    def __init__(self, open_camera=True, load_gallery=True):
+        self.sync_seq = None      # 已同步到的 Face_Changes.seq (None = 不支持增量同步)
+        self.last_sync_time = 0
         self.cap = None
-        self.last_scan_time = 0
-        self.scan_interval = 0.5  # 限制识别频率
+        self.grabber = None       # 后台取帧线程 (最新帧缓冲)，或摄像头代理的客户端
+        self.broker = None        # 本进程拥有摄像头时，向其他进程共享画面的代理
+        self.frame_color = "BGR"  # appsink 输出帧的颜色空间
+        self.frame_rotated = False # 管道内是否已完成旋转
+        self.last_frame_seq = 0   # 上次识别所用帧的序号
         self.no_face_count = 0    # 调试计数器
+        self.last_stats_time = time.time()
+
+        # 0. 读取可调参数 (System_Settings)
+        self.settings = load_settings(DATABASE_NAME)
+        self.gate = self._create_gate()
+        # 自适应扫描间隔: 有人脸时加快，空场景时指数退避，并受 CPU 预算限制
+        self.scheduler = ScanScheduler(
+            face_interval=get_float(self.settings, "FACE_SCAN_FACE_INTERVAL", 0.1),
+            motion_interval=get_float(self.settings, "FACE_SCAN_MOTION_INTERVAL", 0.25),
+            max_interval=get_float(self.settings, "FACE_SCAN_MAX_INTERVAL", 1.0),
+            backoff=get_float(self.settings, "FACE_SCAN_BACKOFF", 1.6),
+            cpu_budget=get_float(self.settings, "FACE_CPU_BUDGET", 0.6),
+        )
+        # 特征后端 (dlib / onnx) 与人脸库存储精度 (float32 / float16 / int8)
+        self.embedder = create_embedder(get_str(self.settings, "FACE_EMBEDDER", "dlib"), self.settings)
+        # 库达到 FACE_INDEX_MIN 人后启用 IVF 近似索引；未达阈值或接近阈值时退回精确比对 (拒绝判定不变，
+        # 明确的匹配直接接受，极少数情况下身份可能与线性扫描不同，见 FaceGallery)
+        cfg = self.settings
+        self.gallery = FaceGallery(
+            dim=self.embedder.dim,
+            dtype=get_str(cfg, "FACE_GALLERY_DTYPE", "float32"),
+            index_min=get_int(cfg, "FACE_INDEX_MIN", 10000),
+            nprobe=get_int(cfg, "FACE_INDEX_NPROBE", 8),
+            exact_above=max(get_float(cfg, "FACE_MATCH_THRESHOLD", MATCH_THRESHOLD),
+                            get_float(cfg, "FACE_VOTE_THRESHOLD", 0.42)),
+            exact_margin=get_float(cfg, "FACE_INDEX_EXACT_MARGIN", 0.05),
+        )
+        # 共享快照文件: 库内容与数据库一致时直接映射 (不复制)，库变化后由识别进程重新发布
+        self.gallery_path = get_path(cfg, "FACE_GALLERY_FILE", "face_gallery.bin")
+        self.gallery_generation = None
+        # 预处理 (旋转/转色/增强) 复用固定缓冲区；旋转和颜色在 scan_from 中按帧源设置
+        self.preprocessor = FramePreprocessor(
+            enhancer=get_str(self.settings, "FACE_ENHANCER", "clahe"),
+            clip_limit=get_float(self.settings, "FACE_CLAHE_CLIP", 3.0),
+            lut_gamma=get_float(self.settings, "FACE_LUT_GAMMA", 1.0),
+        )
+        # 双分辨率: 在缩小的图上检测，在原图上提取特征
+        self.detect_scale = min(1.0, max(0.1, get_float(self.settings, "FACE_DETECT_SCALE", 0.5)))
+        # 检测后端 (hog / yunet / haar)，可用 tools/benchmark_detectors.py 选择
+        self.detector = create_detector(get_str(self.settings, "FACE_DETECTOR", "hog"), self.settings)
+        self.metrics = {"detector": self.detector.name, "detect_scale": self.detect_scale, "detect_size": None,
+                        "detect_ms": 0.0, "encode_ms": 0.0, "faces": 0,
+                        "detections": 0, "tracked_frames": 0, "encodings": 0}
+        # 跨帧跟踪: 每 N 帧才完整检测一次，身份判定按轨迹缓存
+        self.tracker = FaceTracker(detect_every=max(1, get_int(self.settings, "FACE_TRACK_DETECT_EVERY", 4)),
+                                   retry_every=1)
+        self.last_track_time = 0
+        self.stage_ms = {}
+        self.last_matches = []
+        # 多帧投票: 单帧强匹配立即通过，边缘匹配需要连续几帧一致
+        self.voter = IdentityVoter(
+            strong_threshold=get_float(cfg, "FACE_MATCH_THRESHOLD", MATCH_THRESHOLD),
+            vote_threshold=get_float(cfg, "FACE_VOTE_THRESHOLD", 0.42),
+            window=get_int(cfg, "FACE_VOTE_WINDOW", 5),
+            min_votes=get_int(cfg, "FACE_VOTE_MIN", 3),
+            max_mean=get_float(cfg, "FACE_VOTE_MAX_MEAN", 0.40),
+        )
         
         # 1. 加载已知人脸
-        self.load_faces_from_db()
+        if load_gallery:
+            self.load_faces_from_db()
         
         # 2. 初始化摄像头
-        self.init_camera()
+        if open_camera:
+            self.init_camera()
+
+    def _create_gate(self):
+        """根据 System_Settings 创建检测前预筛 (FACE_GATE_*)"""
+        cfg = self.settings
+        if not get_bool(cfg, "FACE_GATE_ENABLED", True):
+            return None
+        return FrameGate(
+            min_brightness=get_float(cfg, "FACE_GATE_MIN_BRIGHTNESS", 35),
+            max_brightness=get_float(cfg, "FACE_GATE_MAX_BRIGHTNESS", 225),
+            motion_threshold=get_float(cfg, "FACE_GATE_MOTION", 3.0),
+            blur_threshold=get_float(cfg, "FACE_GATE_BLUR", 40.0),
+            hold_time=get_float(cfg, "FACE_GATE_HOLD", 2.0),
+        )
 
     def load_faces_from_db(self):
-        """从数据库加载所有已录入的人脸特征"""
+        """
+        全量加载所有启用用户的人脸特征 (Face_Embeddings 表, float32 BLOB)。
+        共享快照文件与数据库的变更计数一致时直接映射快照，否则读取数据库并重新发布快照。
+        """
         print("[Face] 正在加载人脸数据库 / Chargement de la BDD visages...")
         try:
-            conn = sqlite3.connect(DATABASE_NAME)
+            conn = sqlite3.connect(DATABASE_NAME, isolation_level=None)
             cursor = conn.cursor()
-            cursor.execute("SELECT user_id, name, face_encoding FROM Users WHERE face_encoding IS NOT NULL")
-            rows = cursor.fetchall()
-            
-            self.known_face_encodings = []
-            self.known_face_ids = []
-            count = 0
-            
-            for uid, name, encoding_json in rows:
-                if encoding_json:
-                    try:
-                        encoding_list = json.loads(encoding_json)
-                        encoding_np = np.array(encoding_list)
-                        self.known_face_encodings.append(encoding_np)
-                        self.known_face_ids.append(uid)
-                        count += 1
-                    except Exception as e:
-                        print(f"  用户 {name} (ID {uid}) 数据损坏 / Données corrompues: {e}")
-            
+            try:
+                # 在同一个读事务中读取特征和变更计数，保证两者一致
+                cursor.execute("BEGIN")
+                seq = self._read_change_seq(cursor)
+                snapshot = self._open_snapshot(seq)
+                if snapshot is not None:
+                    cursor.execute("COMMIT")
+                    conn.close()
+                    self._use_snapshot(snapshot)
+                    return
+                cursor.execute("""
+                    SELECT e.user_id, e.embedding FROM Face_Embeddings e
+                    JOIN Users u ON u.user_id = e.user_id
+                    WHERE u.is_active = 1 AND e.model = ? AND e.dim = ?
+                """, (self.embedder.name, self.gallery.dim))
+                rows = cursor.fetchall()
+                self.sync_seq = seq
+                cursor.execute("COMMIT")
+            except sqlite3.OperationalError:
+                print("[Face] 数据库结构过旧，请运行 tools/setup_database.py / Schéma obsolète")
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                rows = self._load_legacy_rows(cursor)
+                self.sync_seq = None
             conn.close()
-            print(f"[Face] 已加载 {count} 个用户的人脸数据 / {count} visages chargés")
+
+            ids = [uid for uid, _ in rows]
+            self.gallery.build(ids, blobs_to_matrix([blob for _, blob in rows], self.gallery.dim))
+            count = self.gallery.user_count
+            print(f"[Face] 已加载 {count} 个用户的人脸数据 ({len(ids)} 个特征) / {count} visages chargés")
+            self._publish_snapshot()
         except Exception as e:
             print(f"[Face] 数据库加载失败 / Erreur de chargement BDD: {e}")
 
+    def _open_snapshot(self, seq):
+        """映射共享快照；只有特征模型、维度和变更计数都与数据库一致时才可用"""
+        snapshot = GalleryFile.open(self.gallery_path)
+        if (snapshot is None or snapshot.model != self.embedder.name or snapshot.dim != self.gallery.dim
+                or snapshot.change_seq != seq):
+            return None
+        return snapshot
+
+    def _use_snapshot(self, snapshot):
+        """直接用映射的矩阵建立人脸库 (float32 存储时不复制特征数据)"""
+        self.gallery.build(snapshot.ids, snapshot.matrix)
+        self.sync_seq = snapshot.change_seq
+        self.gallery_generation = snapshot.generation
+        count = self.gallery.user_count
+        print(f"[Face] 已映射人脸库快照 (第 {snapshot.generation} 代, {count} 个用户) / "
+              f"Galerie partagée: {count} visages")
+
+    def _publish_snapshot(self):
+        """把当前人脸库发布为共享快照 (原子替换)；旧版数据库无法确定变更计数，不发布"""
+        if self.sync_seq is None:
+            return
+        exported = self.gallery.export()
+        try:
+            if exported is None:
+                # 量化存储已丢失精度，从数据库读取原始特征发布
+                self.gallery_generation = publish_gallery(DATABASE_NAME, self.embedder.name, self.gallery.dim,
+                                                          self.gallery_path)
+            else:
+                self.gallery_generation = write_gallery_file(*exported, self.embedder.name, self.sync_seq,
+                                                             self.gallery_path)
+        except OSError as e:
+            print(f"[Face] 无法发布人脸库快照 / Erreur publication galerie: {e}")
+
+    def _read_change_seq(self, cursor):
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM Face_Changes")
+        return cursor.fetchone()[0]
+
+    def sync_faces(self):
+        """
+        增量同步：只读取上次同步之后 Face_Changes 中记录的用户，
+        并对人脸库执行插入/更新/删除。返回本次变化的用户数 (全量重载或重新映射快照时为库中的用户数)。
+        """
+        if self.sync_seq is None:
+            self.load_faces_from_db()
+            return self.gallery.user_count
+
+        self.last_sync_time = time.time()
+        try:
+            conn = sqlite3.connect(DATABASE_NAME, isolation_level=None)
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            latest = self._read_change_seq(cursor)
+            if latest == self.sync_seq:
+                cursor.execute("COMMIT")
+                conn.close()
+                return 0
+
+            # 录入工具已发布了与数据库一致的快照：直接重新映射，无需读取特征
+            snapshot = self._open_snapshot(latest)
+            if snapshot is not None:
+                cursor.execute("COMMIT")
+                conn.close()
+                self._use_snapshot(snapshot)
+                return self.gallery.user_count
+
+            cursor.execute("SELECT MIN(seq) FROM Face_Changes WHERE seq > ?", (self.sync_seq,))
+            oldest = cursor.fetchone()[0]
+            if oldest is None or oldest > self.sync_seq + 1:
+                # 日志已被清理，无法确定遗漏了哪些变更 -> 全量重载
+                cursor.execute("COMMIT")
+                conn.close()
+                self.load_faces_from_db()
+                return self.gallery.user_count
+
+            cursor.execute("SELECT DISTINCT user_id FROM Face_Changes WHERE seq > ? AND seq <= ?",
+                           (self.sync_seq, latest))
+            changed = [row[0] for row in cursor.fetchall()]
+            placeholders = ",".join("?" * len(changed))
+            cursor.execute(f"""
+                SELECT e.user_id, e.embedding FROM Face_Embeddings e
+                JOIN Users u ON u.user_id = e.user_id
+                WHERE u.is_active = 1 AND e.model = ? AND e.dim = ? AND e.user_id IN ({placeholders})
+            """, (self.embedder.name, self.gallery.dim, *changed))
+            rows = cursor.fetchall()
+            cursor.execute("COMMIT")
+
+            # 清理旧的变更记录，避免日志无限增长
+            cursor.execute("DELETE FROM Face_Changes WHERE seq <= ?", (latest - CHANGE_LOG_KEEP,))
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"[Face] 增量同步失败 / Erreur de synchro: {e}")
+            return 0
+
+        self.gallery.apply(changed, [uid for uid, _ in rows],
+                           blobs_to_matrix([blob for _, blob in rows], self.gallery.dim))
+        self.sync_seq = latest
+        print(f"[Face] 人脸库已同步 {len(changed)} 个用户 / {len(changed)} visages synchronisés")
+        self._publish_snapshot()
+        return len(changed)
+
+    def reset_tracks(self):
+        """丢弃所有轨迹及其投票 (回放下一段无关的画面之前调用)"""
+        self.tracker.reset()
+        self.last_frame_seq = 0
+
+    def remove_user(self, user_id):
+        """立即从人脸库中移除用户 (无需等待下一次同步)"""
+        self.gallery.remove([user_id])
+
+    def _load_legacy_rows(self, cursor):
+        """兼容 v1 数据库: 解析 Users.face_encoding 中的 JSON 文本 (只有 dlib 特征)"""
+        if self.embedder.name != "dlib":
+            return []
+        cursor.execute("SELECT user_id, name, face_encoding FROM Users WHERE face_encoding IS NOT NULL")
+        rows = []
+        for uid, name, encoding_json in cursor.fetchall():
+            try:
+                rows.append((uid, encoding_to_blob(json.loads(encoding_json))))
+            except Exception as e:
+                print(f"  用户 {name} (ID {uid}) 数据损坏 / Données corrompues: {e}")
+        return rows
+
     def init_camera(self):
         """使用 Pi 5 兼容策略初始化摄像头"""
         print("[Face] 初始化摄像头 / Initialisation caméra...")
+
+        # 守护进程已占用摄像头时，通过摄像头代理共享它的画面
+        client = BrokerClient.connect()
+        if client:
+            print("[Face] 使用共享摄像头 (守护进程) / Caméra partagée")
+            self.grabber = client
+            self.frame_color = client.color
+            self.frame_rotated = client.rotated
+            return
         
-        gst_pipelines = [
-            (
-                "libcamerasrc ! video/x-raw,format=NV12,width=640,height=480,framerate=30/1 ! videoconvert ! video/x-raw,format=BGR ! appsink drop=1",
-                "GStreamer (NV12)"
-            ),
-            (
-                "libcamerasrc ! video/x-raw,width=640,height=480 ! videoconvert ! video/x-raw,format=BGR ! appsink drop=1",
-                "GStreamer (Auto)"
-            )
-        ]
-
-        for pipeline, name in gst_pipelines:
-            try:
-                cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
-                if cap.isOpened():
-                    ret, frame = cap.read()
-                    if ret and frame is not None and frame.size > 0:
-                        print(f"[Face] 摄像头就绪: {name} / Caméra prête")
-                        self.cap = cap
-                        return
-                    else:
-                        cap.release()
-            except Exception:
-                pass
+        # 先用 tools/diagnose_camera.py --tune 选出并缓存的管道，只打开一次
+        cached = cached_pipeline(color="RGB")
+        if cached:
+            if self._open_pipeline(*cached):
+                return
+            print("[Face] 缓存的管道不可用，重新探测 / Cache pipeline invalide, détection...")
+            clear_pipeline_cache()
+
+        # 优先使用管道内旋转+转 RGB 的版本，缺少元素时退回 BGR 管道
+        for candidate in camera_pipeline_candidates(color="RGB"):
+            if self._open_pipeline(*candidate):
+                return
 
         print("[Face] 无法初始化 GStreamer 摄像头 / Erreur init caméra")
         print("   提示: 请检查摄像头排线是否插好，以及是否安装了 gstreamer1.0-libcamera")
         self.cap = None
 
+    def _open_pipeline(self, pipeline, name, color, rotated):
+        """打开管道并读一帧验证；成功时启动取帧线程"""
+        try:
+            cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            if cap.isOpened():
+                ret, frame = cap.read()
+                if ret and frame is not None and frame.size > 0:
+                    print(f"[Face] 摄像头就绪: {name} / Caméra prête")
+                    self.cap = cap
+                    self.frame_color = color
+                    self.frame_rotated = rotated
+                    self.grabber = FrameGrabber(cap, name="FaceCapture").start()
+                    return True
+            cap.release()
+        except Exception:
+            pass
+        return False
+
+    def detect_faces(self, rgb_frame):
+        """在 detect_scale 缩小后的图上检测人脸，返回映射回原图的检测框"""
+        t0 = time.perf_counter()
+        if self.detect_scale < 1.0:
+            small = cv2.resize(rgb_frame, (0, 0), fx=self.detect_scale, fy=self.detect_scale,
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = rgb_frame
+        locations = self.detector.detect(small)
+        if self.detect_scale < 1.0:
+            locations = scale_locations(locations, self.detect_scale, rgb_frame.shape)
+        self.metrics["detect_size"] = (small.shape[1], small.shape[0])
+        self.metrics["detect_ms"] = (time.perf_counter() - t0) * 1000
+        return locations
+
+    def encode_faces(self, rgb_frame, locations):
+        """在全分辨率图的人脸区域上提取特征 (维度由特征后端决定)"""
+        t0 = time.perf_counter()
+        encodings = self.embedder.embed(rgb_frame, locations)
+        self.metrics["encode_ms"] = (time.perf_counter() - t0) * 1000
+        self.metrics["faces"] = len(encodings)
+        self.metrics["encodings"] += len(encodings)
+        return encodings
+
+    def log_stats(self):
+        m = self.metrics
+        size = "x".join(map(str, m["detect_size"])) if m["detect_size"] else "-"
+        print(f"[Face] 检测 / Détection: {m['detector']} scale={m['detect_scale']:.2f} ({size}) "
+              f"detect={m['detect_ms']:.0f}ms encode={m['encode_ms']:.0f}ms")
+        print(f"[Face] 跟踪 / Suivi: detections={m['detections']} tracked={m['tracked_frames']} "
+              f"encodings={m['encodings']}")
+        print(f"[Face] 预处理 / Prétraitement: {self.preprocessor.summary()}")
+        print(f"[Face] 调度 / Planification: {self.scheduler.summary()}")
+        print(f"[Face] 投票 / Vote: {self.voter.summary()}")
+        if self.gallery.index is not None:
+            st = self.gallery.index_stats
+            print(f"[Face] 索引 / Index: nlist={self.gallery.index.nlist} queries={st['queries']} "
+                  f"candidates={st['candidates'] // max(1, st['queries'])} fallbacks={st['fallbacks']}")
+        if self.gate:
+            print(f"[Face] 预筛统计 / Filtrage: {self.gate.summary()}")
+
+    def to_upright_rgb(self, frame):
+        """把 appsink 输出的帧转换为正向 RGB；管道已完成的步骤不会在 Python 侧重复"""
+        if not self.frame_rotated:
+            frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        if self.frame_color == "BGR":
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return frame
+
     def scan(self):
         """
         核心函数：尝试读取一帧并识别。
         """
-        if not self.cap or not self.known_face_encodings:
+        if not self.grabber:
             return None
+        # 直接取后台线程缓存的最新帧，不在识别路径上等待摄像头
+        return self.scan_from(self.grabber.latest)
+
+    def scan_from(self, latest, scheduled=True):
+        """
+        从任意帧源识别一次。latest() 需返回 (seq, timestamp, frame)，
+        可以是 FrameGrabber.latest、SharedFrame.latest 或 hardware/camera_sources.py 中的回放源。
+        scheduled=False 时忽略调度器，每次调用都处理一帧 (离线回放)。
+        """
+        if self.sync_seq is not None and time.time() - self.last_sync_time > SYNC_INTERVAL:
+            self.sync_faces()
 
-        if time.time() - self.last_scan_time < self.scan_interval:
+        if scheduled and not self.scheduler.due():
             return None
-        self.last_scan_time = time.time()
+        if len(self.gallery) == 0:
+            # 人脸库为空 (新安装尚未录入)：按空场景登记，调度器退避，识别进程不会空转
+            if scheduled:
+                self.scheduler.record(SCAN_IDLE, 0.0)
+            return None
+        t0 = time.perf_counter()
+        user_id, state = self._scan_frame(latest)
+        self.scheduler.record(state, time.perf_counter() - t0)
+        return user_id
 
-        ret, frame = self.cap.read()
-        if not ret:
+    def _scan_frame(self, latest):
+        """识别一帧，返回 (user_id 或 None, 扫描结果 SCAN_*)"""
+        seq, _, frame = latest()
+        if frame is None:
             print("[Face] 无法读取视频帧 / Erreur lecture flux")
-            return None
+            return None, SCAN_STALE
+        if seq == self.last_frame_seq:
+            return None, SCAN_STALE # 没有新帧
+        self.last_frame_seq = seq
+        # 本次扫描各阶段耗时 (ms) 与每张新编码人脸的最近匹配，供离线基准测试读取
+        stages = self.stage_ms = {}
+        self.last_matches = []
 
-        # 旋转图像 (适应物理安装)
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        if time.time() - self.last_stats_time > STATS_INTERVAL:
+            self.log_stats()
+            self.last_stats_time = time.time()
 
-        # 图像增强 (CLAHE)
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-        cl = clahe.apply(l)
-        limg = cv2.merge((cl, a, b))
-        enhanced_frame = cv2.cvtColor(limg, cv2.COLOR_LAB2RGB)
+        # 廉价预筛：暗/过曝/静止/模糊的帧直接跳过 (模糊通常意味着有人在走动)
+        if self.gate:
+            gray_code = cv2.COLOR_RGB2GRAY if self.frame_color == "RGB" else cv2.COLOR_BGR2GRAY
+            reason = self.gate.check(frame, gray_code)
+            if reason:
+                return None, SCAN_MOTION if reason == REJECT_BLUR else SCAN_IDLE
 
-        # 人脸检测
-        face_locations = face_recognition.face_locations(enhanced_frame)
-        
-        if not face_locations:
-            return None 
+        # 旋转 (管道内已旋转时跳过)、转 RGB、亮度增强，全部写入预分配缓冲区
+        self.preprocessor.rotate = not self.frame_rotated
+        self.preprocessor.color = self.frame_color
+        t0 = time.perf_counter()
+        enhanced_frame, gray = self.preprocessor.process(frame)
+        stages["enhance"] = (time.perf_counter() - t0) * 1000
 
-        # 特征提取
-        face_encodings = face_recognition.face_encodings(enhanced_frame, face_locations)
-        
-        print(f"[Face] 捕获到 {len(face_encodings)} 张人脸 / Visage détecté")
+        # 人脸检测 (低分辨率) 或光流跟踪
+        now = time.time()
+        if now - self.last_track_time > TRACK_MAX_GAP:
+            self.tracker.reset() # 暂停过 (开锁/录入)，旧轨迹已失效
+        self.last_track_time = now
+        t0 = time.perf_counter()
+        if self.tracker.needs_detection():
+            tracks = self.tracker.associate(gray, self.detect_faces(enhanced_frame))
+            self.metrics["detections"] += 1
+            stages["detect"] = (time.perf_counter() - t0) * 1000
+        else:
+            tracks = self.tracker.track(gray)
+            self.metrics["tracked_frames"] += 1
+            stages["track"] = (time.perf_counter() - t0) * 1000
 
-        # 人脸比对
-        for face_encoding in face_encodings:
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances)
-            min_distance = face_distances[best_match_index]
+        if not tracks:
+            # 预筛放行说明画面最近有变化；没有预筛时无法区分，按空场景退避
+            return None, SCAN_MOTION if self.gate else SCAN_IDLE
+        if self.gate:
+            self.gate.notify_face()
 
-            # 阈值判定 (0.35)
+        # 特征提取 (全分辨率)，只针对新轨迹或跟踪置信度下降的轨迹
+        pending = [t for t in tracks if self.tracker.needs_encoding(t)]
+        if pending:
+            face_encodings = self.encode_faces(enhanced_frame, [t.box for t in pending])
+            stages["encode"] = self.metrics["encode_ms"]
+            print(f"[Face] 捕获到 {len(face_encodings)} 张人脸 / Visage détecté")
 
-            if min_distance < 0.35:
+            # 人脸比对 (整帧所有人脸一次性比对)
+            t0 = time.perf_counter()
+            top_ids, top_distances = self.gallery.match(face_encodings, k=MATCH_TOP_K)
+            stages["match"] = (time.perf_counter() - t0) * 1000
+            self.last_matches = [(int(ids[0]), float(dist[0])) for ids, dist in zip(top_ids, top_distances)]
+            for track, ids, distances in zip(pending, top_ids, top_distances):
+                # 强匹配 (0.35) 立即通过，否则在轨迹的滑动窗口内投票
+                user_id, distance = self.voter.update(track, int(ids[0]), float(distances[0]))
+                track.set_identity(user_id, distance)
+                if user_id is None:
+                    print(f"[Face] 陌生人 / Inconnu (最小差异/Min Diff: {distances[0]:.2f})")
 
-             
-                user_id = self.known_face_ids[best_match_index]
-                print(f"[Face] 识别成功 / Succès! ID: {user_id} (特征差异/Diff: {min_distance:.2f})")
-                return user_id
-            else:
-                print(f"[Face] 陌生人 / Inconnu (最小差异/Min Diff: {min_distance:.2f})")
-        
-        return None
+        # 每条轨迹的身份只上报一次，避免同一个人站在机器前反复开锁
+        known = [t for t in tracks if t.user_id is not None and not t.reported]
+        if known:
+            track = min(known, key=lambda t: t.distance)
+            track.reported = True
+            print(f"[Face] 识别成功 / Succès! ID: {track.user_id} (特征差异/Diff: {track.distance:.2f})")
+            return track.user_id, SCAN_FACE
+
+        return None, SCAN_FACE
+
+    def serve_camera(self):
+        """启动摄像头代理，让录入/诊断工具在守护进程运行时也能读取画面"""
+        if self.cap is None or self.broker is not None:
+            return
+        try:
+            self.broker = CameraBroker(self.grabber, self.frame_color, self.frame_rotated).start()
+        except Exception as e:
+            print(f"[Face] 摄像头代理启动失败 / Erreur partage caméra: {e}")
+            self.broker = None
 
     def close(self):
+        if self.broker:
+            self.broker.stop()
+            self.broker = None
+        if self.grabber:
+            self.grabber.stop()
+            self.grabber = None
         if self.cap:
             self.cap.release()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import itertools
+import cv2
+import numpy as np
+
+# Lucas-Kanade 光流参数
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=2,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+def box_iou(a, b):
+    """两个 (top, right, bottom, left) 框的交并比"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """一个被跟踪的人脸：检测框、光流特征点，以及缓存的身份判定"""
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box             # (top, right, bottom, left)
+        self.points = None         # 框内的光流特征点 (N, 1, 2) float32
+        self.initial_points = 0
+        self.confidence = 1.0      # 仍被稳定跟踪的特征点比例
+        self.age = 0               # 已跟踪的帧数
+        self.encoded = False       # 当前身份判定是否仍然有效
+        self.encoded_age = 0       # 上次提取特征时的 age
+        self.user_id = None        # 缓存的身份判定 (None = 陌生人/未判定)
+        self.distance = None
+        self.reported = False      # 该身份是否已上报 (同一轨迹只上报一次)
+        self.votes = None          # 最近几次比对结果 (user_id, distance)，由 IdentityVoter 创建
+
+    def set_identity(self, user_id, distance):
+        self.encoded = True
+        self.encoded_age = self.age
+        if user_id != self.user_id:
+            self.reported = False
+        self.user_id = user_id
+        self.distance = distance
+
+
+class FaceTracker:
+    """
+    跨帧人脸跟踪 (Suivi de visages)
+    每 detect_every 帧才重新做一次完整检测；中间帧用 LK 光流移动已有的检测框。
+    只有新轨迹或跟踪置信度下降时才需要重新提取 128 维特征，身份判定按轨迹缓存。
+    """
+    def __init__(self, detect_every=5, min_confidence=0.6, min_points=6, iou_threshold=0.3, retry_every=1):
+        self.detect_every = detect_every
+        self.retry_every = retry_every # 未识别的轨迹每隔几帧重新提取一次特征
+        self.min_confidence = min_confidence
+        self.min_points = min_points
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+        self._prev_gray = None
+        self._frames_since_detect = 0
+        self._ids = itertools.count(1)
+
+    def reset(self):
+        self.tracks = []
+        self._prev_gray = None
+        self._frames_since_detect = 0
+
+    def needs_detection(self):
+        return (not self.tracks
+                or self._frames_since_detect >= self.detect_every
+                or any(t.confidence < self.min_confidence for t in self.tracks))
+
+    def needs_encoding(self, track):
+        if not track.encoded:
+            return True
+        return track.user_id is None and track.age - track.encoded_age >= self.retry_every
+
+    def associate(self, gray, locations):
+        """
+        用一次完整检测的结果更新轨迹：与已有轨迹按 IoU 匹配 (保留缓存身份)，
+        未匹配的检测框建立新轨迹，未被检测到的旧轨迹丢弃。
+        """
+        remaining = list(self.tracks)
+        tracks = []
+        for box in locations:
+            best, best_iou = None, self.iou_threshold
+            for track in remaining:
+                iou = box_iou(box, track.box)
+                if iou >= best_iou:
+                    best, best_iou = track, iou
+            if best is not None:
+                remaining.remove(best)
+                track = best
+                track.box = box
+                track.age += 1
+            else:
+                track = FaceTrack(next(self._ids), box)
+            self._seed_points(gray, track)
+            tracks.append(track)
+
+        self.tracks = tracks
+        self._prev_gray = gray
+        self._frames_since_detect = 0
+        return self.tracks
+
+    def track(self, gray):
+        """无检测的中间帧：用光流移动检测框并更新置信度"""
+        if self._prev_gray is None or not self.tracks:
+            self._prev_gray = gray
+            return self.tracks
+
+        height, width = gray.shape[:2]
+        alive = []
+        for track in self.tracks:
+            if track.points is None or len(track.points) < self.min_points:
+                track.confidence = 0.0
+                track.encoded = False
+                alive.append(track)
+                continue
+            new_pts, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, track.points, None, **LK_PARAMS)
+            # 前后向一致性检查，剔除漂移的点
+            back_pts, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev_gray, new_pts, None, **LK_PARAMS)
+            fb_error = np.abs(track.points - back_pts).reshape(-1, 2).max(axis=1)
+            good = (status.reshape(-1) == 1) & (back_status.reshape(-1) == 1) & (fb_error < 1.0)
+            if good.sum() < self.min_points:
+                track.confidence = 0.0
+                track.encoded = False # 跟丢了，身份需重新确认
+                alive.append(track)
+                continue
+
+            old, new = track.points[good].reshape(-1, 2), new_pts[good].reshape(-1, 2)
+            dx, dy = np.median(new - old, axis=0)
+            top, right, bottom, left = track.box
+            track.box = (
+                int(np.clip(top + dy, 0, height)), int(np.clip(right + dx, 0, width)),
+                int(np.clip(bottom + dy, 0, height)), int(np.clip(left + dx, 0, width)),
+            )
+            track.points = new_pts[good].reshape(-1, 1, 2)
+            track.confidence = len(track.points) / max(1, track.initial_points)
+            if track.confidence < self.min_confidence:
+                track.encoded = False
+            track.age += 1
+            if track.box[2] - track.box[0] > 0 and track.box[1] - track.box[3] > 0:
+                alive.append(track)
+
+        self.tracks = alive
+        self._prev_gray = gray
+        self._frames_since_detect += 1
+        return self.tracks
+
+    def _seed_points(self, gray, track):
+        top, right, bottom, left = track.box
+        mask = np.zeros(gray.shape[:2], dtype=np.uint8)
+        mask[top:bottom, left:right] = 255
+        track.points = cv2.goodFeaturesToTrack(gray, maxCorners=40, qualityLevel=0.01,
+                                               minDistance=5, mask=mask)
+        track.initial_points = 0 if track.points is None else len(track.points)
+        track.confidence = 1.0 if track.initial_points >= self.min_points else 0.0
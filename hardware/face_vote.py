@@ -0,0 +1,49 @@
+from collections import deque
+
+
+class IdentityVoter:
+    """
+    多帧身份投票 (Vote temporel)
+    对同一条轨迹，在最近 window 次特征比对中累积 top-1 候选：
+      - 单帧距离 < strong_threshold: 强匹配，立即通过 (提前退出)
+      - 否则: 同一用户在窗口内至少 min_votes 次低于宽松阈值 vote_threshold，
+        且这些距离的平均值 < max_mean，且没有其他用户得到同样多的票，才判定通过
+    这样边缘用户在连续几帧一致时即可开锁，而单帧的偶然近似不会造成误识。
+    """
+    def __init__(self, strong_threshold=0.35, vote_threshold=0.42, window=5, min_votes=3, max_mean=0.40):
+        self.strong_threshold = strong_threshold
+        self.vote_threshold = vote_threshold
+        self.window = window
+        self.min_votes = min_votes
+        self.max_mean = max_mean
+        self.counters = {"strong": 0, "consensus": 0, "rejected": 0}
+
+    def update(self, track, user_id, distance):
+        """加入一次比对结果，返回 (判定的 user_id 或 None, 用于日志的距离)"""
+        if track.votes is None:
+            track.votes = deque(maxlen=self.window)
+        history = track.votes
+        history.append((user_id, distance))
+
+        if distance < self.strong_threshold:
+            self.counters["strong"] += 1
+            return user_id, distance
+
+        tally = {}
+        for uid, d in history:
+            if d < self.vote_threshold:
+                tally.setdefault(uid, []).append(d)
+        if tally:
+            best_uid, best_votes = max(tally.items(), key=lambda item: len(item[1]))
+            contested = sum(1 for votes in tally.values() if len(votes) >= len(best_votes)) > 1
+            mean = sum(best_votes) / len(best_votes)
+            if len(best_votes) >= self.min_votes and mean < self.max_mean and not contested:
+                self.counters["consensus"] += 1
+                return best_uid, mean
+
+        self.counters["rejected"] += 1
+        return None, distance
+
+    def summary(self):
+        c = self.counters
+        return f"strong={c['strong']} consensus={c['consensus']} rejected={c['rejected']}"
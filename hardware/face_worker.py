@@ -0,0 +1,138 @@
+import multiprocessing
+import queue
+import time
+from hardware.shared_frame import SharedFrame
+
+# 使用 spawn 启动子进程：主进程已有取帧线程，fork 不安全
+MP_CONTEXT = multiprocessing.get_context("spawn")
+RESTART_BACKOFF = (1, 2, 5, 10, 30) # 连续崩溃后的重启等待 (秒)
+STABLE_RUNTIME = 60                 # 运行超过该时间后再崩溃，退避从头计算
+COMMAND_POLL = 0.5                  # 空闲时至少每隔该秒数检查一次控制指令
+
+
+def _handle_commands(rec, commands):
+    """处理主进程发来的控制指令；收到 stop 时返回 False"""
+    while True:
+        try:
+            cmd, arg = commands.get_nowait()
+        except queue.Empty:
+            return True
+        if cmd == "stop":
+            return False
+        if cmd == "sync":
+            rec.sync_faces()
+        elif cmd == "remove":
+            rec.remove_user(arg)
+
+
+def _worker_main(frame_name, frame_color, frame_rotated, running, results, commands):
+    """识别子进程入口：从共享内存读帧，检测/比对，结果通过队列返回"""
+    # 在子进程内导入，dlib/OpenCV 的状态只存在于该进程
+    from hardware.face_system import FaceRecognizer
+
+    rec = FaceRecognizer(open_camera=False)
+    rec.frame_color = frame_color
+    rec.frame_rotated = frame_rotated
+    frames = SharedFrame.attach(frame_name)
+    print("[FaceWorker] 识别进程已启动 / Processus visage démarré")
+    try:
+        while _handle_commands(rec, commands):
+            # 主进程在开锁 (舵机动作) 和录入期间清除 running，调度器随之暂停
+            if not running.is_set():
+                rec.scheduler.pause()
+                running.wait(0.5)
+                continue
+            rec.scheduler.resume()
+            try:
+                face_uid = rec.scan_from(frames.latest)
+                if face_uid and results.empty():
+                    results.put(face_uid)
+            except Exception as e:
+                print(f"[FaceWorker] 识别错误 / Erreur visage: {e}")
+                time.sleep(1)
+            # 睡到调度器给出的下一次扫描时间 (上限 COMMAND_POLL，保证及时处理指令)
+            time.sleep(min(COMMAND_POLL, rec.scheduler.delay()))
+    finally:
+        frames.close()
+
+
+class FaceWorkerProcess:
+    """
+    独立的人脸识别进程 (Processus de reconnaissance)
+    主进程只负责取帧：FrameGrabber 把每一帧写入共享内存 (仅在识别开启时)，
+    dlib/OpenCV 的计算全部在子进程中进行，不再与主循环 (指纹、屏幕、舵机) 争抢 GIL。
+    子进程崩溃后由 ensure_alive() 按退避时间自动重启。
+    """
+    def __init__(self, face_rec, running):
+        self.face_rec = face_rec
+        self.running = running  # MP_CONTEXT.Event()，置位时子进程才识别
+        self.results = MP_CONTEXT.Queue()
+        self.commands = MP_CONTEXT.Queue()
+        self.process = None
+        self.restarts = 0
+        self._failures = 0
+        self._started_at = 0
+        self._died_at = None
+        self._closed = False
+
+        _, _, frame = face_rec.grabber.wait_frame(timeout=3.0)
+        if frame is None:
+            raise RuntimeError("摄像头无画面 / Pas d'image caméra")
+        self.frames = SharedFrame.create(frame.shape)
+        face_rec.grabber.add_sink(self._publish)
+
+    def _publish(self, seq, timestamp, frame):
+        if self.running.is_set() and not self._closed:
+            self.frames.write(frame)
+
+    def start(self):
+        self.process = MP_CONTEXT.Process(
+            target=_worker_main, name="FaceWorker", daemon=True,
+            args=(self.frames.name, self.face_rec.frame_color, self.face_rec.frame_rotated,
+                  self.running, self.results, self.commands),
+        )
+        self.process.start()
+        self._started_at = time.time()
+        return self
+
+    def ensure_alive(self):
+        """主循环中定期调用：子进程退出后按退避时间重启"""
+        if self.process is None or self.process.is_alive():
+            return
+        now = time.time()
+        if self._died_at is None:
+            self._died_at = now
+            if now - self._started_at > STABLE_RUNTIME:
+                self._failures = 0
+            print(f"[FaceWorker] 识别进程退出 (code {self.process.exitcode}) / Processus arrêté")
+        delay = RESTART_BACKOFF[min(self._failures, len(RESTART_BACKOFF) - 1)]
+        if now - self._died_at >= delay:
+            self._failures += 1
+            self.restarts += 1
+            self._died_at = None
+            print(f"[FaceWorker] 重启识别进程 (#{self.restarts}) / Redémarrage")
+            self.start()
+
+    def poll_result(self):
+        """非阻塞获取识别结果 (user_id)，没有则返回 None"""
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def sync(self):
+        """通知子进程增量同步人脸库 (例如录入完成后)"""
+        self.commands.put(("sync", None))
+
+    def remove_user(self, user_id):
+        self.commands.put(("remove", user_id))
+
+    def stop(self):
+        self._closed = True
+        if self.process is not None and self.process.is_alive():
+            self.commands.put(("stop", None))
+            self.process.join(timeout=3)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
+        self.frames.close()
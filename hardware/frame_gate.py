@@ -0,0 +1,75 @@
+import time
+import cv2
+import numpy as np
+
+# 拒绝原因 (同时也是计数器的键)
+REJECT_DARK = "dark"
+REJECT_BRIGHT = "bright"
+REJECT_STATIC = "static"
+REJECT_BLUR = "blur"
+
+
+class FrameGate:
+    """
+    检测前的廉价预筛 (Filtrage avant détection)
+    在缩小的灰度图上依次做三项检查，任意一项不通过就跳过昂贵的 HOG 人脸检测：
+      1. 曝光: 平均亮度过暗/过亮
+      2. 运动: 与上一帧做差分，画面静止且最近没有人脸 -> 无人站在机器前
+      3. 清晰度: 拉普拉斯方差过低 -> 画面模糊 (正在走动或失焦)
+    """
+    def __init__(self, size=(160, 120), min_brightness=35, max_brightness=225,
+                 motion_threshold=3.0, blur_threshold=40.0, hold_time=2.0):
+        self.size = size                          # 预筛使用的缩略图尺寸 (宽, 高)
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.motion_threshold = motion_threshold  # 平均像素差分阈值 (0-255)
+        self.blur_threshold = blur_threshold      # 拉普拉斯方差阈值
+        self.hold_time = hold_time                # 检测到运动/人脸后继续放行的秒数
+
+        self._small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._prev_gray = None
+        self._active_until = 0.0
+        self.counters = {"checked": 0, "passed": 0,
+                         REJECT_DARK: 0, REJECT_BRIGHT: 0, REJECT_STATIC: 0, REJECT_BLUR: 0}
+
+    def notify_face(self):
+        """识别流程发现人脸时调用：即使画面静止也继续放行一段时间"""
+        self._active_until = time.time() + self.hold_time
+
+    def check(self, frame, color_code=cv2.COLOR_BGR2GRAY):
+        """返回 None 表示放行，否则返回拒绝原因"""
+        self.counters["checked"] += 1
+        reason = self._evaluate(frame, color_code)
+        self.counters[reason or "passed"] += 1
+        return reason
+
+    def _evaluate(self, frame, color_code):
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, color_code, dst=self._gray)
+
+        brightness = cv2.mean(self._gray)[0]
+        if brightness < self.min_brightness:
+            return REJECT_DARK
+        if brightness > self.max_brightness:
+            return REJECT_BRIGHT
+
+        now = time.time()
+        prev, self._prev_gray = self._prev_gray, self._gray.copy()
+        if prev is not None:
+            motion = cv2.mean(cv2.absdiff(self._gray, prev))[0]
+            if motion >= self.motion_threshold:
+                self._active_until = now + self.hold_time
+        else:
+            self._active_until = now + self.hold_time
+        if now > self._active_until:
+            return REJECT_STATIC
+
+        if cv2.Laplacian(self._gray, cv2.CV_32F).var() < self.blur_threshold:
+            return REJECT_BLUR
+        return None
+
+    def summary(self):
+        c = self.counters
+        return (f"checked={c['checked']} passed={c['passed']} dark={c[REJECT_DARK]} "
+                f"bright={c[REJECT_BRIGHT]} static={c[REJECT_STATIC]} blur={c[REJECT_BLUR]}")
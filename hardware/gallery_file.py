@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import struct
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+GALLERY_FILE = os.path.join(PROJECT_ROOT, "face_gallery.bin")
+
+# 文件头 (64 字节，小端): 魔数, 版本, 维度, 行数, 代数 (generation), 对应的 Face_Changes.seq, 特征模型名
+MAGIC = b"DCGALLRY"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQq16s")
+HEADER_BYTES = 64
+# 文件头之后依次为 ids (int64 x 行数) 和特征矩阵 (float32 x 行数 x 维度)
+ID_DTYPE = np.dtype("<i8")
+ROW_DTYPE = np.dtype("<f4")
+
+
+def parse_header(raw):
+    """解析文件头字节，格式不对时返回 None"""
+    if len(raw) < HEADER.size:
+        return None
+    magic, version, dim, count, generation, change_seq, model = HEADER.unpack(bytes(raw[:HEADER.size]))
+    if magic != MAGIC or version != VERSION:
+        return None
+    return {"dim": dim, "count": count, "generation": generation, "change_seq": change_seq,
+            "model": model.rstrip(b"\0").decode("ascii")}
+
+
+def read_header(path):
+    """只读取文件头，返回 dict；文件不存在或格式不对时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            return parse_header(f.read(HEADER.size))
+    except OSError:
+        return None
+
+
+def file_size(header):
+    return HEADER_BYTES + header["count"] * (ID_DTYPE.itemsize + header["dim"] * ROW_DTYPE.itemsize)
+
+
+def write_gallery_file(ids, matrix, model, change_seq, path=GALLERY_FILE):
+    """
+    发布人脸库快照：先写入同目录下的临时文件并 fsync，再 os.replace 原子替换。
+    已经映射旧文件的进程不受影响 (旧 inode 在取消映射前一直有效)，之后打开的进程看到完整的新文件。
+    返回新的代数 (比旧文件大 1)
+    """
+    ids = np.ascontiguousarray(ids, dtype=ID_DTYPE).reshape(-1)
+    matrix = np.ascontiguousarray(matrix, dtype=ROW_DTYPE).reshape(len(ids), -1)
+    previous = read_header(path)
+    generation = previous["generation"] + 1 if previous else 1
+    header = HEADER.pack(MAGIC, VERSION, matrix.shape[1], len(ids), generation, change_seq,
+                         model.encode("ascii")[:16])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header.ljust(HEADER_BYTES, b"\0"))
+            f.write(ids.tobytes())
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return generation
+
+
+def publish_gallery(db_path, model="dlib", dim=128, path=GALLERY_FILE):
+    """
+    从数据库读取所有启用用户的特征并发布快照 (录入工具写入 Face_Embeddings 之后调用)。
+    特征和 Face_Changes.seq 在同一个读事务中读取，快照记录的 seq 与内容严格对应。
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        cursor.execute("""
+            SELECT e.user_id, e.embedding FROM Face_Embeddings e
+            JOIN Users u ON u.user_id = e.user_id
+            WHERE u.is_active = 1 AND e.model = ? AND e.dim = ?
+        """, (model, dim))
+        rows = cursor.fetchall()
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM Face_Changes")
+        change_seq = cursor.fetchone()[0]
+        cursor.execute("COMMIT")
+    finally:
+        conn.close()
+    matrix = np.frombuffer(b"".join(blob for _, blob in rows), dtype=ROW_DTYPE).reshape(len(rows), dim)
+    return write_gallery_file([uid for uid, _ in rows], matrix, model, change_seq, path)
+
+
+class GalleryFile:
+    """
+    内存映射的人脸库快照 (Galerie partagée)
+    ids / matrix 直接映射文件内容 (np.memmap，只读)，打开时不复制数据，
+    守护进程、API、工具和基准测试都可以不经过数据库读取同一份人脸库。
+    """
+    def __init__(self, path, header, raw):
+        self.path = path
+        self.header = header
+        count, dim = header["count"], header["dim"]
+        self.ids = np.ndarray((count,), dtype=ID_DTYPE, buffer=raw, offset=HEADER_BYTES)
+        self.matrix = np.ndarray((count, dim), dtype=ROW_DTYPE, buffer=raw,
+                                 offset=HEADER_BYTES + count * ID_DTYPE.itemsize)
+
+    @classmethod
+    def open(cls, path=GALLERY_FILE):
+        """映射快照文件；文件不存在、格式不对或长度不符时返回 None"""
+        try:
+            raw = np.memmap(path, dtype=np.uint8, mode="r")
+        except (OSError, ValueError):
+            return None
+        header = parse_header(raw[:HEADER.size])
+        if header is None or raw.size != file_size(header):
+            return None
+        return cls(path, header, raw)
+
+    @property
+    def generation(self):
+        return self.header["generation"]
+
+    @property
+    def change_seq(self):
+        return self.header["change_seq"]
+
+    @property
+    def model(self):
+        return self.header["model"]
+
+    @property
+    def dim(self):
+        return self.header["dim"]
+
+    def __len__(self):
+        return self.header["count"]
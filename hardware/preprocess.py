@@ -0,0 +1,111 @@
+import time
+import cv2
+import numpy as np
+
+# 图像增强方式
+ENHANCE_CLAHE = "clahe"  # 亮度平面上的自适应直方图均衡 (默认)
+ENHANCE_LUT = "lut"      # 全局对比度拉伸 + gamma 查找表，适合整体偏暗/发灰的场景，开销最低
+ENHANCE_NONE = "none"
+ENHANCERS = (ENHANCE_CLAHE, ENHANCE_LUT, ENHANCE_NONE)
+
+LUT_PERCENTILE = 1.0  # 对比度拉伸时两端各忽略的像素百分比
+LUT_STEP = 4          # 拉伸范围按该步长取整，范围不变时复用已有查找表
+
+
+class FramePreprocessor:
+    """
+    识别前的图像预处理 (Prétraitement)：旋转 -> 转 RGB -> 增强 -> 灰度图。
+    所有中间结果和输出都写入按帧尺寸预先分配的缓冲区 (dst=)，稳定运行时不再分配内存；
+    CLAHE 对象只创建一次，且只作用于亮度平面 (YCrCb 的 Y)，增强后的 Y 平面直接作为灰度图。
+
+    注意: 返回的 rgb/gray 是内部缓冲区，下一次 process() 会覆盖 rgb；
+    gray 使用两块缓冲区交替写入，光流跟踪需要的上一帧灰度图在下一次调用后仍然有效。
+    """
+    def __init__(self, rotate=True, color="BGR", enhancer=ENHANCE_CLAHE, clip_limit=3.0, tile_grid=8,
+                 lut_gamma=1.0):
+        if enhancer not in ENHANCERS:
+            raise ValueError(f"未知增强方式 / Amélioration inconnue: {enhancer}")
+        self.rotate = rotate      # 管道内未完成旋转时，在此逆时针旋转 90 度
+        self.color = color        # 输入帧的颜色空间 ("RGB" / "BGR")
+        self.enhancer = enhancer
+        self.lut_gamma = lut_gamma
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_grid, tile_grid))
+        self._shape = None
+        self._gray_index = 0
+        self._lut = np.arange(256, dtype=np.uint8)
+        self._lut_range = None
+        self._hist = None
+        self.timings = {}  # 步骤 -> [累计 ms, 次数]
+
+    def _allocate(self, shape):
+        height, width = shape[:2]
+        if self.rotate:
+            height, width = width, height
+        self._shape = shape
+        self._rotated = np.empty((height, width, 3), dtype=np.uint8)
+        self._rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self._ycrcb = np.empty((height, width, 3), dtype=np.uint8)
+        self._luma = np.empty((height, width), dtype=np.uint8)
+        self._grays = [np.empty((height, width), dtype=np.uint8) for _ in range(2)]
+        self._enhanced = np.empty((height, width, 3), dtype=np.uint8)
+
+    def _step(self, name, t0):
+        t1 = time.perf_counter()
+        entry = self.timings.setdefault(name, [0.0, 0])
+        entry[0] += (t1 - t0) * 1000
+        entry[1] += 1
+        return t1
+
+    def process(self, frame):
+        """返回 (增强后的 RGB, 灰度图)"""
+        if frame.shape != self._shape:
+            self._allocate(frame.shape)
+        self._gray_index ^= 1
+        gray = self._grays[self._gray_index]
+
+        t = time.perf_counter()
+        if self.rotate:
+            cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE, dst=self._rotated)
+            frame = self._rotated
+            t = self._step("rotate", t)
+        if self.color == "BGR":
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+            frame = self._rgb
+            t = self._step("color", t)
+
+        if self.enhancer == ENHANCE_CLAHE:
+            cv2.cvtColor(frame, cv2.COLOR_RGB2YCrCb, dst=self._ycrcb)
+            cv2.extractChannel(self._ycrcb, 0, dst=self._luma)
+            self.clahe.apply(self._luma, dst=gray)
+            cv2.insertChannel(gray, self._ycrcb, 0)
+            cv2.cvtColor(self._ycrcb, cv2.COLOR_YCrCb2RGB, dst=self._enhanced)
+            t = self._step("clahe", t)
+            return self._enhanced, gray
+
+        cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=gray)
+        t = self._step("gray", t)
+        if self.enhancer == ENHANCE_LUT:
+            self._update_lut(gray)
+            cv2.LUT(frame, self._lut, dst=self._enhanced)
+            cv2.LUT(gray, self._lut, dst=gray)
+            t = self._step("lut", t)
+            return self._enhanced, gray
+        return frame, gray
+
+    def _update_lut(self, gray):
+        """按亮度直方图计算对比度拉伸范围；范围不变时沿用已有查找表"""
+        self._hist = cv2.calcHist([gray], [0], None, [256], [0, 256], hist=self._hist)
+        cdf = np.cumsum(self._hist.reshape(-1))
+        cut = cdf[-1] * LUT_PERCENTILE / 100.0
+        low = int(np.searchsorted(cdf, cut)) // LUT_STEP * LUT_STEP
+        high = -(-int(np.searchsorted(cdf, cdf[-1] - cut)) // LUT_STEP) * LUT_STEP
+        high = min(255, max(high, low + LUT_STEP))
+        if (low, high) == self._lut_range:
+            return
+        self._lut_range = (low, high)
+        ramp = np.clip((np.arange(256, dtype=np.float32) - low) / (high - low), 0.0, 1.0)
+        self._lut = np.rint(255.0 * ramp ** (1.0 / self.lut_gamma)).astype(np.uint8)
+
+    def summary(self):
+        parts = [f"{name}={total / count:.1f}ms" for name, (total, count) in self.timings.items() if count]
+        return f"{self.enhancer} " + " ".join(parts)
@@ -0,0 +1,83 @@
+import time
+
+# 每次扫描的结果，决定下一次扫描的间隔
+SCAN_FACE = "face"      # 画面中有人脸 (检测或跟踪到)
+SCAN_MOTION = "motion"  # 画面在变化但没有人脸
+SCAN_IDLE = "idle"      # 画面静止/过暗，或完整检测没有发现人脸
+SCAN_STALE = "stale"    # 没有新帧，很快重试且不计入退避
+
+
+class ScanScheduler:
+    """
+    自适应识别调度 (Planification des scans)，代替固定的 0.5 秒间隔：
+      - 有人脸时按 face_interval 快速扫描，缩短首次识别时间；
+      - 有运动时按 motion_interval 扫描；
+      - 空场景时间隔按 backoff 倍数指数增长，直到 max_interval；
+      - pause() 期间 (开锁/舵机动作、录入) 不扫描，恢复后从快速扫描开始；
+      - cpu_budget 限制识别占用单核 CPU 的比例：间隔不小于 平均耗时 * (1 - b) / b。
+    """
+    def __init__(self, face_interval=0.1, motion_interval=0.25, max_interval=1.0, backoff=1.6,
+                 cpu_budget=0.6, cost_smoothing=0.2):
+        self.face_interval = face_interval
+        self.motion_interval = motion_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.cpu_budget = min(1.0, max(0.05, cpu_budget))
+        self.cost_smoothing = cost_smoothing
+        self.interval = motion_interval
+        self.next_time = 0.0
+        self.paused = False
+        self.cost = 0.0  # 每次扫描耗时的指数滑动平均 (秒)
+        self.counters = {SCAN_FACE: 0, SCAN_MOTION: 0, SCAN_IDLE: 0, SCAN_STALE: 0, "pauses": 0}
+        self._busy = 0.0
+        self._started = time.time()
+
+    def due(self, now=None):
+        """是否到了下一次扫描的时间"""
+        if self.paused:
+            return False
+        return (time.time() if now is None else now) >= self.next_time
+
+    def delay(self, now=None):
+        """距离下一次扫描的秒数 (供调用方 sleep)"""
+        if self.paused:
+            return self.max_interval
+        return max(0.0, self.next_time - (time.time() if now is None else now))
+
+    def record(self, state, elapsed, now=None):
+        """登记一次扫描的结果和耗时 (秒)，计算下一次扫描时间"""
+        now = time.time() if now is None else now
+        self.counters[state] += 1
+        if state == SCAN_STALE:
+            self.next_time = now + min(self.face_interval, 0.05)
+            return
+        self._busy += elapsed
+        self.cost += self.cost_smoothing * (elapsed - self.cost)
+        if state == SCAN_FACE:
+            self.interval = self.face_interval
+        elif state == SCAN_MOTION:
+            self.interval = self.motion_interval
+        else:
+            self.interval = min(self.max_interval, max(self.interval, self.motion_interval) * self.backoff)
+        budget_gap = self.cost * (1.0 - self.cpu_budget) / self.cpu_budget
+        self.next_time = now + max(self.interval, budget_gap)
+
+    def pause(self):
+        """暂停扫描 (例如舵机动作期间)"""
+        if not self.paused:
+            self.paused = True
+            self.counters["pauses"] += 1
+
+    def resume(self):
+        """恢复扫描：人很可能还在机器前，先快速扫描"""
+        if self.paused:
+            self.paused = False
+            self.interval = self.face_interval
+            self.next_time = 0.0
+
+    def summary(self):
+        c = self.counters
+        duty = self._busy / max(1e-6, time.time() - self._started)
+        return (f"interval={self.interval:.2f}s cost={self.cost * 1000:.0f}ms cpu={duty:.0%} "
+                f"face={c[SCAN_FACE]} motion={c[SCAN_MOTION]} idle={c[SCAN_IDLE]} "
+                f"stale={c[SCAN_STALE]} pauses={c['pauses']}")
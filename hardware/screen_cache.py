@@ -0,0 +1,57 @@
+from collections import OrderedDict
+
+SCREEN_CACHE_BYTES = 2 * 1024 * 1024  # 帧缓存默认上限 (约 17 个整屏 RGB565 画面)
+
+
+class FrameCache:
+    """
+    帧缓存 (Cache d'images)
+    按键缓存已经转换好的像素数组 (RGB565 整帧、横条等)，按最近最少使用 (LRU) 淘汰，
+    所有条目的总字节数不超过 max_bytes。单个超过上限的条目不缓存。
+    """
+    def __init__(self, max_bytes=SCREEN_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def resize(self, max_bytes):
+        """修改上限，超出部分立即按 LRU 淘汰"""
+        self.max_bytes = max_bytes
+        while self._entries and self.nbytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.stats["evictions"] += 1
+
+    def put(self, key, value):
+        """加入缓存并返回 value；value 在缓存期间不能被修改"""
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+        if value.nbytes > self.max_bytes:
+            return value
+        while self._entries and self.nbytes + value.nbytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.stats["evictions"] += 1
+        self._entries[key] = value
+        self.nbytes += value.nbytes
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+
+
+def load_settings(db_path):
+    """读取 System_Settings 表为 {key_name: value} 字典；数据库不存在或不可用时返回空字典"""
+    if not os.path.exists(db_path):
+        # 基准测试/合成数据工具在没有数据库时运行，不能顺带创建一个空的生产数据库
+        return {}
+    try:
+        # 只读打开：读取设置永远不会创建或修改数据库文件
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        rows = conn.execute("SELECT key_name, value FROM System_Settings").fetchall()
+        conn.close()
+        return dict(rows)
+    except sqlite3.Error as e:
+        print(f"[Settings] 无法读取系统设置，使用默认值 / Paramètres par défaut: {e}")
+        return {}
+
+
+def get_str(settings, key, default):
+    value = settings.get(key)
+    return default if value is None or value == "" else value
+
+
+def get_float(settings, key, default):
+    try:
+        return float(settings[key])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def get_int(settings, key, default):
+    try:
+        return int(settings[key])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def get_bool(settings, key, default):
+    value = settings.get(key)
+    if value is None:
+        return default
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_path(settings, key, default):
+    """文件路径设置：相对路径按项目根目录解析"""
+    value = get_str(settings, key, default)
+    return value if os.path.isabs(value) else os.path.join(PROJECT_ROOT, value)
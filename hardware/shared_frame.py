@@ -0,0 +1,85 @@
+import time
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+# 头部: [seq, height, width, channels] (int64) + [timestamp] (float64)
+HEADER_BYTES = 64
+
+
+class SharedFrame:
+    """
+    共享内存中的单槽帧缓冲 (Mémoire partagée)
+    写入方 (取帧线程) 每来一帧就覆盖槽位；读取方 (其他进程) 按序号判断是否有新帧。
+    使用 seqlock：写入前把 seq 置为奇数，写完再置为偶数；读取方若前后两次读到的 seq
+    不一致或为奇数，说明读到了写了一半的帧，需要重读。
+    """
+    def __init__(self, shm, shape, owner):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.owner = owner
+        self._header = np.ndarray((4,), dtype=np.int64, buffer=shm.buf, offset=0)
+        self._stamp = np.ndarray((1,), dtype=np.float64, buffer=shm.buf, offset=32)
+        self._data = np.ndarray(self.shape, dtype=np.uint8, buffer=shm.buf, offset=HEADER_BYTES)
+
+    @classmethod
+    def create(cls, shape, name=None):
+        size = HEADER_BYTES + int(np.prod(shape))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        frame = cls(shm, shape, owner=True)
+        frame._header[:] = (0,) + tuple(shape) + (1,) * (3 - len(shape))
+        frame._stamp[0] = 0.0
+        return frame
+
+    @classmethod
+    def attach(cls, name, track=True):
+        """
+        连接已有的共享帧。track=False 用于与创建方无关的独立进程 (例如工具脚本)：
+        否则该进程退出时 resource_tracker 会把共享内存一并删除。
+        """
+        shm = shared_memory.SharedMemory(name=name)
+        if not track:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        header = np.ndarray((4,), dtype=np.int64, buffer=shm.buf, offset=0)
+        height, width, channels = (int(v) for v in header[1:])
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        return cls(shm, shape, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def seq(self):
+        return int(self._header[0]) // 2
+
+    def write(self, frame):
+        """写入一帧 (形状必须与创建时一致)"""
+        self._header[0] += 1    # 奇数: 正在写入
+        np.copyto(self._data, frame.reshape(self.shape))
+        self._stamp[0] = time.time()
+        self._header[0] += 1    # 偶数: 写入完成
+
+    def latest(self):
+        """返回 (seq, timestamp, frame 副本)；尚无帧时 frame 为 None"""
+        for _ in range(5):
+            begin = int(self._header[0])
+            if begin == 0:
+                return 0, 0.0, None
+            if begin % 2:
+                time.sleep(0.001)
+                continue
+            frame = self._data.copy()
+            stamp = float(self._stamp[0])
+            if int(self._header[0]) == begin:
+                return begin // 2, stamp, frame
+        return self.seq, 0.0, None
+
+    def close(self):
+        # 释放 numpy 视图后才能关闭共享内存
+        self._header = self._stamp = self._data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,15 +1,93 @@
 import time
-import spidev  # Python 的 SPI 接口库，用于和屏幕高速通信
-import RPi.GPIO as GPIO # 树莓派 GPIO 控制库
 import numpy as np # 强大的数学库，这里用来做大规模的像素矩阵计算
 from PIL import Image
 
+SPIDEV_BUFSIZ = "/sys/module/spidev/parameters/bufsiz" # 内核 spidev 单次传输的上限 (默认 4096 字节)
+SPIDEV_LIST_MAX = 4096 # py-spidev 的 writebytes(列表) 单次最多 4096 字节，与内核 bufsiz 无关
+
+# RGB565 查找表：每个 8 位颜色分量直接查出它在 16 位像素中的位置，三次查表按位或即得像素值。
+# 表中的值已按字节交换，写入本机 (小端) uint16 缓冲区后，内存中的字节顺序正好是屏幕要求的大端。
+_LEVELS = np.arange(256, dtype=np.uint16)
+RGB565_LUT = np.stack(((_LEVELS >> 3) << 11, (_LEVELS >> 2) << 5, _LEVELS >> 3)).astype(">u2").view(np.uint16)
+
+# 局部刷新 (dirty rectangles)
+DIRTY_ROW_GAP = 8      # 相隔不超过该行数的变化行合并为同一个区域
+DIRTY_COL_GAP = 16     # 同一行带内相隔不超过该列数的变化合并 (时钟和倒计时相隔较远，各自成块)
+DIRTY_MAX_RECTS = 4    # 每帧最多发送的矩形数 (每个矩形要多发一次 set_window)
+DIRTY_FULL_RATIO = 0.6 # 变化区域超过整屏的该比例时直接整屏刷新
+
+
+def spi_chunk_size(default=4096):
+    """spidev 允许的最大单次传输字节数"""
+    try:
+        with open(SPIDEV_BUFSIZ) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return default
+
+
+def rgb565(rgb, out=None, scratch=None):
+    """
+    把 (高, 宽, 3) 的 uint8 RGB 数组转换为 RGB565 (大端字节序的 uint16 数组)。
+    out / scratch 可传入预分配的同尺寸 uint16 缓冲区，避免每次分配内存；任意尺寸 (整屏或一条) 均可。
+    """
+    if out is None:
+        out = np.empty(rgb.shape[:2], dtype=np.uint16)
+    if scratch is None:
+        scratch = np.empty_like(out)
+    np.take(RGB565_LUT[0], rgb[:, :, 0], out=out)
+    np.take(RGB565_LUT[1], rgb[:, :, 1], out=scratch)
+    out |= scratch
+    np.take(RGB565_LUT[2], rgb[:, :, 2], out=scratch)
+    out |= scratch
+    return out
+
+
+def _runs(indices, gap):
+    """把升序的下标分成若干段 [(起, 止)]，相邻下标之差不超过 gap 的归为同一段"""
+    breaks = np.flatnonzero(np.diff(indices) > gap)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    stops = np.concatenate((indices[breaks], [indices[-1]]))
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def dirty_rects(changed, row_gap=DIRTY_ROW_GAP, col_gap=DIRTY_COL_GAP, max_rects=DIRTY_MAX_RECTS):
+    """
+    由逐像素的变化掩码计算需要重发的矩形 [(x0, y0, x1, y1)] (含端点)。
+    先按行分带，再在每个行带内按列分块；矩形过多时反复合并 "合并后多发像素最少" 的两个矩形。
+    """
+    rows = np.flatnonzero(changed.any(axis=1))
+    if len(rows) == 0:
+        return []
+    rects = []
+    for y0, y1 in _runs(rows, row_gap):
+        cols = np.flatnonzero(changed[y0:y1 + 1].any(axis=0))
+        rects += [(x0, y0, x1, y1) for x0, x1 in _runs(cols, col_gap)]
+
+    def area(r):
+        return (r[2] - r[0] + 1) * (r[3] - r[1] + 1)
+
+    def union(a, b):
+        return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+    while len(rects) > max_rects:
+        _, i, j = min((area(union(a, b)) - area(a) - area(b), i, j)
+                      for i, a in enumerate(rects) for j, b in enumerate(rects) if i < j)
+        merged = union(rects[i], rects[j])
+        rects = [r for k, r in enumerate(rects) if k not in (i, j)] + [merged]
+    return rects
+
+
 class ST7789_Driver:
     """
     ST7789 屏幕底层驱动类
     这个类演示了如何不依赖高级库，直接通过发送十六进制指令(Hex Codes)来控制硬件。
+    spi / gpio 可以传入假设备 (见 tools/benchmark_display.py)，不传时使用 spidev 和 RPi.GPIO。
+
+    局部刷新：驱动保存上一次发送到屏幕的帧，display() 只发送变化的矩形区域
+    (例如每秒更新的时钟和倒计时)。唤醒 (背光从灭到亮)、初始化和传输出错后下一帧强制整屏刷新。
     """
-    def __init__(self, dc=24, rst=25, blk=27, spi_port=0, spi_device=0, speed_hz=24000000):
+    def __init__(self, dc=24, rst=25, blk=27, spi_port=0, spi_device=0, speed_hz=24000000, spi=None, gpio=None, bufsiz=None):
         # 1. 硬件引脚定义 (BCM 编号)
         self.dc_pin = dc   # Data/Command: 高电平发数据，低电平发命令
         self.rst_pin = rst # Reset: 复位引脚
@@ -18,29 +96,49 @@ class ST7789_Driver:
         self.height = 240
         
         # 2. GPIO 初始化
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        GPIO.setup(self.dc_pin, GPIO.OUT)
-        GPIO.setup(self.rst_pin, GPIO.OUT)
-        GPIO.setup(self.blk_pin, GPIO.OUT)
+        if gpio is None:
+            import RPi.GPIO as gpio # 树莓派 GPIO 控制库
+        self.gpio = gpio
+        gpio.setmode(gpio.BCM)
+        gpio.setwarnings(False)
+        gpio.setup(self.dc_pin, gpio.OUT)
+        gpio.setup(self.rst_pin, gpio.OUT)
+        gpio.setup(self.blk_pin, gpio.OUT)
         
         # 3. SPI 总线初始化
         # SPI 是一种同步串行通信协议，像一条高速公路
-        self.spi = spidev.SpiDev()
-        self.spi.open(spi_port, spi_device) # 打开 /dev/spidev0.0
+        if spi is None:
+            import spidev  # Python 的 SPI 接口库，用于和屏幕高速通信
+            spi = spidev.SpiDev()
+            spi.open(spi_port, spi_device) # 打开 /dev/spidev0.0
+        self.spi = spi
         self.spi.max_speed_hz = speed_hz    # 设定速度 24MHz
         self.spi.mode = 0b11 # Mode 3 (CPOL=1, CPHA=1): 这是 ST7789 要求的通信模式
+        # writebytes2 (spidev >= 3.4) 直接读取缓冲区并按内核上限 (bufsiz) 自动分块；
+        # 旧版本退回 writebytes + 列表，列表长度另有 4096 字节的上限 (即使 bufsiz 被调大)
+        self.bulk_write = hasattr(self.spi, "writebytes2")
+        self.chunk_size = min(SPIDEV_LIST_MAX, bufsiz or spi_chunk_size())
+
+        # 4. 预分配帧缓冲区 (每个像素一个 uint16，内存中为大端字节序)，display() 不再分配内存
+        self._frame = np.empty((self.height, self.width), dtype=np.uint16)
+        self._channel = np.empty((self.height, self.width), dtype=np.uint16)
+        self._shown = np.empty((self.height, self.width), dtype=np.uint16)  # 屏幕上当前的内容
+        self._changed = np.empty((self.height, self.width), dtype=bool)
+        self._shown_valid = False
+        self._screen = None  # 最近一次 show() 的画面
+        self.backlight = None
+        self.stats = {"full": 0, "partial": 0, "unchanged": 0, "rects": 0, "pixels": 0}
         
         self.init_display()
         
     def send_cmd(self, cmd):
         """发送命令 (DC引脚置低)"""
-        GPIO.output(self.dc_pin, GPIO.LOW)
+        self.gpio.output(self.dc_pin, self.gpio.LOW)
         self.spi.writebytes([cmd])
 
     def send_data(self, data):
         """发送数据 (DC引脚置高)"""
-        GPIO.output(self.dc_pin, GPIO.HIGH)
+        self.gpio.output(self.dc_pin, self.gpio.HIGH)
         if isinstance(data, list) or isinstance(data, tuple):
             self.spi.writebytes(list(data))
         else:
@@ -50,12 +148,15 @@ class ST7789_Driver:
         """屏幕上电初始化流程 (Datasheet 规定的标准动作)"""
         # 1. 硬件复位 (Reset)
         # 拉高 -> 拉低(保持一会) -> 拉高，相当于按了一下重启键
-        GPIO.output(self.blk_pin, GPIO.HIGH)
-        GPIO.output(self.rst_pin, GPIO.HIGH)
+        self.invalidate()
+        gpio = self.gpio
+        gpio.output(self.blk_pin, gpio.HIGH)
+        self.backlight = True
+        gpio.output(self.rst_pin, gpio.HIGH)
         time.sleep(0.01)
-        GPIO.output(self.rst_pin, GPIO.LOW)
+        gpio.output(self.rst_pin, gpio.LOW)
         time.sleep(0.01)
-        GPIO.output(self.rst_pin, GPIO.HIGH)
+        gpio.output(self.rst_pin, gpio.HIGH)
         time.sleep(0.15)
         
         # 2. 发送魔法指令 (Magic Codes)
@@ -80,51 +181,97 @@ class ST7789_Driver:
         self.send_data([y0 >> 8, y0 & 0xFF, y1 >> 8, y1 & 0xFF])
         self.send_cmd(0x2C) # Memory Write (准备开始写像素数据)
 
-    def display(self, image):
+    def to_rgb565(self, image):
         """
-        核心函数：将 PIL 图片显示到屏幕上
-        关键点：颜色空间转换 (RGB888 -> RGB565)
+        颜色空间转换 (RGB888 -> RGB565)，结果写入预分配的帧缓冲区并返回。
+        电脑图片通常是 RGB888 (红绿蓝各8位，共24位)；
+        嵌入式屏幕为了省带宽，通常用 RGB565 (红5位，绿6位，蓝5位，共16位)。
+        以前用位运算 (R >> 3 << 11 | G >> 2 << 5 | B >> 3) 逐步生成多个临时数组；
+        现在每个分量查一次 RGB565_LUT (np.take 直接写入缓冲区)，再按位或合并，不产生临时数组。
         """
         if image.size != (self.width, self.height):
             image = image.resize((self.width, self.height))
-        
-        # 1. 格式转换
-        # 电脑图片通常是 RGB888 (红绿蓝各8位，共24位)
-        # 嵌入式屏幕为了省带宽，通常用 RGB565 (红5位，绿6位，蓝5位，共16位)
-        image_rgb = image.convert("RGB")
-        pixels = np.array(image_rgb, dtype=np.uint16)
-        
-        # 2. 位运算魔法 (Bitwise Magic)
-        # R >> 3: 扔掉低3位，保留高5位
-        # G >> 2: 扔掉低2位，保留高6位
-        # B >> 3: 扔掉低3位，保留高5位
-        # << 11/5: 左移，把它们挪到正确的位置拼起来
-        r = (pixels[:, :, 0] >> 3) << 11
-        g = (pixels[:, :, 1] >> 2) << 5
-        b = (pixels[:, :, 2] >> 3)
-        rgb565 = r | g | b # 按位或，拼接成最终的 16位 整数
-        
-        # 3. 大小端转换 (Endianness)
-        # SPI 发送是按字节发的，需要把 16位 拆成两个 8位
-        high_byte = (rgb565 >> 8).astype(np.uint8)
-        low_byte = (rgb565 & 0xFF).astype(np.uint8)
-        
-        # 4. 展平成一维数组
-        data = np.dstack((high_byte, low_byte)).flatten().tolist()
-        
-        # 5. 发送数据
-        self.set_window(0, 0, self.width - 1, self.height - 1)
-        
-        # 分块发送 (Chunking) 以避免缓冲区溢出 (SPI Buffer Overflow)
-        chunk_size = 4096
-        GPIO.output(self.dc_pin, GPIO.HIGH)
-        for i in range(0, len(data), chunk_size):
-            self.spi.writebytes(data[i:i+chunk_size])
+        return rgb565(np.asarray(image.convert("RGB")), self._frame, self._channel)
+
+    def write_pixels(self, pixels):
+        """把 RGB565 像素 (大端字节序的 uint16 数组) 写入当前窗口"""
+        self.gpio.output(self.dc_pin, self.gpio.HIGH)
+        data = memoryview(np.ascontiguousarray(pixels)).cast("B")
+        if self.bulk_write:
+            # 缓冲区直接交给 spidev，不再转换为 Python 列表
+            self.spi.writebytes2(data)
+            return
+        for i in range(0, len(data), self.chunk_size):
+            self.spi.writebytes(data[i:i + self.chunk_size].tolist())
+
+    def invalidate(self):
+        """屏幕内容未知 (唤醒、出错)：下一帧整屏刷新"""
+        self._shown_valid = False
+
+    def display(self, image, full=False):
+        """
+        核心函数：将 PIL 图片显示到屏幕上 (只发送与上一帧不同的区域)
+        """
+        self.show_frame(self.to_rgb565(image), full=full)
+
+    def show(self, screen, **values):
+        """绘制 hardware.ui 的画面 (screen.render(**values))，只比较画面报告的变化区域"""
+        frame, regions = screen.render(**values)
+        # 变化区域是相对该画面上一次的内容而言；屏幕上是别的画面时要整屏比较
+        self.show_frame(frame, regions=regions if screen is self._screen else None)
+        self._screen = screen
+
+    def show_frame(self, frame, full=False, regions=None):
+        """
+        显示一帧 RGB565 像素 ((height, width) uint16，大端字节序，例如 to_rgb565() 的结果)。
+        与屏幕上的内容逐像素比较，只把变化的矩形通过 set_window 发送；full=True 时整屏发送。
+        regions 给出可能变化的区域 [(x0, y0, x1, y1)] (含端点) 时只比较这些区域，None 表示整屏。
+        """
+        full_screen = (0, 0, self.width - 1, self.height - 1)
+        self._screen = None
+        try:
+            if full or not self._shown_valid:
+                rects = [full_screen]
+            else:
+                if regions is None:
+                    np.not_equal(frame, self._shown, out=self._changed)
+                else:
+                    self._changed[:] = False
+                    for x0, y0, x1, y1 in regions:
+                        np.not_equal(frame[y0:y1 + 1, x0:x1 + 1], self._shown[y0:y1 + 1, x0:x1 + 1],
+                                     out=self._changed[y0:y1 + 1, x0:x1 + 1])
+                rects = dirty_rects(self._changed)
+                if not rects:
+                    self.stats["unchanged"] += 1
+                    return
+                if sum((x1 - x0 + 1) * (y1 - y0 + 1) for x0, y0, x1, y1 in rects) > \
+                        DIRTY_FULL_RATIO * self.width * self.height:
+                    rects = [full_screen]
+            for rect in rects:
+                self._send_rect(frame, rect)
+            self.stats["full" if rects == [full_screen] else "partial"] += 1
+            self._shown_valid = True
+        except Exception:
+            # 传输中断，屏幕上可能只有半帧：下一帧整屏重发
+            self.invalidate()
+            raise
+
+    def _send_rect(self, frame, rect):
+        x0, y0, x1, y1 = rect
+        block = frame[y0:y1 + 1, x0:x1 + 1]
+        self.set_window(x0, y0, x1, y1)
+        self.write_pixels(block)
+        self._shown[y0:y1 + 1, x0:x1 + 1] = block
+        self.stats["rects"] += 1
+        self.stats["pixels"] += block.size
 
     def clear(self, color=(0,0,0)):
         img = Image.new("RGB", (self.width, self.height), color)
         self.display(img)
 
     def set_backlight(self, val):
-        """控制背光: True=亮, False=灭"""
-        GPIO.output(self.blk_pin, GPIO.HIGH if val else GPIO.LOW)
+        """控制背光: True=亮, False=灭；从灭到亮 (唤醒) 时下一帧整屏刷新"""
+        if val and not self.backlight:
+            self.invalidate()
+        self.backlight = bool(val)
+        self.gpio.output(self.blk_pin, self.gpio.HIGH if val else self.gpio.LOW)
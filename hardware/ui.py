@@ -0,0 +1,351 @@
+import os
+import datetime
+import functools
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from hardware.st7789_driver import rgb565
+from hardware.screen_cache import FrameCache
+
+FONT_DIR = "/usr/share/fonts/truetype/dejavu"
+SCREEN_CACHE = FrameCache()  # 所有画面共用的页面缓存 (上限见 System_Settings.SCREEN_CACHE_KB)
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(size, bold=False):
+    """TrueType 字体只从磁盘加载一次 (找不到 DejaVu 时使用 PIL 默认字体)"""
+    name = "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"
+    try:
+        return ImageFont.truetype(os.path.join(FONT_DIR, name), size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+class FontMetrics:
+    """
+    字体度量缓存 (Métriques de police)
+    每个字符的步进宽度只测量一次，文本宽度为各字符步进之和 (不含字距调整，误差小于 1 像素)。
+    """
+    _instances = {}
+
+    @classmethod
+    def of(cls, font):
+        metrics = cls._instances.get(id(font))
+        if metrics is None or metrics.font is not font:
+            metrics = cls._instances[id(font)] = cls(font)
+        return metrics
+
+    def __init__(self, font):
+        self.font = font
+        self._advances = {}
+        if hasattr(font, "getmetrics"):
+            ascent, descent = font.getmetrics()
+        else:
+            ascent, descent = font.getbbox("Ag")[3], 0
+        self.height = ascent + descent  # 一行文字占用的像素高度 (从绘制坐标 y 开始)
+
+    def advance(self, char):
+        width = self._advances.get(char)
+        if width is None:
+            width = self._advances[char] = self.font.getlength(char)
+        return width
+
+    def width(self, text):
+        return sum(self.advance(c) for c in text)
+
+    def wrap(self, text, max_width):
+        """按像素宽度折行：优先在空格处断开，单个词超过一行时按字符断开；空行被忽略"""
+        lines = []
+        for paragraph in text.split("\n"):
+            line = ""
+            for word in paragraph.split(" "):
+                candidate = f"{line} {word}" if line else word
+                if self.width(candidate) <= max_width:
+                    line = candidate
+                    continue
+                if line:
+                    lines.append(line)
+                while self.width(word) > max_width and len(word) > 1:
+                    cut = 1
+                    while cut < len(word) and self.width(word[:cut + 1]) <= max_width:
+                        cut += 1
+                    lines.append(word[:cut])
+                    word = word[cut:]
+                line = word
+            if line:
+                lines.append(line)
+        return lines
+
+
+def _font_key(font):
+    return (getattr(font, "path", None), getattr(font, "size", None), id(font))
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class Widget:
+    """
+    控件基类：box = (x0, y0, x1, y1) (右、下边界不含) 覆盖控件可能绘制的所有像素。
+    set() 只在数值真正改变时把控件标记为无效 (invalid)，Screen.render() 只重绘无效的控件。
+    """
+    def __init__(self, box):
+        self.box = box
+        self.invalid = True
+
+    def set(self, **values):
+        for name, value in values.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                self.invalid = True
+
+    def state(self):
+        """决定控件外观的全部数值 (用作页面缓存的键)"""
+        raise NotImplementedError
+
+    def draw(self, draw, origin=(0, 0)):
+        """在 draw 上绘制；origin 为画布左上角在屏幕上的坐标"""
+        raise NotImplementedError
+
+
+class Label(Widget):
+    """文本标签；给出 max_width 时按像素宽度自动折行，每行间隔 line_height"""
+    def __init__(self, pos, text="", font=None, fill="WHITE", max_width=None, line_height=None):
+        self.pos = pos
+        self.text = text
+        self.font = font or get_font(22)
+        self.fill = fill
+        self.max_width = max_width
+        self.metrics = FontMetrics.of(self.font)
+        self.line_height = line_height or self.metrics.height
+        self._lines = None
+        super().__init__(self._box())
+
+    def set(self, **values):
+        before = self.state()
+        super().set(**values)
+        if self.state() != before:
+            self._lines = None
+            self.box = self._box()
+
+    def lines(self):
+        """折行结果 (文本不变时不重新测量)"""
+        if self._lines is None:
+            if self.max_width is None:
+                self._lines = [line for line in self.text.split("\n") if line]
+            else:
+                self._lines = self.metrics.wrap(self.text, self.max_width)
+        return self._lines
+
+    def _box(self):
+        lines = self.lines()
+        x, y = self.pos
+        if not lines:
+            return (x, y, x, y)
+        width = max(self.metrics.width(line) for line in lines)
+        return (x, y, x + int(width) + 2, y + (len(lines) - 1) * self.line_height + self.metrics.height)
+
+    def state(self):
+        return ("label", self.pos, self.text, self.fill, self.max_width, self.line_height, _font_key(self.font))
+
+    def draw(self, draw, origin=(0, 0)):
+        x, y = self.pos[0] - origin[0], self.pos[1] - origin[1]
+        for i, line in enumerate(self.lines()):
+            draw.text((x, y + i * self.line_height), line, font=self.font, fill=self.fill)
+
+
+class Text(Widget):
+    """
+    单行动态文本 (时钟、倒计时)：控件区域固定，宽度按 reserve 中最宽的字符预留 max_chars 个字符，
+    或直接给出 width。text 为 None 时不显示。
+    """
+    def __init__(self, pos, font=None, fill="WHITE", max_chars=8, reserve="0123456789:s", width=None):
+        self.pos = pos
+        self.font = font or get_font(22)
+        self.fill = fill
+        self.text = None
+        metrics = FontMetrics.of(self.font)
+        if width is None:
+            width = int(max(metrics.advance(c) for c in reserve) * max_chars) + 2
+        x, y = pos
+        super().__init__((x, y, x + width, y + metrics.height))
+
+    def state(self):
+        return ("text", self.pos, self.text, self.fill, _font_key(self.font))
+
+    def draw(self, draw, origin=(0, 0)):
+        if self.text is not None:
+            draw.text((self.pos[0] - origin[0], self.pos[1] - origin[1]), self.text, font=self.font, fill=self.fill)
+
+
+class ProgressBar(Widget):
+    """进度条：outline = (x0, y0, x1, y1) 为边框坐标 (含端点)，value 为 0~1，None 时不显示"""
+    def __init__(self, outline, fill="WHITE"):
+        self.outline = outline
+        self.fill = fill
+        self.fill_w = None
+        x0, y0, x1, y1 = outline
+        super().__init__((x0, y0, x1 + 1, y1 + 1))
+
+    def set_value(self, value):
+        width = self.outline[2] - self.outline[0]
+        self.set(fill_w=None if value is None else int(width * value))
+
+    def state(self):
+        return ("progress", self.outline, self.fill, self.fill_w)
+
+    def draw(self, draw, origin=(0, 0)):
+        if self.fill_w is None:
+            return
+        x0, y0, x1, y1 = self.outline
+        x0, x1, y0, y1 = x0 - origin[0], x1 - origin[0], y0 - origin[1], y1 - origin[1]
+        draw.rectangle((x0, y0, x1, y1), outline=self.fill, width=1)
+        if self.fill_w > 0:
+            draw.rectangle((x0 + 1, y0 + 1, x0 + self.fill_w, y1 - 1), fill=self.fill)
+
+
+class Screen:
+    """
+    保留模式的整屏画面 (Écran en mode retenu)
+    页面 = 背景色 + 边框 + 静态控件 (标题、消息)，按页面内容缓存为 RGB565 底图 (FrameCache，LRU)，
+    同时缓存每个动态控件区域的 RGB 底图。动态控件 (进度条、时钟、倒计时) 保留在屏幕上，
+    render() 只在无效控件各自的区域内重绘 (在底图上叠加，文字抗锯齿与整幅绘制逐像素一致)，
+    并返回变化的区域交给驱动，驱动只比较和发送这些区域。
+    动态控件的区域允许重叠，重绘某个区域时会一并绘制与之重叠的其他动态控件。
+    """
+    def __init__(self, size, widgets=(), cache=None, border=True):
+        self.width, self.height = size
+        self.widgets = list(widgets)
+        self.cache = SCREEN_CACHE if cache is None else cache
+        self.border = border
+        self.background = (0, 0, 0)
+        self.static = []
+        self._page = None
+        self._base = None
+        self._crops = None
+        self._frame = np.empty((self.height, self.width), dtype=np.uint16)
+        for widget in self.widgets:
+            x0, y0, x1, y1 = widget.box
+            widget.box = (max(0, x0), max(0, y0), min(self.width, x1), min(self.height, y1))
+
+    def set_page(self, background, static):
+        self.background = background
+        self.static = list(static)
+
+    def _draw_page(self, image, origin=(0, 0)):
+        draw = ImageDraw.Draw(image)
+        if self.border:
+            draw.rectangle((5 - origin[0], 5 - origin[1], self.width - 5 - origin[0], self.height - 5 - origin[1]),
+                           outline="WHITE", width=2)
+        for widget in self.static:
+            widget.draw(draw, origin)
+
+    def _load_page(self, key):
+        """页面底图：命中缓存时不绘制任何文字"""
+        base = self.cache.get(("base",) + key)
+        crops = [self.cache.get(("crop", i) + key) for i in range(len(self.widgets))]
+        if base is None or any(crop is None for crop in crops):
+            image = Image.new("RGB", (self.width, self.height), self.background)
+            self._draw_page(image)
+            rgb = np.asarray(image)
+            # 动态控件区域的 RGB 底图，重绘控件时在它上面叠加 (文字抗锯齿需要与底图混合)
+            crops = []
+            for i, widget in enumerate(self.widgets):
+                x0, y0, x1, y1 = widget.box
+                crops.append(self.cache.put(("crop", i) + key, rgb[y0:y1, x0:x1].copy()))
+            base = self.cache.put(("base",) + key, rgb565(rgb))
+        # 当前页面的底图由 Screen 自己持有，被缓存淘汰也不影响
+        self._base, self._crops = base, crops
+
+    def render(self):
+        """返回 (RGB565 帧, 变化区域 [(x0, y0, x1, y1)] 含端点；None 表示整屏)；帧在下一次 render 前有效"""
+        # 键里包含画面类型和动态控件的位置，多个画面共用一个缓存时不会混淆
+        key = (type(self).__name__, tuple(w.box for w in self.widgets), self.background, self.border) + \
+            tuple(w.state() for w in self.static)
+        regions = None
+        if key != self._page:
+            self._load_page(key)
+            self._page = key
+            np.copyto(self._frame, self._base)
+            for widget in self.widgets:
+                widget.invalid = True
+        else:
+            regions = []
+        for i, widget in enumerate(self.widgets):
+            if not widget.invalid:
+                continue
+            x0, y0, x1, y1 = widget.box
+            if x1 <= x0 or y1 <= y0:
+                continue
+            canvas = Image.fromarray(self._crops[i])
+            draw = ImageDraw.Draw(canvas)
+            for other in self.widgets:
+                if _overlaps(other.box, widget.box):
+                    other.draw(draw, (x0, y0))
+            self._frame[y0:y1, x0:x1] = rgb565(np.asarray(canvas))
+            if regions is not None:
+                regions.append((x0, y0, x1 - 1, y1 - 1))
+        for widget in self.widgets:
+            widget.invalid = False
+        return self._frame, regions
+
+    def render_full(self):
+        """不使用缓存和保留的状态，整幅绘制 (用于对比验证)"""
+        image = Image.new("RGB", (self.width, self.height), self.background)
+        self._draw_page(image)
+        draw = ImageDraw.Draw(image)
+        for widget in self.widgets:
+            widget.draw(draw)
+            widget.invalid = True
+        return rgb565(np.asarray(image))
+
+
+class StatusScreen(Screen):
+    """main.update_screen 的布局：标题、消息 (按像素折行)、进度条、时钟、倒计时"""
+    def __init__(self, size, font_large=None, font_small=None, cache=None):
+        width, height = size
+        font_large = font_large or get_font(32, bold=True)
+        font_small = font_small or get_font(22)
+        self.title = Label((10, 30), font=font_large)
+        self.message = Label((10, 80), font=font_small, max_width=width - 25, line_height=30)
+        self.progress = ProgressBar((20, 180, 220, 190))
+        self.clock = Text((60, 205), font=font_small, fill="YELLOW")
+        self.countdown = Text((180, 205), font=font_small, width=width - 180)
+        super().__init__(size, [self.progress, self.clock, self.countdown], cache)
+
+    def update(self, status_type, message, bg_color=(0, 0, 0), progress=None, countdown=None, clock=None):
+        if clock is None:
+            clock = datetime.datetime.now().strftime("%H:%M:%S")
+        self.title.set(text=status_type)
+        self.message.set(text=message)
+        self.set_page(bg_color, [self.title, self.message])
+        self.progress.set_value(progress)
+        self.clock.set(text=clock)
+        if countdown is None:
+            self.countdown.set(text=None)
+        else:
+            self.countdown.set(text=f"{int(countdown)}s", fill="RED" if countdown < 10 else "GREEN")
+
+    def render(self, status_type, message, bg_color=(0, 0, 0), progress=None, countdown=None, clock=None):
+        """clock 为 None 时取当前时间"""
+        self.update(status_type, message, bg_color, progress, countdown, clock)
+        return super().render()
+
+    def render_full(self, status_type, message, bg_color=(0, 0, 0), progress=None, countdown=None, clock=None):
+        self.update(status_type, message, bg_color, progress, countdown, clock)
+        return super().render_full()
+
+
+class EnrollScreen(Screen):
+    """录入流程的提示画面：标题和多行提示，没有动态控件，每个页面只绘制一次"""
+    def __init__(self, size, cache=None):
+        width, height = size
+        self.title = Label((10, 20), font=get_font(28, bold=True))
+        self.message = Label((10, 70), font=get_font(20), max_width=width - 25, line_height=30)
+        super().__init__(size, cache=cache)
+
+    def render(self, title, message, bg_color=(0, 0, 150)):
+        self.title.set(text=title)
+        self.message.set(text=message)
+        self.set_page(bg_color, [self.title, self.message])
+        return super().render()
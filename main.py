@@ -8,7 +8,6 @@ import serial   # 串口通信库 (用于指纹模块)
 import sqlite3  # SQLite 数据库库
 import datetime # 时间日期库
 import threading # 多线程库 (让程序能"分心"做两件事)
-import queue    # 线程安全的队列 (用于线程间传话)
 import adafruit_fingerprint # 指纹模块驱动
 import lgpio    # 树莓派 GPIO 库 (Pi 5 专用)
 import warnings # 屏蔽过时警告
@@ -18,9 +17,13 @@ from hardware.servo_control import ServoController
 warnings.filterwarnings("ignore", category=UserWarning, module="face_recognition_models")
 warnings.filterwarnings("ignore", message="pkg_resources is deprecated")
 
-from PIL import Image, ImageDraw, ImageFont # 图像处理库
+from PIL import Image # 图像处理库
 from hardware.st7789_driver import ST7789_Driver
+from hardware.ui import StatusScreen, SCREEN_CACHE, get_font
+from hardware.display_service import DisplayService
+from hardware.settings import load_settings, get_int
 from hardware.face_system import FaceRecognizer
+from hardware.face_worker import FaceWorkerProcess, MP_CONTEXT
 import hardware.enrollment as enrollment
 
 # --- 全局配置 (Constants) ---
@@ -36,66 +39,37 @@ WAKE_BUTTON_PIN = 26         # 唤醒按钮连接的 GPIO 引脚
 disp = None
 font_large = None
 font_small = None
+display = None # 屏幕刷新线程 (DisplayService)：所有画面都经它异步绘制
 servos = {}
 h_gpio = None   
-face_queue = queue.Queue()      
-face_running_event = threading.Event() 
+face_running_event = MP_CONTEXT.Event() # 跨进程: 置位时识别子进程才工作
 
 # 核心硬件对象 (全局化以便录入模块调用)
 face_rec = None
+face_proc = None # 人脸识别子进程 (FaceWorkerProcess)
 finger = None
 uart = None # Make uart global so we can close it
 finger_lock = threading.Lock() # Thread lock for serial port access
 
 def init_display_system():
-    global disp, font_large, font_small
+    global disp, font_large, font_small, display
     try:
         disp = ST7789_Driver()
-        try:
-            font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 32)
-            font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 22)
-        except:
-            font_large = ImageFont.load_default()
-            font_small = ImageFont.load_default()
+        font_large = get_font(32, bold=True)
+        font_small = get_font(22)
+        settings = load_settings(DATABASE_NAME)
+        SCREEN_CACHE.resize(get_int(settings, "SCREEN_CACHE_KB", 2048) * 1024)
+        status_screen = StatusScreen((disp.width, disp.height), font_large, font_small)
+        display = DisplayService(disp, status_screen, fps=get_int(settings, "DISPLAY_FPS", 20)).start()
         print("屏幕对象初始化完成 / Écran initialisé")
     except Exception as e:
         print(f"屏幕初始化失败 / Erreur init écran: {e}")
 
 def update_screen(status_type, message, bg_color=(0, 0, 0), progress=None, countdown=None):
-    if disp is None: return
-    disp.set_backlight(True)
-    image = Image.new("RGB", (disp.width, disp.height), bg_color)
-    draw = ImageDraw.Draw(image)
-    draw.rectangle((5, 5, disp.width-5, disp.height-5), outline="WHITE", width=2)
-    draw.text((10, 30), status_type, font=font_large, fill="WHITE")
-    
-    y_pos = 80
-    line_height = 30
-    for raw_line in message.split('\n'):
-        while len(raw_line) > 18:
-            sub_line = raw_line[:18]
-            draw.text((10, y_pos), sub_line, font=font_small, fill="WHITE")
-            y_pos += line_height
-            raw_line = raw_line[18:]
-        if raw_line:
-            draw.text((10, y_pos), raw_line, font=font_small, fill="WHITE")
-            y_pos += line_height
-    
-    if progress is not None:
-        bar_x, bar_y, bar_w, bar_h = 20, 180, 200, 10
-        draw.rectangle((bar_x, bar_y, bar_x + bar_w, bar_y + bar_h), outline="WHITE", width=1)
-        fill_w = int(bar_w * progress)
-        if fill_w > 0:
-            draw.rectangle((bar_x + 1, bar_y + 1, bar_x + fill_w, bar_y + bar_h - 1), fill="WHITE")
-
-    current_time = datetime.datetime.now().strftime("%H:%M:%S")
-    draw.text((60, 205), current_time, font=font_small, fill="YELLOW")
-
-    if countdown is not None:
-        color = "RED" if countdown < 10 else "GREEN"
-        draw.text((180, 205), f"{int(countdown)}s", font=font_small, fill=color)
-
-    disp.display(image)
+    if display is None: return
+    # 只提交请求，立即返回；刷新线程合并积压的画面，只绘制最新的一帧
+    display.set_backlight(True)
+    display.show_status(status_type, message, bg_color, progress=progress, countdown=countdown)
 
 def log_access(user_id, event_type, status, message=""):
     try:
@@ -161,7 +135,7 @@ def check_app_commands():
     """
     处理远程指令：开锁、录入人脸、录入指纹
     """
-    global face_rec, finger
+    global face_rec, face_proc, finger
     try:
         conn = sqlite3.connect(DATABASE_NAME)
         cursor = conn.cursor()
@@ -183,12 +157,13 @@ def check_app_commands():
                 face_running_event.clear()
                 time.sleep(0.5) 
                 
-                if face_rec:
+                if face_rec and face_rec.grabber:
                     # Pass cmd_id for status sync
-                    success = enrollment.run_face_enrollment(disp, face_rec, target_id, DATABASE_NAME, cmd_id=cmd_id)
+                    success = enrollment.run_face_enrollment(display, face_rec, target_id, DATABASE_NAME, cmd_id=cmd_id)
                     if success:
-                        print("录入成功，重新加载人脸库...")
-                        face_rec.load_faces_from_db()
+                        print("录入成功，同步人脸库...")
+                        if face_proc:
+                            face_proc.sync()
                         time.sleep(3)
                         update_screen("PRET", "Scanner...", (0, 0, 0), countdown=SCREEN_TIMEOUT)
                 else:
@@ -205,7 +180,7 @@ def check_app_commands():
                 
                 if finger:
                     # Pass cmd_id for status sync
-                    enrollment.run_finger_enrollment(disp, finger, target_id, DATABASE_NAME, cmd_id=cmd_id)
+                    enrollment.run_finger_enrollment(display, finger, target_id, DATABASE_NAME, cmd_id=cmd_id)
                 else:
                     update_screen("ERREUR", "Capteur HS", (200, 0, 0))
                     time.sleep(2)
@@ -227,6 +202,8 @@ def check_app_commands():
                     cursor.execute("DELETE FROM Users WHERE user_id = ?", (target_id,))
                     conn.commit()
                     print("数据库记录已删除")
+                    if face_proc:
+                        face_proc.remove_user(target_id)
                     update_screen("INFO", f"User {target_id} Deleted\nSupprime", (0, 0, 150))
                     time.sleep(2)
                 except Exception as e:
@@ -247,24 +224,8 @@ def check_app_commands():
         print(f"App指令检查失败: {e}")
     return False
 
-def face_worker(rec_obj):
-    print("人脸识别后台线程已启动 / Thread Visage Démarré")
-    while True:
-        if face_running_event.is_set():
-            try:
-                face_uid = rec_obj.scan()
-                if face_uid:
-                    if face_queue.empty():
-                        face_queue.put(face_uid)
-            except Exception as e:
-                print(f"线程人脸错误 / Erreur Thread Visage: {e}")
-                time.sleep(1)
-        else:
-            time.sleep(0.5)
-        time.sleep(0.1)
-
 def main():
-    global servos, h_gpio, face_rec, finger
+    global servos, h_gpio, face_rec, face_proc, finger
     print("--- 智能胶囊分配器 / Distributeur de Capsules (Polling Mode) ---")
     
     init_display_system()
@@ -294,22 +255,26 @@ def main():
         # Do not exit, let the watchdog try to fix it
     
     try:
-        face_rec = FaceRecognizer()
-        t = threading.Thread(target=face_worker, args=(face_rec,), daemon=True)
-        t.start()
+        # 主进程只负责摄像头和录入，识别在独立进程中进行 (帧经共享内存传递)
+        face_rec = FaceRecognizer(load_gallery=False)
+        if face_rec.grabber:
+            face_proc = FaceWorkerProcess(face_rec, face_running_event).start()
+            print("人脸识别进程已启动 / Processus Visage Démarré")
+            # 向 tools/face_enroll.py 等工具共享摄像头画面，无需停止服务
+            face_rec.serve_camera()
     except Exception as e:
         print(f"人脸模块不可用 / Module Visage indisponible: {e}")
-        face_rec = None
+        face_proc = None
 
     system_state = "SLEEP" 
     last_activity_time = 0 
     session_start_time = 0 
     last_clock_update = 0
     
-    if disp: 
-        disp.set_backlight(False)
-        image = Image.new("RGB", (disp.width, disp.height), "BLACK")
-        disp.display(image)
+    if display:
+        display.set_backlight(False)
+        image = Image.new("RGB", (display.width, display.height), "BLACK")
+        display.display(image)
     
     face_running_event.clear()
     last_btn_state = 0
@@ -321,6 +286,8 @@ def main():
             btn_val = lgpio.gpio_read(h_gpio, WAKE_BUTTON_PIN)
             
             app_cmd_processed = check_app_commands()
+            if face_proc:
+                face_proc.ensure_alive()
             
             if system_state == "SLEEP":
                 if face_running_event.is_set(): face_running_event.clear()
@@ -356,19 +323,19 @@ def main():
                 if current_ts - session_start_time > MAX_SESSION_TIME:
                      print("强制休眠 / Timeout Session")
                      system_state = "SLEEP"
-                     if disp: disp.set_backlight(False)
+                     if display: display.set_backlight(False)
                      face_running_event.clear()
                      continue
 
                 if remaining == 0:
                     print("自动休眠 / Timeout Inactivité")
                     system_state = "SLEEP"
-                    if disp: disp.set_backlight(False)
+                    if display: display.set_backlight(False)
                     face_running_event.clear()
                     continue
                 
-                if not face_queue.empty():
-                    face_uid = face_queue.get()
+                face_uid = face_proc.poll_result() if face_proc else None
+                if face_uid:
                     print(f"人脸检测: {face_uid}")
                     perform_unlock(face_uid, method="Face")
                     last_activity_time = time.time()
@@ -398,14 +365,17 @@ def main():
                 
             last_btn_state = btn_val
     finally:
-        if disp: 
-            try: disp.set_backlight(False)
-            except: pass
+        if display:
+            display.set_backlight(False)
+            display.stop()
         
         if h_gpio is not None:
             try: lgpio.gpiochip_close(h_gpio)
             except Exception: pass # Ignore handle errors on exit
             
+        if face_proc:
+            try: face_proc.stop()
+            except: pass
         if face_rec:
             try: face_rec.close()
             except: pass
@@ -456,12 +426,17 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n用户退出 / Sortie utilisateur")
     finally:
+        if display:
+            display.stop()
         if disp: 
             try: disp.set_backlight(False)
             except: pass
         if h_gpio is not None:
             try: lgpio.gpiochip_close(h_gpio)
             except: pass
+        if face_proc:
+            try: face_proc.stop()
+            except: pass
         if face_rec:
             try: face_rec.close()
             except: pass
\ No newline at end of file
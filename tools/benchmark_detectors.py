@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import cv2
+
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from hardware.face_detectors import DETECTORS, create_detector, benchmark_detectors, select_detector
+from hardware.settings import load_settings, get_float
+
+DATABASE_NAME = os.path.join(PROJECT_ROOT, "capsule_dispenser.db")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def load_samples(image_dir):
+    """
+    读取本地图像集。目录中可放一个 labels.json ({"文件名": 人脸数})，
+    未列出的图片默认包含 1 张人脸 (与录入照片一致)。
+    """
+    labels = {}
+    labels_path = os.path.join(image_dir, "labels.json")
+    if os.path.exists(labels_path):
+        with open(labels_path) as f:
+            labels = json.load(f)
+
+    samples = []
+    for filename in sorted(os.listdir(image_dir)):
+        if not filename.lower().endswith(IMAGE_EXTS):
+            continue
+        bgr = cv2.imread(os.path.join(image_dir, filename))
+        if bgr is None:
+            print(f"  无法读取 / Illisible: {filename}")
+            continue
+        samples.append((cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), int(labels.get(filename, 1))))
+    return samples
+
+def save_detector(name):
+    conn = sqlite3.connect(DATABASE_NAME)
+    conn.execute("INSERT OR REPLACE INTO System_Settings (key_name, value, description) VALUES (?, ?, ?)",
+                 ("FACE_DETECTOR", name, "人脸检测后端 (hog / yunet / haar)"))
+    conn.commit()
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="人脸检测后端基准测试 / Benchmark des détecteurs")
+    parser.add_argument("image_dir", help="本地图像目录 (可含 labels.json)")
+    parser.add_argument("--detectors", default=",".join(DETECTORS), help="要比较的后端，逗号分隔")
+    parser.add_argument("--scale", type=float, default=None, help="检测缩放比例 (默认取 FACE_DETECT_SCALE)")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图重复次数")
+    parser.add_argument("--apply", action="store_true", help="把选出的后端写入 System_Settings")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    args = parser.parse_args()
+
+    settings = load_settings(DATABASE_NAME)
+    scale = args.scale if args.scale is not None else get_float(settings, "FACE_DETECT_SCALE", 0.5)
+    samples = load_samples(args.image_dir)
+    if not samples:
+        print("没有可用的图像 / Aucune image")
+        return
+
+    detectors = []
+    for name in args.detectors.split(","):
+        detector = create_detector(name.strip(), settings)
+        if detector.name == name.strip():
+            detectors.append(detector)
+
+    print(f"图像数 / Images: {len(samples)}  缩放 / Échelle: {scale}")
+    results = benchmark_detectors(detectors, samples, scale=scale, repeat=args.repeat)
+    print(f"{'后端':<8} {'平均ms':>8} {'P90ms':>8} {'召回率':>8} {'误检':>6}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['mean_ms']:>8.1f} {r['p90_ms']:>8.1f} {r['recall']:>8.2%} {r['false_positives']:>6}")
+
+    best = select_detector(results)
+    print(f"\n推荐后端 / Détecteur recommandé: {best}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scale": scale, "results": results, "selected": best}, f, indent=2)
+    if args.apply and best:
+        save_detector(best)
+        print("已写入 System_Settings.FACE_DETECTOR / Paramètre enregistré")
+
+if __name__ == "__main__":
+    main()
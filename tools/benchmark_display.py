@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from hardware.st7789_driver import ST7789_Driver
+from hardware.screen_cache import FrameCache
+from hardware.ui import StatusScreen, EnrollScreen
+
+
+class FakeGPIO:
+    """代替 RPi.GPIO：只记录调用和引脚电平，不操作引脚"""
+    BCM, OUT, HIGH, LOW = 11, 0, 1, 0
+
+    def __init__(self):
+        self.writes = 0
+        self.pins = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, mode):
+        pass
+
+    def output(self, pin, value):
+        self.writes += 1
+        self.pins[pin] = value
+
+
+class PanelEmulator:
+    """
+    按 ST7789 的命令解析 SPI 数据流 (0x2A/0x2B 设定窗口，0x2C 之后的数据写入窗口)，
+    得到屏幕显存的内容，用来验证局部刷新后屏幕上的画面与整屏刷新完全一致。
+    """
+    def __init__(self, gpio, dc_pin=24, size=(240, 240)):
+        self.gpio = gpio
+        self.dc_pin = dc_pin
+        self.width, self.height = size
+        self.memory = np.zeros((self.height, self.width * 2), dtype=np.uint8)
+        self.command = None
+        self.params = []
+        self.window = (0, 0, self.width - 1, self.height - 1)
+        self.cursor = 0
+
+    def feed(self, data):
+        if self.gpio.pins.get(self.dc_pin) == self.gpio.LOW:
+            self.command, self.params, self.cursor = data[0], [], 0
+            return
+        if self.command in (0x2A, 0x2B):
+            self.params += list(data)
+            if len(self.params) == 4:
+                start, end = (self.params[0] << 8) | self.params[1], (self.params[2] << 8) | self.params[3]
+                x0, y0, x1, y1 = self.window
+                self.window = (start, y0, end, y1) if self.command == 0x2A else (x0, start, x1, end)
+        elif self.command == 0x2C:
+            x0, y0, x1, y1 = self.window
+            row_bytes = (x1 - x0 + 1) * 2
+            for value in bytes(data):
+                row, col = divmod(self.cursor, row_bytes)
+                self.memory[y0 + row, x0 * 2 + col] = value
+                self.cursor += 1
+
+    def frame(self):
+        return self.memory.tobytes()
+
+
+class LegacySpiDev:
+    """
+    代替旧版 spidev.SpiDev (只有 writebytes) 的假设备：统计传输的字节数和调用次数。
+    simulate=True 时按 max_speed_hz 睡眠相应的总线传输时间，得到接近真机的帧率上限。
+    """
+    def __init__(self, simulate=False, panel=None):
+        self.max_speed_hz = 24000000
+        self.mode = 0
+        self.simulate = simulate
+        self.panel = panel
+        self.bytes = 0
+        self.calls = 0
+
+    def _transfer(self, data, count):
+        self.bytes += count
+        self.calls += 1
+        if self.panel is not None:
+            self.panel.feed(data)
+        if self.simulate:
+            time.sleep(count * 8 / self.max_speed_hz)
+
+    def writebytes(self, values):
+        if len(values) > 4096:
+            raise OverflowError("spidev: 单次传输超过 4096 字节 / Trop de données")
+        self._transfer(values, len(values))
+
+    def reset(self):
+        self.bytes = 0
+        self.calls = 0
+
+
+class FakeSpiDev(LegacySpiDev):
+    """spidev >= 3.4：writebytes2 接受任意长度的缓冲区 (内部按内核上限分块)"""
+    def writebytes2(self, buffer):
+        data = memoryview(buffer).cast("B")
+        self._transfer(data, len(data))
+
+
+def legacy_display(disp, image):
+    """改进前的 display()：uint16 临时数组 + np.dstack + tolist()，按 4096 个元素分块发送"""
+    if image.size != (disp.width, disp.height):
+        image = image.resize((disp.width, disp.height))
+    pixels = np.array(image.convert("RGB"), dtype=np.uint16)
+    r = (pixels[:, :, 0] >> 3) << 11
+    g = (pixels[:, :, 1] >> 2) << 5
+    b = (pixels[:, :, 2] >> 3)
+    rgb565 = r | g | b
+    high_byte = (rgb565 >> 8).astype(np.uint8)
+    low_byte = (rgb565 & 0xFF).astype(np.uint8)
+    data = np.dstack((high_byte, low_byte)).flatten().tolist()
+    disp.set_window(0, 0, disp.width - 1, disp.height - 1)
+    disp.gpio.output(disp.dc_pin, disp.gpio.HIGH)
+    for i in range(0, len(data), 4096):
+        disp.spi.writebytes(data[i:i + 4096])
+    return data
+
+
+def load_font(size, bold=False):
+    name = "DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"
+    try:
+        return ImageFont.truetype(f"/usr/share/fonts/truetype/dejavu/{name}", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def status_frames(count, size=(240, 240)):
+    """与 main.update_screen 相同布局的开锁动画帧 (进度条逐帧缩短)"""
+    font_large, font_small = load_font(32, bold=True), load_font(22)
+    frames = []
+    for i in range(count, 0, -1):
+        image = Image.new("RGB", size, (0, 150, 0))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((5, 5, size[0] - 5, size[1] - 5), outline="WHITE", width=2)
+        draw.text((10, 30), "OUVERTURE", font=font_large, fill="WHITE")
+        draw.text((10, 80), "Alice #2", font=font_small, fill="WHITE")
+        draw.rectangle((20, 180, 220, 190), outline="WHITE", width=1)
+        draw.rectangle((21, 181, 20 + int(200 * i / count), 189), fill="WHITE")
+        draw.text((60, 205), "12:34:56", font=font_small, fill="YELLOW")
+        frames.append(image)
+    return frames
+
+
+def clock_frames(count, size=(240, 240)):
+    """与 main.update_screen 相同布局的待机画面，每帧只有时钟和倒计时变化 (每秒刷新一次的情形)"""
+    font_large, font_small = load_font(32, bold=True), load_font(22)
+    frames = []
+    for i in range(count):
+        image = Image.new("RGB", size, (0, 0, 150))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((5, 5, size[0] - 5, size[1] - 5), outline="WHITE", width=2)
+        draw.text((10, 30), "PRET", font=font_large, fill="WHITE")
+        draw.text((10, 80), "Systeme Actif", font=font_small, fill="WHITE")
+        draw.text((60, 205), f"12:34:{i % 60:02d}", font=font_small, fill="YELLOW")
+        remaining = 60 - i % 60
+        draw.text((180, 205), f"{remaining}s", font=font_small, fill="RED" if remaining < 10 else "GREEN")
+        frames.append(image)
+    return frames
+
+
+def verify_partial(frames):
+    """逐帧局部刷新后，模拟屏幕上的内容必须与直接转换的整帧逐字节一致"""
+    gpio = FakeGPIO()
+    panel = PanelEmulator(gpio)
+    disp = ST7789_Driver(spi=FakeSpiDev(panel=panel), gpio=gpio)
+    for image in frames:
+        disp.display(image)
+        assert panel.frame() == disp.to_rgb565(image).tobytes(), "局部刷新结果不一致 / Rafraîchissement partiel incorrect"
+    return disp.stats
+
+
+def unlock_calls(count):
+    """开锁流程中 update_screen 的参数序列：进度条逐帧缩短，然后是 FERME、PRET 和每秒一次的倒计时"""
+    calls = [("OUVERTURE", "Alice #2\n(Face)", (0, 150, 0), i / count, None) for i in range(count, 0, -1)]
+    calls += [("FERME", "Fini", (0, 0, 100), None, None), ("PRET", "Systeme Actif", (0, 0, 0), None, None)]
+    return calls + [("PRET", "Scanner...", (0, 0, 0), None, 30 - i) for i in range(count)]
+
+
+def clock_of(i):
+    """第 i 次调用时的时钟文本 (开锁动画每秒 20 帧)"""
+    return f"12:34:{i // 20 % 60:02d}"
+
+
+def verify_widgets(calls, size=(240, 240)):
+    """保留模式画面经局部刷新后，模拟屏幕上的内容必须与整幅绘制逐字节一致 (中间穿插录入画面)"""
+    gpio = FakeGPIO()
+    panel = PanelEmulator(gpio)
+    disp = ST7789_Driver(spi=FakeSpiDev(panel=panel), gpio=gpio)
+    screen, reference = StatusScreen(size, cache=FrameCache()), StatusScreen(size, cache=FrameCache())
+    enroll = EnrollScreen(size, cache=FrameCache())
+    for i, (status_type, message, bg_color, progress, countdown) in enumerate(calls):
+        if i % 25 == 24:
+            disp.show(enroll, title="CAPTURE", message="Visage detecte\nNe bougez pas!", bg_color=(0, 0, 150))
+        disp.show(screen, status_type=status_type, message=message, bg_color=bg_color, progress=progress,
+                  countdown=countdown, clock=clock_of(i))
+        expected = reference.render_full(status_type, message, bg_color, progress, countdown, clock_of(i))
+        assert panel.frame() == expected.tobytes(), "控件画面不一致 / Widgets incorrects"
+    return disp.stats
+
+
+def run_screens(label, show, calls, spi, repeat):
+    """逐次调用 show(参数, 时钟)，计入绘制 + 转换 + 发送的总耗时"""
+    spi.reset()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for i, args in enumerate(calls):
+            show(args, clock_of(i))
+    elapsed = time.perf_counter() - t0
+    count = repeat * len(calls)
+    result = {"mode": label, "fps": count / elapsed, "ms_per_frame": elapsed * 1000 / count,
+              "bytes_per_frame": spi.bytes / count, "spi_calls_per_frame": spi.calls / count}
+    print(f"{label:<28} {result['fps']:>8.1f} fps {result['ms_per_frame']:>8.2f} ms/帧 "
+          f"{result['bytes_per_frame']:>9.0f} B/帧 {result['spi_calls_per_frame']:>6.1f} 次/帧")
+    return result
+
+
+def run(label, show, frames, spi, repeat):
+    """逐帧调用 show(image)，返回帧率和每帧耗时"""
+    spi.reset()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for image in frames:
+            show(image)
+    elapsed = time.perf_counter() - t0
+    count = repeat * len(frames)
+    result = {"mode": label, "fps": count / elapsed, "ms_per_frame": elapsed * 1000 / count,
+              "bytes_per_frame": spi.bytes / count, "spi_calls_per_frame": spi.calls / count}
+    print(f"{label:<28} {result['fps']:>8.1f} fps {result['ms_per_frame']:>8.2f} ms/帧 "
+          f"{result['bytes_per_frame']:>9.0f} B/帧 {result['spi_calls_per_frame']:>6.1f} 次/帧")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ST7789 刷新速度测试 (假 SPI 设备) / Benchmark écran")
+    parser.add_argument("--frames", type=int, default=50, help="动画帧数 (与开锁动画相同为 50)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--speed", type=int, default=24000000, help="SPI 时钟 (Hz)")
+    parser.add_argument("--simulate-bus", action="store_true", help="按 SPI 时钟模拟传输耗时")
+    parser.add_argument("--cache-kb", type=int, default=2048, help="页面缓存上限 (KB)")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    args = parser.parse_args()
+
+    frames = status_frames(args.frames)
+    spi = FakeSpiDev(simulate=args.simulate_bus)
+    disp = ST7789_Driver(speed_hz=args.speed, spi=spi, gpio=FakeGPIO())
+
+    # 新旧两种转换的输出必须逐字节一致
+    expected = bytes(legacy_display(disp, frames[0]))
+    assert disp.to_rgb565(frames[0]).tobytes() == expected, "RGB565 转换结果不一致 / Conversion incorrecte"
+
+    bus_ms = disp.width * disp.height * 2 * 8 / args.speed * 1000
+    print(f"SPI {args.speed / 1e6:.0f} MHz: 整屏传输下限 {bus_ms:.1f} ms ({1000 / bus_ms:.1f} fps)"
+          f"{' (模拟总线耗时)' if args.simulate_bus else ''}")
+    results = [
+        run("legacy (tolist + writebytes)", lambda image: legacy_display(disp, image), frames, spi, args.repeat),
+        run("display (LUT + writebytes2)", lambda image: disp.display(image, full=True), frames, spi, args.repeat),
+        run("convert only (LUT)", disp.to_rgb565, frames, spi, args.repeat),
+    ]
+    # 没有 writebytes2 的旧版 spidev：同样的转换，分块以列表发送
+    # (按调大后的内核 bufsiz 创建，列表分块仍须遵守 writebytes 的 4096 字节上限)
+    old_spi = LegacySpiDev(simulate=args.simulate_bus)
+    old_disp = ST7789_Driver(speed_hz=args.speed, spi=old_spi, gpio=FakeGPIO(), bufsiz=65536)
+    results.append(run("display (LUT + writebytes)", lambda image: old_disp.display(image, full=True), frames, old_spi, args.repeat))
+
+    # 局部刷新：先验证模拟屏幕的内容，再比较整屏刷新和只发送变化区域的开销
+    ticks = clock_frames(args.frames)
+    stats = verify_partial(ticks[:10] + frames[:10] + ticks[10:20])
+    print(f"局部刷新验证通过 / Vérifié: {stats}")
+    results += [
+        run("clock: full refresh", lambda image: disp.display(image, full=True), ticks, spi, args.repeat),
+        run("clock: dirty rects", disp.display, ticks, spi, args.repeat),
+        run("unlock: dirty rects", disp.display, frames, spi, args.repeat),
+    ]
+
+    # 保留模式控件：整幅重新绘制 vs 缓存的页面底图 + 只重绘变化的控件 (结果必须逐像素一致)
+    calls = unlock_calls(args.frames)
+    print(f"控件画面验证通过 / Vérifié: {verify_widgets(calls)}")
+    size = (disp.width, disp.height)
+    redraw = StatusScreen(size, cache=FrameCache())
+    widgets = StatusScreen(size, cache=FrameCache(max_bytes=args.cache_kb * 1024))
+    # 每种方式使用各自的驱动，第一帧都从空白屏幕开始比较，不受上一项测试最后一帧的影响
+    redraw_disp = ST7789_Driver(speed_hz=args.speed, spi=spi, gpio=FakeGPIO())
+    widgets_disp = ST7789_Driver(speed_hz=args.speed, spi=spi, gpio=FakeGPIO())
+
+    def show_redraw(call, clock):
+        redraw_disp.show_frame(redraw.render_full(*call, clock=clock))
+
+    def show_widgets(call, clock):
+        status_type, message, bg_color, progress, countdown = call
+        widgets_disp.show(widgets, status_type=status_type, message=message, bg_color=bg_color,
+                          progress=progress, countdown=countdown, clock=clock)
+
+    results += [
+        run_screens("status: redraw every frame", show_redraw, calls, spi, args.repeat),
+        run_screens("status: retained widgets", show_widgets, calls, spi, args.repeat),
+    ]
+    print(f"页面缓存 / Cache: {len(widgets.cache)} 项, {widgets.cache.nbytes / 1024:.0f} KB, {widgets.cache.stats}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"speed_hz": args.speed, "simulate_bus": args.simulate_bus, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
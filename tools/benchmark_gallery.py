@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from hardware.face_gallery import FaceGallery, GALLERY_DTYPES, EMBEDDING_DIM
+from hardware.gallery_file import GalleryFile, GALLERY_FILE
+
+# 随机身份之间的典型距离约 0.8，同一人两次采集的距离约 0.15 (与 dlib 特征相近)
+IDENTITY_SPREAD = 0.8
+CAPTURE_NOISE = 0.15
+
+def synthetic_gallery(count, dim, rng):
+    ids = np.arange(1, count + 1, dtype=np.int64)
+    matrix = rng.normal(0.0, IDENTITY_SPREAD / np.sqrt(2 * dim), size=(count, dim)).astype(np.float32)
+    return ids, matrix
+
+def make_queries(matrix, count, dim, rng):
+    """一半为已录入身份 (加采集噪声)，一半为陌生人"""
+    known = count // 2
+    picks = rng.integers(0, len(matrix), size=known)
+    queries = np.concatenate((
+        matrix[picks] + rng.normal(0.0, CAPTURE_NOISE / np.sqrt(dim), size=(known, dim)),
+        rng.normal(0.0, IDENTITY_SPREAD / np.sqrt(2 * dim), size=(count - known, dim)),
+    )).astype(np.float32)
+    return queries
+
+def time_queries(gallery, queries, k):
+    """逐张人脸查询 (与 scan() 中每帧 1~2 张人脸的情况一致)，返回 (结果, 耗时 ms 列表)"""
+    ids, dists, times = [], [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        top_ids, top_dist = gallery.match(query[None, :], k=k)
+        times.append((time.perf_counter() - t0) * 1000)
+        ids.append(top_ids[0, 0])
+        dists.append(top_dist[0, 0])
+    return np.array(ids), np.array(dists), np.array(times)
+
+def decisions(ids, dists, threshold):
+    """每个查询的最终判定：接受的用户 ID，拒绝为 -1"""
+    return np.where(dists < threshold, ids, -1)
+
+def benchmark_size(size, args, rng, gallery=None):
+    """gallery 为 (ids, matrix) 时使用真实人脸库 (快照文件)，否则生成 size 个随机身份"""
+    ids, matrix = gallery if gallery is not None else synthetic_gallery(size, args.dim, rng)
+    queries = make_queries(matrix, args.queries, args.dim, rng)
+
+    linear = FaceGallery(dim=args.dim, dtype=args.dtype)
+    linear.build(ids, matrix)
+    t0 = time.perf_counter()
+    indexed = FaceGallery(dim=args.dim, dtype=args.dtype, index_min=1, nprobe=args.nprobe,
+                          exact_above=args.threshold, exact_margin=args.margin)
+    indexed.build(ids, matrix)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    lin_ids, lin_dist, lin_times = time_queries(linear, queries, args.k)
+    ann_ids, ann_dist, ann_times = time_queries(indexed, queries, args.k)
+    stats = dict(indexed.index_stats)
+    # 不退回精确比对的纯近似模式，作为参考
+    indexed.exact_above = None
+    raw_ids, raw_dist, raw_times = time_queries(indexed, queries, args.k)
+    known = len(queries) // 2
+    return {
+        "identities": len(np.unique(ids)),
+        "nlist": indexed.index.nlist,
+        "build_ms": build_ms,
+        "linear_ms": float(np.mean(lin_times)),
+        "linear_p90_ms": float(np.percentile(lin_times, 90)),
+        "ivf_ms": float(np.mean(ann_times)),
+        "ivf_p90_ms": float(np.percentile(ann_times, 90)),
+        "ivf_known_ms": float(np.mean(ann_times[:known])),
+        "ivf_stranger_ms": float(np.mean(ann_times[known:])),
+        "speedup_known": float(np.mean(lin_times[:known]) / max(np.mean(ann_times[:known]), 1e-9)),
+        "recall_at_1": float(np.mean(ann_ids == lin_ids)),
+        "decision_agreement": float(np.mean((ann_dist < args.threshold) == (lin_dist < args.threshold))),
+        # 接受的身份也要相同 (拒绝记为 -1)：IVF 可能漏掉未扫描聚类中更近的其他用户
+        "identity_agreement": float(np.mean(decisions(ann_ids, ann_dist, args.threshold)
+                                            == decisions(lin_ids, lin_dist, args.threshold))),
+        "candidates_per_query": stats["candidates"] / max(1, stats["queries"]),
+        "fallback_rate": stats["fallbacks"] / max(1, stats["queries"]),
+        "approx_ms": float(np.mean(raw_times)),
+        "approx_recall_at_1": float(np.mean(raw_ids[:known] == lin_ids[:known])),
+        "approx_decision_agreement": float(np.mean((raw_dist < args.threshold) == (lin_dist < args.threshold))),
+        "approx_identity_agreement": float(np.mean(decisions(raw_ids, raw_dist, args.threshold)
+                                                   == decisions(lin_ids, lin_dist, args.threshold))),
+        "bytes": indexed.nbytes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="人脸库线性比对与 IVF 索引的规模测试 / Benchmark de la galerie")
+    parser.add_argument("--sizes", default="100,1000,10000,100000", help="身份数量，逗号分隔")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--dtype", default="float32", choices=GALLERY_DTYPES)
+    parser.add_argument("--nprobe", type=int, default=8, help="每次查询扫描的聚类数")
+    parser.add_argument("--threshold", type=float, default=0.42, help="判定阈值 (低于则接受)")
+    parser.add_argument("--margin", type=float, default=0.05, help="阈值下方该范围内的匹配用全库比对复核")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--file", nargs="?", const=GALLERY_FILE,
+                        help="使用共享快照文件中的真实人脸库 (默认 face_gallery.bin)，不读取数据库")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    args = parser.parse_args()
+
+    galleries = [(int(s), None) for s in args.sizes.split(",")]
+    if args.file:
+        snapshot = GalleryFile.open(args.file)
+        if snapshot is None or len(snapshot) == 0:
+            parser.error(f"快照文件不存在或为空 / Fichier absent: {args.file}")
+        print(f"快照 / Instantané: 第 {snapshot.generation} 代, {len(snapshot)} 个特征, 模型 {snapshot.model}")
+        args.dim = snapshot.dim
+        galleries = [(len(snapshot), (snapshot.ids, snapshot.matrix))]
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    # 已录入: 明确命中阈值时只扫描候选；陌生人/接近阈值: 退回全库比对。身份一致率衡量近似带来的误差
+    print(f"{'身份数':>8} {'nlist':>6} {'构建ms':>8} {'线性ms':>8} {'已录入ms':>9} {'陌生人ms':>9} "
+          f"{'加速':>6} {'身份一致':>8} {'候选数':>7} | {'纯近似ms':>9} {'Recall@1':>9} {'身份一致':>8}")
+    for size, gallery in galleries:
+        r = benchmark_size(size, args, rng, gallery)
+        results.append(r)
+        print(f"{r['identities']:>8} {r['nlist']:>6} {r['build_ms']:>8.1f} {r['linear_ms']:>8.3f} "
+              f"{r['ivf_known_ms']:>9.3f} {r['ivf_stranger_ms']:>9.3f} {r['speedup_known']:>6.1f} "
+              f"{r['identity_agreement']:>8.2%} {r['candidates_per_query']:>7.0f} | {r['approx_ms']:>9.3f} "
+              f"{r['approx_recall_at_1']:>9.2%} {r['approx_identity_agreement']:>8.2%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"dtype": args.dtype, "nprobe": args.nprobe, "threshold": args.threshold, "margin": args.margin,
+                       "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import numpy as np
+import cv2
+
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from hardware.face_system import FaceRecognizer
+from hardware.camera_sources import ReplayFeed, open_source, IMAGE_EXTS, VIDEO_EXTS
+
+STAGES = ("capture", "enhance", "detect", "track", "encode", "match")
+
+def list_media(directory):
+    return sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTS + VIDEO_EXTS))
+
+def load_dataset(root):
+    """
+    数据集目录结构:
+      enroll/<身份>/*.jpg        录入用照片 (每人一张或多张)
+      probe/<身份>/*.jpg|*.mp4   测试样本；身份不在 enroll 中 (例如 unknown/) 的视为陌生人
+    身份目录名可以是用户 ID 或任意名字，返回 (名字 -> 编号, 录入文件, 测试文件)
+    """
+    enroll_dir, probe_dir = os.path.join(root, "enroll"), os.path.join(root, "probe")
+    names = sorted(d for d in os.listdir(enroll_dir) if os.path.isdir(os.path.join(enroll_dir, d)))
+    identities = {name: i + 1 for i, name in enumerate(names)}
+    enroll = [(identities[name], os.path.join(enroll_dir, name, f))
+              for name in names for f in list_media(os.path.join(enroll_dir, name))]
+    probes = []
+    for name in sorted(os.listdir(probe_dir)):
+        directory = os.path.join(probe_dir, name)
+        if os.path.isdir(directory):
+            probes += [(identities.get(name), name, os.path.join(directory, f)) for f in list_media(directory)]
+    return identities, enroll, probes
+
+def build_gallery(rec, enroll):
+    """用录入照片建立内存中的人脸库 (不读写数据库)"""
+    ids, encodings = [], []
+    for uid, path in enroll:
+        bgr = cv2.imread(path)
+        if bgr is None:
+            print(f"  无法读取 / Illisible: {path}")
+            continue
+        rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        locations = rec.detect_faces(rgb)
+        if not locations:
+            print(f"  未检测到人脸 / Aucun visage: {path}")
+            continue
+        # 多张人脸时取面积最大的一张
+        largest = max(locations, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))
+        ids.append(uid)
+        encodings.append(rec.encode_faces(rgb, [largest])[0])
+    rec.gallery.build(ids, np.asarray(encodings, dtype=np.float32).reshape(len(ids), rec.gallery.dim))
+    return len(ids)
+
+def replay(rec, spec, repeat, timings):
+    """
+    把一个样本 (图片或视频) 完整送入 scan_from()。
+    返回 (所有帧上的最近匹配 [(user_id, distance)], 流水线判定的 user_id, 帧数)
+    """
+    cap, color, rotated = open_source(spec, repeat=repeat)
+    feed = ReplayFeed(cap)
+    rec.frame_color, rec.frame_rotated = color, rotated
+    rec.reset_tracks()
+    matches, decision, frames = [], None, 0
+    while True:
+        uid = rec.scan_from(feed.latest, scheduled=False)
+        if feed.exhausted:
+            break
+        frames += 1
+        timings["capture"].append(feed.read_ms)
+        for stage, ms in rec.stage_ms.items():
+            timings[stage].append(ms)
+        matches += rec.last_matches
+        if uid is not None and decision is None:
+            decision = uid
+    feed.release()
+    return matches, decision, frames
+
+def error_rates(attempts, thresholds):
+    """
+    按阈值计算 FAR / FRR (以样本为单位):
+      陌生人样本: 任一帧最近距离低于阈值 -> 误识 (FAR)
+      已录入样本: 没有任何一帧以正确身份低于阈值 -> 拒识 (FRR)；以错误身份低于阈值 -> 错认
+    """
+    genuine = [a for a in attempts if a["label"] is not None]
+    impostor = [a for a in attempts if a["label"] is None]
+    rows = []
+    for t in thresholds:
+        false_accepts = sum(any(d < t for _, d in a["matches"]) for a in impostor)
+        false_rejects = sum(not any(u == a["label"] and d < t for u, d in a["matches"]) for a in genuine)
+        misidentified = sum(any(u != a["label"] and d < t for u, d in a["matches"]) for a in genuine)
+        rows.append({
+            "threshold": round(float(t), 4),
+            "far": false_accepts / len(impostor) if impostor else None,
+            "frr": false_rejects / len(genuine) if genuine else None,
+            "misidentification": misidentified / len(genuine) if genuine else None,
+        })
+    return rows
+
+def summarize(values):
+    if not values:
+        return None
+    return {"mean": float(np.mean(values)), "p50": float(np.percentile(values, 50)),
+            "p90": float(np.percentile(values, 90)), "count": len(values)}
+
+def run_benchmark(args):
+    rec = FaceRecognizer(open_camera=False, load_gallery=False)
+    if not args.gate:
+        rec.gate = None
+    timings = {stage: [] for stage in STAGES}
+    attempts = []
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        # 合成画面中没有真实人脸，放入随机特征只为让流水线完整运行
+        rec.gallery.build([1], np.random.default_rng(0).normal(size=(1, rec.gallery.dim)))
+        _, _, frames = replay(rec, f"synthetic:{args.synthetic}", 1, timings)
+    else:
+        identities, enroll, probes = load_dataset(args.dataset)
+        enrolled = build_gallery(rec, enroll)
+        print(f"已录入 / Inscrits: {enrolled} 张人脸, {len(identities)} 个身份; 测试样本 / Essais: {len(probes)}")
+        if enrolled == 0:
+            raise SystemExit("没有可用的录入照片 / Aucune photo d'inscription")
+        t0 = time.perf_counter()
+        frames = 0
+        for label, name, path in probes:
+            matches, decision, count = replay(rec, path, args.repeat, timings)
+            frames += count
+            attempts.append({"file": os.path.relpath(path, args.dataset), "identity": name, "label": label,
+                             "decision": decision, "matches": matches})
+    elapsed = time.perf_counter() - t0
+
+    start, stop, step = (float(v) for v in args.thresholds.split(":"))
+    thresholds = np.arange(start, stop + step / 2, step)
+    genuine = [a for a in attempts if a["label"] is not None]
+    impostor = [a for a in attempts if a["label"] is None]
+    report = {
+        "config": {
+            "detector": rec.detector.name, "embedder": rec.embedder.name, "gallery_dtype": rec.gallery.dtype,
+            "detect_scale": rec.detect_scale, "enhancer": rec.preprocessor.enhancer,
+            "gate": bool(rec.gate), "repeat": args.repeat,
+        },
+        "frames": frames,
+        "elapsed_s": elapsed,
+        "throughput_fps": frames / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {stage: summarize(values) for stage, values in timings.items()},
+        "pipeline": {
+            # scan() 的实际判定 (含多帧投票)，阈值取 System_Settings
+            "genuine": len(genuine),
+            "correct": sum(a["decision"] == a["label"] for a in genuine),
+            "rejected": sum(a["decision"] is None for a in genuine),
+            "misidentified": sum(a["decision"] not in (None, a["label"]) for a in genuine),
+            "impostor": len(impostor),
+            "false_accepts": sum(a["decision"] is not None for a in impostor),
+        },
+        "error_rates": error_rates(attempts, thresholds) if attempts else [],
+        "attempts": [{k: a[k] for k in ("file", "identity", "decision")} for a in attempts],
+    }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="离线人脸识别基准测试 / Benchmark hors ligne")
+    parser.add_argument("dataset", nargs="?", help="数据集目录 (enroll/ 与 probe/)")
+    parser.add_argument("--synthetic", type=int, default=0, help="不使用数据集，回放 N 帧合成画面 (只测延迟)")
+    parser.add_argument("--repeat", type=int, default=3, help="每张测试图片重复的帧数")
+    parser.add_argument("--thresholds", default="0.30:0.60:0.02", help="阈值范围 起:止:步长")
+    parser.add_argument("--gate", action="store_true", help="保留检测前预筛 (默认关闭，回放图片没有运动)")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件 (默认打印到标准输出)")
+    args = parser.parse_args()
+    if not args.dataset and not args.synthetic:
+        parser.error("需要数据集目录或 --synthetic N")
+
+    # 识别流程的日志输出到 stderr，标准输出只保留 JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text)
+        print(f"结果已保存 / Résultats: {args.json}", file=sys.stderr)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,102 @@
 import sys
+import os
+import json
+import time
+import argparse
 import cv2
 
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from hardware.camera import (FrameGrabber, PIPELINE_CACHE, TUNE_FORMATS, TUNE_MODES, TUNE_FRAMERATES,
+                             tuning_candidates, pipeline_from_params, benchmark_pipeline, select_pipeline,
+                             load_pipeline_cache, save_pipeline_cache)
+from hardware.camera_broker import BrokerClient
+
+def parse_format(value):
+    return None if value.lower() == "auto" else value.upper()
+
+def parse_framerate(value):
+    return None if value.lower() == "auto" else int(value)
+
+def parse_mode(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def tune(args):
+    """
+    自动调优 (Réglage automatique)：逐个打开候选管道 (格式 x 分辨率 x 帧率)，
+    测量启动延迟、帧率、帧间隔和每帧 CPU 开销，把最佳管道写入缓存文件，
+    FaceRecognizer.init_camera() 和 face_enroll.py 启动时会先打开它。
+    """
+    client = BrokerClient.connect()
+    if client:
+        client.stop()
+        print("❌ 摄像头正被守护进程占用，请先停止服务再调优 / Service actif, arrêtez-le d'abord")
+        return 1
+
+    cached = load_pipeline_cache(args.cache)
+    if cached:
+        print(f"当前缓存 / Cache actuel: {pipeline_from_params(cached)[1]} "
+              f"({cached.get('fps', 0):.1f} fps, {cached.get('tuned_at', '?')})")
+
+    results = []
+    # 先调管道内旋转+转 RGB 的版本；全部失败 (缺少 videoflip 等元素) 时再调旧式 BGR 管道
+    for flip in (True, False):
+        candidates = tuning_candidates(args.formats, args.modes, args.framerates, flip=flip)
+        print(f"\n--- 测试 {len(candidates)} 个候选管道 / Essai de {len(candidates)} pipelines ---")
+        print(f"{'管道 / Pipeline':<52} {'open':>7} {'fps':>6} {'p90':>7} {'cpu':>7}")
+        for params in candidates:
+            pipeline, name, _, _ = pipeline_from_params(params)
+            result = benchmark_pipeline(pipeline, duration=args.duration)
+            results.append((params, result))
+            if "error" in result:
+                print(f"{name:<52} ❌ {result['error']}")
+            else:
+                print(f"{name:<52} {result['open_ms']:>5.0f}ms {result['fps']:>6.1f} "
+                      f"{result['latency_ms']:>5.1f}ms {result['cpu_ms']:>5.1f}ms")
+        if any("error" not in r for _, r in results):
+            break
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([dict(params, **result) for params, result in results], f, indent=2)
+        print(f"测量结果已保存 / Résultats: {args.json}")
+
+    best = select_pipeline(results)
+    if best is None:
+        print("\n❌ 没有可用的管道 / Aucun pipeline utilisable")
+        return 1
+    params, result = best
+    print(f"\n✅ 最佳管道 / Meilleur: {pipeline_from_params(params)[1]}")
+    print(f"   {result['fps']:.1f} fps, 帧间隔 p90 {result['latency_ms']:.1f}ms, "
+          f"CPU {result['cpu_ms']:.1f}ms/帧, 启动 {result['open_ms']:.0f}ms")
+    if args.dry_run:
+        print("   (--dry-run: 未写入缓存)")
+    else:
+        save_pipeline_cache(params, result, args.cache)
+        print(f"   已写入缓存 / Cache: {args.cache}")
+    return 0
+
+parser = argparse.ArgumentParser(description="摄像头诊断与管道调优 / Diagnostic caméra")
+parser.add_argument("--tune", action="store_true", help="测试候选管道并缓存最佳管道")
+parser.add_argument("--duration", type=float, default=3.0, help="每个候选管道的测量时间 (秒)")
+parser.add_argument("--formats", type=parse_format, nargs="+", default=list(TUNE_FORMATS),
+                    help="源格式，例如 NV12 YUY2 auto")
+parser.add_argument("--modes", type=parse_mode, nargs="+", default=list(TUNE_MODES),
+                    help="传感器分辨率，例如 640x480 1280x960")
+parser.add_argument("--framerates", type=parse_framerate, nargs="+", default=list(TUNE_FRAMERATES),
+                    help="帧率，例如 30 60 auto")
+parser.add_argument("--cache", default=PIPELINE_CACHE, help="缓存文件路径")
+parser.add_argument("--json", help="把所有候选的测量结果保存为 JSON")
+parser.add_argument("--dry-run", action="store_true", help="只测量，不写入缓存")
+args = parser.parse_args()
+
 print(f"OpenCV Version: {cv2.__version__}")
 print("GStreamer Support:", "YES" if cv2.getBuildInformation().find("GSTREAMER") >= 0 else "NO")
 
+if args.tune:
+    sys.exit(tune(args))
+
 print("\n--- 尝试简单的 GStreamer 测试 ---")
 # 一个最简单的测试管道，不涉及摄像头，只生成测试信号
 test_pipeline = "videotestsrc ! videoconvert ! appsink drop=1"
@@ -21,6 +114,22 @@ else:
     print("❌ GStreamer 基础功能失败 (无法加载 videotestsrc)")
     print("   原因可能是: 缺少 gstreamer1.0-plugins-base 或 opencv 未编译 GStreamer 支持")
 
+print("\n--- 摄像头代理测试 (守护进程) ---")
+client = BrokerClient.connect()
+if client:
+    info = client.info
+    print(f"✅ 守护进程 (PID {info['pid']}) 正在共享摄像头: {info['shape']} {info['color']}")
+    seq, frames, start = 0, 0, time.time()
+    while time.time() - start < 3:
+        seq, _, frame = client.wait_frame(after_seq=seq, timeout=1.0)
+        if frame is not None:
+            frames += 1
+    client.stop()
+    print(f"   经代理收到的帧率 / FPS: {frames / 3:.1f}")
+    print("   摄像头由守护进程占用，跳过 libcamerasrc 直接测试")
+    sys.exit(0)
+print("   未检测到摄像头代理 (守护进程未运行)，直接测试摄像头")
+
 print("\n--- 尝试 Libcamera GStreamer 测试 ---")
 # 检查 libcamerasrc 是否存在
 camera_pipeline = "libcamerasrc ! video/x-raw,width=640,height=480 ! videoconvert ! appsink drop=1"
@@ -31,11 +140,27 @@ if cap2.isOpened():
     ret, frame = cap2.read()
     if ret:
         print(f"   摄像头读取成功: {frame.shape}")
+
+        # 通过后台取帧线程测量实际帧率 (与 main.py 的读取方式一致)
+        grabber = FrameGrabber(cap2).start()
+        time.sleep(3)
+        _, _, latest = grabber.latest()
+        grabber.stop()
+        print(f"   实测帧率 / FPS: {grabber.frame_count / 3:.1f} (读取失败: {grabber.read_errors})")
+        if latest is not None:
+            print(f"   最新帧 / Dernière image: {latest.shape}")
     else:
         print("   ❌ 管道已打开，但无法读取帧 (可能流协商失败)")
+    cap2.release()
 else:
     print("❌ libcamerasrc 管道初始化失败")
     print("   可能原因: ")
     print("   1. 未安装 'gstreamer1.0-libcamera'")
     print("   2. 摄像头正被其他程序占用")
     print("   3. 排线接触不良 (即使 rpicam-hello 能跑，有时也不稳定)")
+
+cached = load_pipeline_cache()
+if cached:
+    print(f"\n已缓存的管道 / Pipeline en cache: {pipeline_from_params(cached)[1]} ({cached.get('tuned_at', '?')})")
+else:
+    print("\n未调优：运行 --tune 可缓存最佳管道，加快启动 / Lancez --tune pour accélérer le démarrage")
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import numpy as np
+
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from hardware.face_gallery import FaceGallery, GALLERY_DTYPES, EMBEDDING_DIM, blobs_to_matrix
+from hardware.settings import load_settings, get_float, get_str
+
+DATABASE_NAME = os.path.join(PROJECT_ROOT, "capsule_dispenser.db")
+
+def load_embeddings(model):
+    """读取数据库中指定特征后端的全部特征"""
+    conn = sqlite3.connect(DATABASE_NAME)
+    rows = conn.execute("SELECT user_id, dim, embedding FROM Face_Embeddings WHERE model = ?",
+                        (model,)).fetchall()
+    conn.close()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    dim = rows[0][1]
+    rows = [r for r in rows if r[1] == dim]
+    return np.array([r[0] for r in rows], dtype=np.int64), blobs_to_matrix([r[2] for r in rows], dim)
+
+def synthetic_embeddings(count, dim, rng):
+    """生成与 dlib 特征分布近似的随机特征 (每维约 ±0.1，范数约 1)"""
+    matrix = rng.normal(0.0, 1.0 / np.sqrt(dim), size=(count, dim)).astype(np.float32)
+    return np.arange(1, count + 1, dtype=np.int64), matrix
+
+def make_queries(matrix, count, noise, rng):
+    """从库中随机取向量并加噪声，模拟同一人的新一次采集"""
+    picks = rng.integers(0, len(matrix), size=count)
+    queries = matrix[picks] + rng.normal(0.0, noise, size=(count, matrix.shape[1])).astype(np.float32)
+    return picks, queries
+
+def reference_distances(matrix, queries):
+    """float64 精确距离，作为误差基准"""
+    diff = queries.astype(np.float64)[:, None, :] - matrix.astype(np.float64)[None, :, :]
+    return np.sqrt(np.einsum("qnd,qnd->qn", diff, diff))
+
+def measure(dtype, ids, matrix, queries, reference, threshold):
+    gallery = FaceGallery(dim=matrix.shape[1], dtype=dtype)
+    gallery.build(ids, matrix)
+    dist = gallery.distances(queries).astype(np.float64)
+    error = np.abs(dist - reference)
+    ref_top = reference.argmin(axis=1)
+    top = dist.argmin(axis=1)
+    # 以最近邻是否低于阈值作为接受/拒绝判定，统计判定翻转的次数
+    ref_accept = reference[np.arange(len(queries)), ref_top] < threshold
+    accept = dist[np.arange(len(queries)), top] < threshold
+    return {
+        "bytes": gallery.nbytes,
+        "max_abs_error": float(error.max()),
+        "mean_abs_error": float(error.mean()),
+        "top1_agreement": float(np.mean(top == ref_top)),
+        "decision_flips": int(np.sum(accept != ref_accept)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="人脸库量化误差评估 / Dérive de quantification")
+    parser.add_argument("--synthetic", type=int, default=0, help="使用 N 个随机特征代替数据库")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="随机特征维度")
+    parser.add_argument("--queries", type=int, default=200, help="查询次数")
+    parser.add_argument("--noise", type=float, default=0.02, help="查询向量的每维噪声标准差")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    args = parser.parse_args()
+
+    settings = load_settings(DATABASE_NAME)
+    threshold = get_float(settings, "FACE_MATCH_THRESHOLD", 0.35)
+    rng = np.random.default_rng(args.seed)
+    if args.synthetic:
+        source = f"synthetic x{args.synthetic}"
+        ids, matrix = synthetic_embeddings(args.synthetic, args.dim, rng)
+    else:
+        model = get_str(settings, "FACE_EMBEDDER", "dlib")
+        source = f"database ({model})"
+        ids, matrix = load_embeddings(model)
+    if len(matrix) == 0:
+        print("没有可用的特征 / Aucune caractéristique (可使用 --synthetic N)")
+        return
+
+    _, queries = make_queries(matrix, args.queries, args.noise, rng)
+    reference = reference_distances(matrix, queries)
+    print(f"特征来源 / Source: {source}  库大小 / Galerie: {len(matrix)}x{matrix.shape[1]}  "
+          f"查询 / Requêtes: {len(queries)}  阈值 / Seuil: {threshold}")
+
+    results = {dtype: measure(dtype, ids, matrix, queries, reference, threshold) for dtype in GALLERY_DTYPES}
+    print(f"{'精度':<8} {'内存KB':>9} {'最大误差':>10} {'平均误差':>10} {'Top1一致':>9} {'判定翻转':>8}")
+    for dtype, r in results.items():
+        print(f"{dtype:<8} {r['bytes'] / 1024:>9.1f} {r['max_abs_error']:>10.6f} {r['mean_abs_error']:>10.6f} "
+              f"{r['top1_agreement']:>9.2%} {r['decision_flips']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"source": source, "threshold": threshold, "gallery": list(matrix.shape),
+                       "queries": len(queries), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
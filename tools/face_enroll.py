@@ -1,11 +1,11 @@
 import cv2
-import face_recognition
 import sqlite3
-import json
+import datetime
 import numpy as np
 import time
 import warnings
 import os
+import sys
 
 # 屏蔽 pkg_resources 过时警告
 warnings.filterwarnings("ignore", message="pkg_resources is deprecated as an API")
@@ -17,13 +17,26 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 DATABASE_NAME = os.path.join(PROJECT_ROOT, "capsule_dispenser.db")
 
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+sys.path.append(PROJECT_ROOT)
+from hardware.face_gallery import encoding_to_blob
+from hardware.gallery_file import publish_gallery
+from hardware.settings import load_settings, get_path
+from hardware.camera import camera_pipeline_candidates, cached_pipeline
+from hardware.camera_broker import BrokerClient
+from hardware.face_system import FaceRecognizer
+
 def get_db_connection():
     return sqlite3.connect(DATABASE_NAME)
 
 def list_users():
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT user_id, name, face_encoding FROM Users")
+    cursor.execute("""
+        SELECT user_id, name,
+               EXISTS (SELECT 1 FROM Face_Embeddings e WHERE e.user_id = Users.user_id)
+        FROM Users
+    """)
     rows = cursor.fetchall()
     conn.close()
     
@@ -34,48 +47,47 @@ def list_users():
         print(f"ID: {uid:<3} | {name:<15} | Face: {has_face}")
     print("-" * 40)
 
-def save_face_to_db(user_id, encoding):
-    """将特征向量(list)转为JSON字符串存入DB"""
-    encoding_json = json.dumps(encoding.tolist())
+def save_face_to_db(user_id, encoding, model="dlib"):
+    """将特征向量以 float32 BLOB 存入 Face_Embeddings"""
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE Users SET face_encoding = ? WHERE user_id = ?", (encoding_json, user_id))
+        cursor.execute("DELETE FROM Face_Embeddings WHERE user_id = ?", (user_id,))
+        cursor.execute("INSERT INTO Face_Embeddings (user_id, model, dim, embedding, created_at) VALUES (?, ?, ?, ?, ?)",
+                       (user_id, model, len(encoding), encoding_to_blob(encoding), now))
         conn.commit()
         conn.close()
-        return True
     except Exception as e:
         print(f"数据库错误 / Erreur BDD: {e}")
         return False
-
-def enroll_face():
-    list_users()
+    # 发布人脸库快照，守护进程下一次同步时直接映射，无需读取数据库
     try:
-        user_id = int(input("请输入要录入人脸的用户 ID / Entrez ID utilisateur: "))
-    except ValueError:
-        print("无效 ID / ID Invalide")
-        return
+        path = get_path(load_settings(DATABASE_NAME), "FACE_GALLERY_FILE", "face_gallery.bin")
+        publish_gallery(DATABASE_NAME, model, len(encoding), path)
+    except Exception as e:
+        print(f"快照发布失败 (守护进程将从数据库同步) / Erreur publication: {e}")
+    return True
 
-    # 初始化摄像头
+def open_camera():
+    """自行打开摄像头 (守护进程未运行时)，返回 (cap, in_pipeline)"""
     print("正在搜索可用摄像头 / Recherche caméra...")
     cap = None
 
-    pipelines = [
-        (
-            "libcamerasrc ! video/x-raw,format=NV12,width=640,height=480,framerate=30/1 ! videoconvert ! video/x-raw,format=BGR ! appsink drop=1",
-            "GStreamer (NV12 640x480)"
-        ),
-        (
-            "libcamerasrc ! video/x-raw,width=640,height=480 ! videoconvert ! video/x-raw,format=BGR ! appsink drop=1",
-            "GStreamer (Auto 640x480)"
-        ),
-        (
-            "libcamerasrc ! video/x-raw ! videoconvert ! video/x-raw,format=BGR ! appsink drop=1",
-            "GStreamer (Default)"
-        )
-    ]
-
-    for pipeline, name in pipelines:
+    # 与识别进程 (FaceRecognizer.init_camera) 相同：前两个管道在 GStreamer 内完成旋转和转 RGB，
+    # 保持全分辨率 (480x640) 以便在原图上提取特征；其余为旧式 BGR 管道，由 Python 侧处理
+    # 有调优缓存 (tools/diagnose_camera.py --tune) 时先试缓存的管道
+    pipelines = camera_pipeline_candidates(color="RGB")
+    cached = cached_pipeline(color="RGB")
+    if cached:
+        pipelines.insert(0, cached)
+    pipelines.append((
+        "libcamerasrc ! video/x-raw ! videoconvert ! video/x-raw,format=BGR ! appsink drop=1",
+        "GStreamer (Default)", "BGR", False
+    ))
+    in_pipeline = False # 帧是否已在管道内旋转/转色
+
+    for pipeline, name, _, rotated in pipelines:
         try:
             print(f"尝试管道 / Essai pipeline: {name}...")
             cap_gst = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
@@ -83,6 +95,7 @@ def enroll_face():
                 ret, _ = cap_gst.read()
                 if ret:
                     cap = cap_gst
+                    in_pipeline = rotated
                     print(f"成功打开摄像头 [{name}] / Caméra OK")
                     break
                 else:
@@ -95,7 +108,9 @@ def enroll_face():
 
     if cap is None:
         print("尝试 V4L2 模式... / Essai V4L2...")
-        for i in range(20):
+        # 只尝试实际存在的 /dev/videoN 节点，而不是逐个打开 0..19
+        devices = sorted(int(d[5:]) for d in os.listdir("/dev") if d.startswith("video") and d[5:].isdigit())
+        for i in devices:
             temp_cap = cv2.VideoCapture(i, cv2.CAP_V4L2)
             if temp_cap.isOpened():
                 ret, _ = temp_cap.read()
@@ -105,14 +120,37 @@ def enroll_face():
                     break
                 else:
                     temp_cap.release()
-    
-    if cap is None:
-        print("无法打开任何摄像头 / Erreur caméra")
+    return cap, in_pipeline
+
+def enroll_face():
+    list_users()
+    try:
+        user_id = int(input("请输入要录入人脸的用户 ID / Entrez ID utilisateur: "))
+    except ValueError:
+        print("无效 ID / ID Invalide")
         return
 
-    # 设置分辨率
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    # 初始化摄像头: 守护进程运行时通过摄像头代理共享画面，否则自行打开
+    broker = BrokerClient.connect()
+    cap, in_pipeline = None, False
+    if broker:
+        print("已连接到守护进程的摄像头代理 / Caméra partagée (service actif)")
+        color, rotated = broker.color, broker.rotated
+    else:
+        cap, in_pipeline = open_camera()
+        if cap is None:
+            print("无法打开任何摄像头 / Erreur caméra")
+            return
+        # 管道内处理过的帧为 RGB，其余为未旋转的 BGR
+        color, rotated = ("RGB", True) if in_pipeline else ("BGR", False)
+
+        # 设置分辨率 (管道已固定输出尺寸时无需设置)
+        if not in_pipeline:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    # 检测与特征提取使用与识别相同的后端 (FACE_DETECTOR / FACE_EMBEDDER)，保证录入的特征可以比对
+    face_rec = FaceRecognizer(open_camera=False, load_gallery=False)
+    face_rec.frame_color, face_rec.frame_rotated = color, rotated
 
     import os
     has_display = os.environ.get('DISPLAY') is not None
@@ -127,18 +165,21 @@ def enroll_face():
     start_time = time.time()
     last_log_time = time.time()
 
+    last_seq = 0
     while True:
-        ret, frame = cap.read()
+        if broker:
+            last_seq, _, frame = broker.wait_frame(after_seq=last_seq, timeout=1.0)
+            ret = frame is not None
+        else:
+            ret, frame = cap.read()
         if not ret:
             print("无法获取图像帧 / Erreur frame")
             time.sleep(0.1)
             continue
 
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5) 
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-        face_locations = face_recognition.face_locations(rgb_small_frame)
+        # 在全分辨率的正向 RGB 图上处理：检测内部按 FACE_DETECT_SCALE 缩小，特征在原图上提取
+        rgb_frame = face_rec.to_upright_rgb(frame)
+        face_locations = face_rec.detect_faces(rgb_frame)
 
         if not has_display:
             if time.time() - last_log_time > 1.0:
@@ -147,9 +188,9 @@ def enroll_face():
 
             if len(face_locations) == 1:
                 print(f"\n检测到人脸! 正在提取特征... / Visage détecté!")
-                encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+                encodings = face_rec.encode_faces(rgb_frame, face_locations)
                 if encodings:
-                    if save_face_to_db(user_id, encodings[0]):
+                    if save_face_to_db(user_id, encodings[0], face_rec.embedder.name):
                         print(f"ID {user_id} 人脸录入成功！ / Succès!")
                         break
             elif len(face_locations) > 1:
@@ -163,8 +204,8 @@ def enroll_face():
             time.sleep(0.1)
             continue
 
+        frame = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR) # imshow 需要 BGR
         for (top, right, bottom, left) in face_locations:
-            top *= 2; right *= 2; bottom *= 2; left *= 2
             cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
 
         cv2.imshow('Face Enroll - Press s to Save', frame)
@@ -176,9 +217,9 @@ def enroll_face():
         elif key == ord('s'):
             if len(face_locations) == 1:
                 print("正在提取特征... / Extraction...")
-                encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+                encodings = face_rec.encode_faces(rgb_frame, face_locations)
                 if encodings:
-                    if save_face_to_db(user_id, encodings[0]):
+                    if save_face_to_db(user_id, encodings[0], face_rec.embedder.name):
                         print(f"ID {user_id} 人脸录入成功！ / Succès!")
                         break
                     else:
@@ -188,7 +229,10 @@ def enroll_face():
             else:
                 print("多张人脸 / Trop de visages")
 
-    cap.release()
+    if broker:
+        broker.stop()
+    else:
+        cap.release()
     if has_display:
         cv2.destroyAllWindows()
 
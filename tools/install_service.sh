@@ -31,6 +31,10 @@ echo "项目根目录: $PROJECT_ROOT"
 echo "执行用户: $USER_NAME"
 echo "Python路径: $PYTHON_EXEC"
 
+# 0. 创建/升级数据库结构 (按 PRAGMA user_version 执行迁移)
+echo "正在更新数据库结构..."
+sudo -u $USER_NAME $PYTHON_EXEC $PROJECT_ROOT/tools/setup_database.py
+
 # 1. 创建 systemd 服务文件内容 (主程序)
 SERVICE_CONTENT="[Unit]
 Description=Smart Capsule Dispenser Service
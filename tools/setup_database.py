@@ -1,11 +1,114 @@
 import sqlite3
 import os
+import sys
+import json
+import datetime
 
 # 动态获取数据库绝对路径
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
 DATABASE_NAME = os.path.join(PROJECT_ROOT, "capsule_dispenser.db")
 
+# 将项目根目录添加到 python 路径，以便导入 hardware 包
+sys.path.append(PROJECT_ROOT)
+from hardware.face_gallery import encoding_to_blob
+
+# 数据库结构版本 (保存在 PRAGMA user_version 中)
+# v1: 初始结构 (人脸特征以 JSON 文本存于 Users.face_encoding)
+# v2: 人脸特征移至 Face_Embeddings 表，以 float32 二进制 (BLOB) 存储
+# v3: Face_Changes 变更日志 + 触发器，供守护进程增量同步人脸库
+# v4: Face_Embeddings 增加 model 列，记录生成特征的特征后端 (FACE_EMBEDDER)
+SCHEMA_VERSION = 4
+
+def migrate_v2(cursor):
+    """v1 -> v2: 建立 Face_Embeddings 表，并把 JSON 特征转换为 BLOB"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS Face_Embeddings (
+        embedding_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        dim INTEGER NOT NULL,
+        embedding BLOB NOT NULL,     -- dim 个小端 float32
+        created_at TEXT,
+        FOREIGN KEY (user_id) REFERENCES Users(user_id)
+    );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_face_embeddings_user ON Face_Embeddings(user_id)")
+
+    cursor.execute("SELECT user_id, face_encoding FROM Users WHERE face_encoding IS NOT NULL")
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    migrated = 0
+    for uid, encoding_json in cursor.fetchall():
+        try:
+            values = json.loads(encoding_json)
+        except (TypeError, ValueError) as e:
+            print(f"  用户 ID {uid} 的人脸数据损坏，跳过 / Données corrompues: {e}")
+            continue
+        cursor.execute("DELETE FROM Face_Embeddings WHERE user_id = ?", (uid,))
+        cursor.execute("INSERT INTO Face_Embeddings (user_id, dim, embedding, created_at) VALUES (?, ?, ?, ?)",
+                       (uid, len(values), encoding_to_blob(values), now))
+        migrated += 1
+    # 旧列保留 (SQLite 不便删除列)，但清空内容以释放溢出页
+    cursor.execute("UPDATE Users SET face_encoding = NULL WHERE face_encoding IS NOT NULL")
+    print(f"  已迁移 {migrated} 个人脸特征到 Face_Embeddings / {migrated} visages migrés")
+
+def migrate_v3(cursor):
+    """v2 -> v3: 建立 Face_Changes 变更日志，由触发器自动记录人脸库变化"""
+    # seq 是全局单调递增的变更计数器；守护进程只需读取上次同步之后的记录
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS Face_Changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cursor.executescript("""
+    CREATE TRIGGER IF NOT EXISTS trg_face_insert AFTER INSERT ON Face_Embeddings
+    BEGIN
+        INSERT INTO Face_Changes (user_id) VALUES (NEW.user_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_face_update AFTER UPDATE ON Face_Embeddings
+    BEGIN
+        INSERT INTO Face_Changes (user_id) VALUES (OLD.user_id);
+        INSERT INTO Face_Changes (user_id) VALUES (NEW.user_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_face_delete AFTER DELETE ON Face_Embeddings
+    BEGIN
+        INSERT INTO Face_Changes (user_id) VALUES (OLD.user_id);
+    END;
+
+    -- 启用/停用用户会改变其是否参与识别
+    CREATE TRIGGER IF NOT EXISTS trg_user_active AFTER UPDATE OF is_active ON Users
+    WHEN OLD.is_active IS NOT NEW.is_active
+    BEGIN
+        INSERT INTO Face_Changes (user_id) VALUES (NEW.user_id);
+    END;
+
+    -- 删除用户时立即删除其人脸特征 (进而由 trg_face_delete 记录变更)
+    CREATE TRIGGER IF NOT EXISTS trg_user_delete AFTER DELETE ON Users
+    BEGIN
+        DELETE FROM Face_Embeddings WHERE user_id = OLD.user_id;
+    END;
+    """)
+    # 清理 v2 时期删除用户后残留的特征
+    cursor.execute("DELETE FROM Face_Embeddings WHERE user_id NOT IN (SELECT user_id FROM Users)")
+
+def migrate_v4(cursor):
+    """v3 -> v4: 记录每条特征由哪个特征后端生成 (不同模型的特征不可互相比较)"""
+    cursor.execute("PRAGMA table_info(Face_Embeddings)")
+    if "model" not in [row[1] for row in cursor.fetchall()]:
+        # 已有特征均由 face_recognition (dlib) 生成
+        cursor.execute("ALTER TABLE Face_Embeddings ADD COLUMN model TEXT NOT NULL DEFAULT 'dlib'")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_face_embeddings_model ON Face_Embeddings (model, dim)")
+
+# 按版本顺序执行的迁移函数
+MIGRATIONS = {
+    2: migrate_v2,
+    3: migrate_v3,
+    4: migrate_v4,
+}
+
 def setup_database():
     """连接数据库并创建所有必需的表。"""
     
@@ -13,8 +116,7 @@ def setup_database():
     cursor = conn.cursor()
 
     # 1. 创建 Users 表
-    # 更新：加入 face_encoding 用于人脸识别
-    # face_encoding 将存储为 TEXT (JSON string of list[float])
+    # face_encoding 为 v1 遗留字段 (JSON 文本)，v2 起人脸特征存于 Face_Embeddings
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS Users (
         user_id INTEGER PRIMARY KEY, 
@@ -70,9 +172,68 @@ def setup_database():
     for key, val, desc in settings:
         cursor.execute("INSERT OR REPLACE INTO System_Settings (key_name, value, description) VALUES (?, ?, ?)", (key, val, desc))
 
+    # 人脸识别可调参数：只补充缺失的键，不覆盖现场调好的值
+    face_settings = [
+        ('FACE_GATE_ENABLED', '1', '检测前预筛开关 (1/0)'),
+        ('FACE_GATE_MIN_BRIGHTNESS', '35', '预筛: 最低平均亮度 (0-255)'),
+        ('FACE_GATE_MAX_BRIGHTNESS', '225', '预筛: 最高平均亮度 (0-255)'),
+        ('FACE_GATE_MOTION', '3.0', '预筛: 帧差分运动阈值 (平均像素差)'),
+        ('FACE_GATE_BLUR', '40.0', '预筛: 拉普拉斯方差清晰度阈值'),
+        ('FACE_GATE_HOLD', '2.0', '预筛: 检测到运动/人脸后继续放行的秒数'),
+        ('FACE_DETECT_SCALE', '0.5', '人脸检测缩放比例 (0.25 = 120x160, 0.5 = 240x320)'),
+        ('FACE_DETECTOR', 'hog', '人脸检测后端 (hog / yunet / haar)，见 tools/benchmark_detectors.py'),
+        ('FACE_DETECT_UPSAMPLE', '1', 'HOG 检测上采样次数 (缩放越小越需要)'),
+        ('FACE_YUNET_MODEL', 'models/face_detection_yunet_2023mar.onnx', 'YuNet ONNX 模型路径'),
+        ('FACE_YUNET_SCORE', '0.8', 'YuNet 置信度阈值'),
+        ('FACE_ENHANCER', 'clahe', '图像增强 (clahe / lut / none)，lut 适合整体偏暗或发灰的场景'),
+        ('FACE_CLAHE_CLIP', '3.0', 'CLAHE 对比度限制'),
+        ('FACE_LUT_GAMMA', '1.0', 'LUT 增强的 gamma (>1 提亮暗部)'),
+        ('FACE_SCAN_FACE_INTERVAL', '0.1', '调度: 有人脸时的扫描间隔 (秒)'),
+        ('FACE_SCAN_MOTION_INTERVAL', '0.25', '调度: 有运动无人脸时的扫描间隔 (秒)'),
+        ('FACE_SCAN_MAX_INTERVAL', '1.0', '调度: 空场景退避的最大间隔 (秒)'),
+        ('FACE_SCAN_BACKOFF', '1.6', '调度: 空场景时间隔的增长倍数'),
+        ('FACE_CPU_BUDGET', '0.6', '调度: 识别进程最多占用单核 CPU 的比例 (0-1)'),
+        ('FACE_TRACK_DETECT_EVERY', '4', '跟踪: 每隔多少帧重新做一次完整检测 (1 = 每帧检测)'),
+        ('FACE_EMBEDDER', 'dlib', '人脸特征后端 (dlib / onnx)，更换后需重新录入'),
+        ('FACE_ONNX_MODEL', 'models/face_recognition_sface_2021dec.onnx', 'ONNX 特征模型路径'),
+        ('FACE_ONNX_INPUT', '112', 'ONNX 特征模型输入边长 (像素)'),
+        ('FACE_GALLERY_DTYPE', 'float32', '人脸库内存精度 (float32 / float16 / int8)，见 tools/embedding_drift.py'),
+        ('FACE_GALLERY_FILE', 'face_gallery.bin', '人脸库共享快照文件 (内存映射，其他进程可直接读取)'),
+        ('FACE_INDEX_MIN', '10000', '人脸库达到该人数后启用 IVF 近似索引 (0 = 始终线性比对)'),
+        ('FACE_INDEX_NPROBE', '8', 'IVF 每次查询扫描的聚类数，见 tools/benchmark_gallery.py'),
+        ('FACE_INDEX_EXACT_MARGIN', '0.05', 'IVF: 最近距离在阈值下方该范围内时用全库比对复核身份'),
+        ('FACE_ENROLL_BURST', '12', '录入: 连续采集的单人脸帧数'),
+        ('FACE_ENROLL_SAMPLES', '3', '录入: 每个用户保存的特征数 (取差异最大的几帧)'),
+        ('FACE_ENROLL_MIN_QUALITY', '0.05', '录入: 帧质量下限 (清晰度 x 大小 x 正脸程度，0-1)'),
+        ('FACE_ENROLL_WORKERS', '2', '录入: 质量评分线程数'),
+        ('FACE_MATCH_THRESHOLD', '0.35', '单帧强匹配阈值 (低于即立即通过)'),
+        ('FACE_VOTE_THRESHOLD', '0.42', '投票: 单帧宽松阈值'),
+        ('FACE_VOTE_WINDOW', '5', '投票: 每条轨迹的滑动窗口大小 (次)'),
+        ('FACE_VOTE_MIN', '3', '投票: 同一用户需要的最少票数'),
+        ('FACE_VOTE_MAX_MEAN', '0.40', '投票: 得票距离的平均值上限'),
+        ('SCREEN_CACHE_KB', '2048', '屏幕页面缓存上限 (KB)，缓存各画面的 RGB565 底图'),
+        ('DISPLAY_FPS', '20', '屏幕刷新线程的最高帧率，积压的画面只绘制最新的一帧'),
+    ]
+
+    for key, val, desc in face_settings:
+        cursor.execute("INSERT OR IGNORE INTO System_Settings (key_name, value, description) VALUES (?, ?, ?)", (key, val, desc))
+
     conn.commit()
+
+    # 5. 按版本执行结构迁移
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for target in range(max(version, 1) + 1, SCHEMA_VERSION + 1):
+        print(f"迁移数据库结构 v{target - 1} -> v{target} / Migration du schéma...")
+        MIGRATIONS[target](cursor)
+        cursor.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+
+    # 释放迁移后的空闲页
+    if version < SCHEMA_VERSION:
+        conn.execute("VACUUM")
+
     conn.close()
-    print(f"数据库 {DATABASE_NAME} 结构已更新/确认。")
+    print(f"数据库 {DATABASE_NAME} 结构已更新/确认 (v{SCHEMA_VERSION})。")
 
 if __name__ == "__main__":
     setup_database()
\ No newline at end of file